@@ -0,0 +1,4 @@
+"""
+Offline processing of recorded footage.
+Run from the src directory, e.g. "python -m batch.detect ../recordings"
+"""
@@ -0,0 +1,311 @@
+"""
+Run the detection path over many recordings on every CPU core.
+Videos are split into frame ranges that are processed by a pool of worker processes,
+so a single long video uses every core too. Each range starts with a fresh tracker.
+Detection uses the thresholds and the detector settings of the config.
+
+Writes a CSV per video with the detection of every frame, and summary.json with
+the throughput and the detection counts.
+
+Example:
+    python -m batch.detect ../recordings
+    python -m batch.detect "../recordings/**/*.avi" --output ../detections --workers 4
+    python -m batch.detect ../source.mp4 --chunk-frames 30
+"""
+from typing import Dict, List, Tuple, Union
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+
+from processor import buffers
+from processor import config as conf
+from processor import pipeline as pipe
+from processor import profiler as prof
+from processor import properties
+from processor import utilities
+from processor import windowless
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+
+# Row of a frame: None or (X, Y, Area)
+Row = Union[Tuple[float, float, int], None]
+
+# State of a worker process, set by init_worker()
+worker_settings: Union[conf.Config, None] = None
+worker_tuning: Union[properties.Tuning, None] = None
+worker_profiler: Union[prof.Profiler, None] = None
+worker_pool: Union[buffers.BufferPool, None] = None
+
+
+def find_videos(patterns: List[str], recursive: bool = False) -> List[str]:
+    """
+    :param patterns: Video files, directories or glob patterns
+    :param recursive: Search the directories recursively
+    :return: Absolute video paths without duplicates
+    """
+
+    videos = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = glob.glob(os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*"), recursive=recursive)
+            candidates = [candidate for candidate in candidates if candidate.lower().endswith(VIDEO_EXTENSIONS)]
+        elif os.path.isfile(pattern):
+            candidates = [pattern]
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+
+        for candidate in sorted(candidates):
+            path = os.path.abspath(candidate)
+            if os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                videos.append(path)
+
+    return videos
+
+
+def probe(path: str) -> Union[Tuple[int, float], None]:
+    """
+    :param path: Video path
+    :return: (Frame count, 0 if unknown, FPS) or None if the video can't be opened
+    """
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        return None
+
+    frames = max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return frames, fps if fps > 0 else 30.0
+
+
+def split(frames: int, chunk_frames: int) -> List[Tuple[int, Union[int, None]]]:
+    """
+    :param frames: Frame count, 0 if unknown
+    :param chunk_frames: Frames per chunk
+    :return: (Start, End) frame ranges, the last one ends with the video (None)
+    """
+
+    if frames <= 0 or chunk_frames <= 0 or frames <= chunk_frames:
+        return [(0, None)]
+
+    starts = list(range(0, frames, chunk_frames))
+    return [(start, start + chunk_frames) for start in starts[:-1]] + [(starts[-1], None)]
+
+
+def init_worker(settings: conf.Config, tuning: Dict) -> None:
+    """
+    Called once in every worker process.
+    :param settings: Config snapshot
+    :param tuning: Tuning arguments
+    """
+
+    global worker_settings, worker_tuning, worker_profiler, worker_pool
+
+    # Parallelism comes from the processes.
+    cv2.setNumThreads(1)
+
+    worker_settings = settings
+    worker_tuning = properties.Tuning(**tuning)
+    worker_profiler = prof.Profiler(["mask", "detect"], enabled=False)
+    worker_pool = buffers.BufferPool(settings.general.buffer_pool)
+
+
+def process_chunk(path: str, start: int, end: Union[int, None], fps: float) -> Tuple[str, int, List[Row], float]:
+    """
+    Detect the target in a frame range. Runs in a worker process.
+    :param path: Video path
+    :param start: First frame
+    :param end: Frame to stop before, None to read to the end
+    :param fps: Frame rate, the tracker gets the video time as the timestamp
+    :return: (Path, Start, Row of each frame read, Seconds spent)
+    """
+
+    started = time.perf_counter()
+    detection_pipeline = pipe.DetectionPipeline(worker_settings, worker_profiler, worker_pool)
+
+    capture = cv2.VideoCapture(path)
+    if start > 0:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    rows = []
+    frame = None
+    index = start
+    while end is None or index < end:
+        ret, frame = capture.read(frame)
+        if not ret:
+            break
+
+        target, _, _ = detection_pipeline.detect(frame, index / fps, worker_tuning)
+        rows.append(None if target is None else (round(target.x, 2), round(target.y, 2), int(target.area)))
+        index = index + 1
+
+    capture.release()
+    return path, start, rows, time.perf_counter() - started
+
+
+def write_rows(path: str, rows: List[Row], fps: float) -> None:
+    """
+    :param path: CSV path
+    :param rows: Row of every frame
+    :param fps: Frame rate of the video
+    """
+
+    with open(path, "w") as csv_file:
+        csv_file.write("frame,time,detected,x,y,area\n")
+        for index, row in enumerate(rows):
+            if row is None:
+                csv_file.write(f"{index},{index / fps:.3f},0,,,\n")
+            else:
+                csv_file.write(f"{index},{index / fps:.3f},1,{row[0]},{row[1]},{row[2]}\n")
+
+
+def main() -> None:
+    """
+    Run the batch.
+    """
+
+    config = conf.ConfigUtil()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="+", help="Video files, directories or glob patterns")
+    parser.add_argument("--output", default="./detections", help="Directory of the results")
+    parser.add_argument("--recursive", action="store_true", help="Search the directories recursively")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes, 0 for one per CPU core")
+    parser.add_argument(
+        "--chunk-frames",
+        type=int,
+        default=0,
+        help="Frames per chunk, 0 for about four chunks per worker and at least 100 frames"
+    )
+    args = parser.parse_args()
+
+    videos = find_videos(args.videos, args.recursive)
+    if len(videos) == 0:
+        sys.exit("No videos found.")
+
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+
+    # Frame ranges of every video
+    probes = {}
+    for path in videos:
+        probed = probe(path)
+        if probed is None:
+            print(f"Unable to open video: {path}")
+            continue
+        probes[path] = probed
+
+    total_frames = sum(frames for frames, _ in probes.values())
+    chunk_frames = args.chunk_frames
+    if chunk_frames <= 0:
+        chunk_frames = max(100, math.ceil(total_frames / (workers * 4)))
+    chunks = {path: split(frames, chunk_frames) for path, (frames, _) in probes.items()}
+
+    props = windowless.Windowless(config)
+    tuning = props.tuning
+    tuning_arguments = {
+        "lower_hsv": tuple(int(value) for value in tuning.lower_hsv),
+        "upper_hsv": tuple(int(value) for value in tuning.upper_hsv),
+        "box_width": tuning.box_width,
+        "box_height": tuning.box_height,
+        "box_horizontal": tuning.box_horizontal,
+        "box_vertical": tuning.box_vertical
+    }
+
+    os.makedirs(args.output, exist_ok=True)
+    print(
+        f"{len(probes)} videos, {total_frames} frames in {sum(len(ranges) for ranges in chunks.values())} chunks "
+        f"of {chunk_frames} frames, {workers} workers"
+    )
+
+    parts: Dict[str, Dict[int, List[Row]]] = {path: {} for path in probes}
+    seconds: Dict[str, float] = {path: 0.0 for path in probes}
+    failed = set()
+    results = []
+
+    start = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+            workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(config.snapshot, tuning_arguments)
+    ) as executor:
+        futures = {
+            executor.submit(process_chunk, path, chunk_start, chunk_end, probes[path][1]): path
+            for path, ranges in chunks.items()
+            for chunk_start, chunk_end in ranges
+        }
+
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                _, chunk_start, rows, elapsed = future.result()
+            except Exception as e:
+                print(f"Failed to process {path}: {e}")
+                failed.add(path)
+                continue
+
+            parts[path][chunk_start] = rows
+            seconds[path] = seconds[path] + elapsed
+            if len(parts[path]) < len(chunks[path]) or path in failed:
+                continue
+
+            # Every chunk of the video is done.
+            rows = [row for chunk_start in sorted(parts[path]) for row in parts[path][chunk_start]]
+            fps = probes[path][1]
+            name = os.path.splitext(os.path.basename(path))[0]
+            csv_path = utilities.unique_path(args.output, name, ".csv")
+            write_rows(csv_path, rows, fps)
+
+            detections = sum(row is not None for row in rows)
+            first = next((index for index, row in enumerate(rows) if row is not None), None)
+            results.append({
+                "video": path,
+                "csv": os.path.abspath(csv_path),
+                "frames": len(rows),
+                "duration": len(rows) / fps,
+                "detections": detections,
+                "first_detection": first,
+                "chunks": len(chunks[path]),
+                "cpu_seconds": seconds[path],
+                "fps": len(rows) / seconds[path] if seconds[path] > 0 else 0.0
+            })
+            print(f"{os.path.basename(path)}: {len(rows)} frames, {detections} detections -> {csv_path}")
+
+    elapsed = time.perf_counter() - start
+    frames = sum(result["frames"] for result in results)
+    summary = {
+        "videos": len(results),
+        "failed": sorted(failed) + [path for path in videos if path not in probes],
+        "frames": frames,
+        "detections": sum(result["detections"] for result in results),
+        "workers": workers,
+        "chunk_frames": chunk_frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "results": sorted(results, key=lambda result: result["video"])
+    }
+
+    summary_path = utilities.unique_path(args.output, "summary", ".json")
+    with open(summary_path, "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    print(
+        f"{summary['videos']} videos, {frames} frames in {elapsed:.1f} s, {summary['fps']:.1f} FPS, "
+        f"{summary['detections']} detections, {len(summary['failed'])} failed"
+    )
+    print(f"Summary: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
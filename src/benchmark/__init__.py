@@ -0,0 +1,65 @@
+"""
+Benchmarks over recorded footage.
+Run from the src directory, e.g. "python -m benchmark.detectors ../source.mp4"
+"""
+from typing import List
+
+import time
+
+import numpy as np
+import cv2
+
+from processor import detection
+
+
+def load_frames(path: str, limit: int = 0) -> List[np.ndarray]:
+    """
+    Decode the video into memory so decoding doesn't affect the measurements.
+    :param path: Video path
+    :param limit: Maximum frame count, 0 for all frames
+    :return: Frames
+    """
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Unable to open video: {path}")
+
+    frames = []
+    while limit <= 0 or len(frames) < limit:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+
+    capture.release()
+    return frames
+
+
+def measure(function: callable, frames: List[np.ndarray], repeat: int = 1) -> float:
+    """
+    Run the function over every frame.
+    :param function: Function that takes a frame
+    :param frames: Frames
+    :param repeat: How many times the frames are processed
+    :return: Frames per second
+    """
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            function(frame)
+
+    return len(frames) * repeat / (time.perf_counter() - start)
+
+
+def create_detector(name: str) -> detection.Detector:
+    """
+    Create detector with default parameters.
+    :param name: "contours" or "components"
+    :return: Detector
+    """
+
+    if name == "components":
+        return detection.ComponentsDetector()
+
+    return detection.ContourDetector()
@@ -0,0 +1,58 @@
+"""Compare throughput and centroids of the detector backends on recorded footage."""
+import argparse
+
+import numpy as np
+
+from processor import config as conf
+from processor import masking
+from . import load_frames, measure, create_detector
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+
+    config = conf.ConfigUtil()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("video", nargs="?", default="../" + config.get_string("file.video-path"))
+    parser.add_argument("--frames", type=int, default=0, help="Frame limit, 0 for whole video")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--clutter", action="store_true",
+        help="Use a wide threshold that yields thousands of blobs instead of the configured one"
+    )
+    args = parser.parse_args()
+
+    if args.clutter:
+        lower = np.array([0, 0, 0], np.uint8)
+        upper = np.array([180, 255, 100], np.uint8)
+    else:
+        lower = np.array([config.get_int(f"opencv.lower_{c}") for c in "hsv"], np.uint8)
+        upper = np.array([config.get_int(f"opencv.upper_{c}") for c in "hsv"], np.uint8)
+
+    masks = [masking.hsv_mask(frame, lower, upper) for frame in load_frames(args.video, args.frames)]
+    print(f"{len(masks)} masks of {masks[0].shape[1]}x{masks[0].shape[0]}, HSV {lower.tolist()} - {upper.tolist()}")
+
+    results = {}
+    for name in ("contours", "components"):
+        detector = create_detector(name)
+        fps = measure(detector.detect, masks, args.repeat)
+        results[name] = [detector.detect(mask) for mask in masks]
+        detected = sum(result is not None for result in results[name])
+        print(f"{name:>10}: {fps:8.1f} FPS, {detected} detections")
+
+    errors = np.array([
+        np.hypot(contour.x - component.x, contour.y - component.y)
+        for contour, component in zip(results["contours"], results["components"])
+        if contour is not None and component is not None
+    ])
+    if len(errors) > 0:
+        print(
+            f"Centroid difference px: mean {errors.mean():.2f}, "
+            f"median {np.median(errors):.2f}, max {errors.max():.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
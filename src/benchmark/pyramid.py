@@ -0,0 +1,65 @@
+"""Compare centroids and throughput of the coarse to fine detection with the full resolution detection."""
+import argparse
+import time
+
+import numpy as np
+
+from processor import config as conf
+from processor import detection
+from processor import masking
+from . import load_frames, create_detector
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+
+    config = conf.ConfigUtil()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("video", nargs="?", default="../" + config.get_string("file.video-path"))
+    parser.add_argument("--factors", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--frames", type=int, default=0, help="Frame limit, 0 for whole video")
+    parser.add_argument("--detector", choices=["contours", "components"], default="contours")
+    args = parser.parse_args()
+
+    lower = np.array([config.get_int(f"opencv.lower_{c}") for c in "hsv"], np.uint8)
+    upper = np.array([config.get_int(f"opencv.upper_{c}") for c in "hsv"], np.uint8)
+
+    def create_mask(image: np.ndarray) -> np.ndarray:
+        return masking.hsv_mask(image, lower, upper)
+
+    detector = create_detector(args.detector)
+    frames = load_frames(args.video, args.frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+
+    # Full resolution reference
+    start = time.perf_counter()
+    references = [detector.detect(create_mask(frame)) for frame in frames]
+    fps = len(frames) / (time.perf_counter() - start)
+    detected = sum(reference is not None for reference in references)
+    print(f"{'full':>10}: {fps:8.1f} FPS, {detected} detections")
+
+    for factor in args.factors:
+        start = time.perf_counter()
+        results = [detection.coarse_to_fine(frame, create_mask, detector, factor)[0] for frame in frames]
+        fps = len(frames) / (time.perf_counter() - start)
+
+        errors = np.array([
+            np.hypot(result.x - reference.x, result.y - reference.y)
+            for result, reference in zip(results, references)
+            if result is not None and reference is not None
+        ])
+        mismatches = sum((result is None) != (reference is None) for result, reference in zip(results, references))
+
+        summary = f"{f'1/{factor * factor}':>10}: {fps:8.1f} FPS, {mismatches} detection mismatches"
+        if len(errors) > 0:
+            summary = summary + (
+                f", centroid error px mean {errors.mean():.2f}"
+                f" p95 {np.percentile(errors, 95):.2f} max {errors.max():.2f}"
+            )
+        print(summary)
+
+
+if __name__ == "__main__":
+    main()
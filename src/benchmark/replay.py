@@ -0,0 +1,178 @@
+"""
+Replay a recording through the detection path as fast as possible.
+No window, no bindings and no network. Reports throughput, per stage latency percentiles,
+peak RSS and the detected centroids, and optionally fails on throughput regressions.
+With --allocations, memory allocated per frame is traced, with and without the buffer pool.
+
+Example:
+    python -m benchmark.replay ../source.mp4 --save-baseline baseline.json
+    python -m benchmark.replay ../source.mp4 --baseline baseline.json --tolerance 10
+    python -m benchmark.replay ../source.mp4 --frames 200 --allocations --no-pool
+"""
+from typing import Union
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import cv2
+
+from processor import buffers
+from processor import config as conf
+from processor import pipeline as pipe
+from processor import profiler as prof
+from processor import windowless
+from . import load_frames
+
+
+def peak_rss() -> Union[float, None]:
+    """
+    Peak resident set size of the process.
+    :return: Megabytes or None if not supported on this platform
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+
+    config = conf.ConfigUtil()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", default="../" + config.get_string("file.video-path"))
+    parser.add_argument("--frames", type=int, default=0, help="Frame limit, 0 for whole video")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the video this many times")
+    parser.add_argument("--preload", action="store_true", help="Decode the video before measuring")
+    parser.add_argument("--output", help="Write the results with the centroid sequence to this JSON file")
+    parser.add_argument("--baseline", help="Fail if FPS is lower than this baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed FPS drop in percent")
+    parser.add_argument("--save-baseline", help="Write the results as the new baseline JSON")
+    parser.add_argument("--no-pool", action="store_true", help="Let every stage allocate its output")
+    parser.add_argument(
+        "--allocations",
+        action="store_true",
+        help="Trace the memory allocated per frame, slows the replay down"
+    )
+    args = parser.parse_args()
+
+    stages = ["capture", "mask", "detect"]
+    profiler = prof.Profiler(stages, size=1 << 16, interval=0)
+    pool = buffers.BufferPool(not args.no_pool)
+    detection_pipeline = pipe.DetectionPipeline(config, profiler, pool)
+    props = windowless.Windowless(config)
+
+    frames = load_frames(args.video, args.frames) if args.preload else None
+    centroids = []
+    allocated = []  # Peak bytes allocated on top of the live memory while processing each frame
+
+    if args.allocations:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        capture = None if frames is not None else cv2.VideoCapture(args.video)
+        if capture is not None:
+            capture_shape = (
+                int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                3
+            )
+        index = 0
+        while args.frames <= 0 or index < args.frames:
+            if args.allocations:
+                tracemalloc.reset_peak()
+                traced_before = tracemalloc.get_traced_memory()[0]
+
+            frame_start = profiler.start()
+            if frames is not None:
+                if index >= len(frames):
+                    break
+                frame = frames[index]
+            else:
+                ret, frame = capture.read(pool.get("capture", capture_shape))
+                if not ret:
+                    break
+            profiler.lap("capture", frame_start)
+
+            target, _, _ = detection_pipeline.detect(frame, time.monotonic(), props.tuning)
+            centroids.append(None if target is None else [round(target.x, 2), round(target.y, 2)])
+            profiler.end_frame(frame_start)
+            index = index + 1
+
+            if args.allocations:
+                allocated.append(tracemalloc.get_traced_memory()[1] - traced_before)
+
+        if capture is not None:
+            capture.release()
+
+    elapsed = time.perf_counter() - start
+    if args.allocations:
+        tracemalloc.stop()
+    if len(centroids) == 0:
+        sys.exit(f"No frames could be read from {args.video}")
+
+    results = {
+        "video": args.video,
+        "frames": len(centroids),
+        "fps": len(centroids) / elapsed,
+        "detections": sum(centroid is not None for centroid in centroids),
+        "peak_rss_mb": peak_rss(),
+        "stages": profiler.stats(),
+        "pool": {"enabled": pool.enabled, "allocations": pool.allocations, "mb": pool.nbytes() / (1024 * 1024)},
+        "centroids": centroids
+    }
+
+    print(f"{results['frames']} frames, {results['fps']:.1f} FPS, {results['detections']} detections")
+    if results["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB")
+    if pool.enabled:
+        print(f"Buffer pool: {pool.allocations} arrays, {results['pool']['mb']:.1f} MB")
+    if len(allocated) > 0:
+        # The first frames fill the pool
+        steady = sorted(allocated[min(5, len(allocated) - 1):])
+        results["peak_allocated_kb_per_frame"] = {
+            "p50": steady[len(steady) // 2] / 1024,
+            "max": steady[-1] / 1024
+        }
+        print(
+            f"Peak allocated per frame: p50 {results['peak_allocated_kb_per_frame']['p50']:.1f} KB"
+            f"\tmax {results['peak_allocated_kb_per_frame']['max']:.1f} KB"
+        )
+    for stage, stat in results["stages"].items():
+        print(
+            f"{stage:>10}: p50 {stat['p50']:7.2f} ms\tp95 {stat['p95']:7.2f} ms"
+            f"\tp99 {stat['p99']:7.2f} ms\tmax {stat['max']:7.2f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({key: results[key] for key in ("video", "frames", "fps", "detections")}, baseline_file, indent=2)
+        print(f"Baseline saved: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        change = (results["fps"] - baseline["fps"]) / baseline["fps"] * 100
+        print(f"Baseline: {baseline['fps']:.1f} FPS, change {change:+.1f}%")
+        if change < -args.tolerance:
+            sys.exit(f"Throughput regression: {-change:.1f}% below the baseline, tolerance is {args.tolerance}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 """Bindings class"""
-import socket
+from typing import Callable, List, Tuple, Union
+
+import queue
 import threading
-from time import sleep
+import time
 
-try:
-    from gpiozero import Servo, LED, Button
-except ImportError:
-    print("GpioZero not found! Make sure your video-source property is not 'raspberry'.")
+from . import gpio
+from . import simulator
 
 
 class Bindings:
@@ -16,6 +16,7 @@ class Bindings:
     """
     
     terminate = False
+    power_time: Union[float, None] = None  # time.monotonic() of the last power on edge, None if unknown
     
     def power(self) -> bool:
         """
@@ -24,65 +25,221 @@ class Bindings:
         """
         return True
 
-    def open_package_door(self) -> None:
+    def wait_for_power(self, timeout: float = None) -> bool:
+        """
+        Block until the power button is on.
+        :param timeout: Seconds to wait, waits forever if None
+        :return: Is the power on
+        """
+        return self.power()
+
+    def open_package_door(self, timestamp: Union[float, None] = None) -> None:
         """
         Binding for activate servo motor and open the package door.
+        :param timestamp: Capture timestamp of the frame that decided it, the door latency is measured from it
+        """
+
+    def close(self) -> None:
+        """
+        Release the bindings.
         """
 
 
 class Simulator(Bindings):
     """
-    Connects to the simulator via socket and sends the command to drop ball.
+    Sends the command to drop ball to the simulator.
+    The link connects and reconnects in the background, the processing thread never waits for the socket.
     """
 
-    socket_client: socket.socket
+    link: simulator.SimulatorLink
+    closed: bool = False
 
     def __init__(self, host, port):
+        self.link = simulator.SimulatorLink(host, port)
+
+    def open_package_door(self, timestamp: Union[float, None] = None):
+        self.link.send(simulator.Command.DROP, timestamp)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+
+        self.link.terminate()
+        print(self.link.summary())
+
+
+class Actuator:
+    """
+    Runs the actuator sequences one after another on a single worker thread, fed by a command queue.
+    A sequence is a list of (Delay, Step), the delays are seconds from the start of the sequence.
+    """
+
+    commands: "queue.Queue[Union[List[Tuple[float, Callable[[], None]]], None]]"
+    thread: threading.Thread
 
-        try:
-            self.socket_client = socket.socket()
-            self.socket_client.connect((host, port))
-            print("Successfully connected to the server!")
-        except socket.error as msg:
-            print(f"Failed to connect server: {msg}")
-            exit(0)
+    def __init__(self) -> None:
+        self.commands = queue.Queue()
+        self.closing = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="Actuator", daemon=True)
+        self.thread.start()
 
-    def open_package_door(self):
-        self.socket_client.send(b'\x01')
+    def submit(self, steps: List[Tuple[float, Callable[[], None]]]) -> None:
+        """
+        Queue a sequence, it starts after the ones before it are done.
+        :param steps: (Delay, Step) list, sorted by the delay
+        """
+        self.commands.put(steps)
+
+    def run(self) -> None:
+        """
+        Run the queued sequences until closed.
+        """
+
+        while True:
+            steps = self.commands.get()
+            if steps is None:
+                break
+
+            start = time.monotonic()
+            for delay, step in steps:
+                # Woken early on close, the rest of the sequence runs at once.
+                remaining = start + delay - time.monotonic()
+                if remaining > 0:
+                    self.closing.wait(remaining)
+
+                try:
+                    step()
+                except Exception as e:
+                    print(f"Actuator step failed: {e}")
+
+    def close(self) -> None:
+        """
+        Drop the queued sequences, finish the running one without its delays and stop the thread.
+        """
+
+        self.closing.set()
+        while True:
+            try:
+                self.commands.get_nowait()
+            except queue.Empty:
+                break
+
+        self.commands.put(None)
+        if self.thread is not threading.current_thread():
+            self.thread.join()
 
 
 class Raspberry(Bindings):
     """
     Raspberry pi connector.
+    The power button is tracked by its edge callbacks, so power() only reads a cached flag.
+    The servo and the LED are driven by the actuator thread.
     """
 
-    def __init__(self):        
+    door_opened: Union[float, None] = None  # time.monotonic() the door is opened at
+    door_closed: Union[float, None] = None  # time.monotonic() the door is closed at
+    door_count: int = 0
+    door_latency: float = 0.0      # Seconds from the frame to the servo command, of the last door open
+    door_latency_total: float = 0.0
+    door_latency_max: float = 0.0
+    closed: bool = False
+
+    def __init__(self, backend: str = "gpiozero"):
+        """
+        :param backend: "gpiozero", or "mock" for the gpiozero mock pins to run without GPIO
+        """
+
+        Servo, LED, Button = gpio.devices(backend)
         self.servo = Servo(17)
         self.servo.max()
         self.led = LED(27)
         self.led.on()
-        self.button = Button(2)
         print("Servo configured.")
-    
+
+        self.actuator = Actuator()
+
+        # Set and cleared by the button edges.
+        self.powered = threading.Event()
+        self.button = Button(2)
+        # Nothing drives the mock pins, the power is held on from the start.
+        # The pin can still be driven to test the edges, see gpiozero.pins.mock.MockPin.
+        if backend == "mock":
+            self.button.pin.drive_low()
+
+        self.button.when_pressed = self.on_press
+        self.button.when_released = self.powered.clear
+        if self.button.is_pressed:
+            self.powered.set()
+
+    def on_press(self) -> None:
+        self.power_time = time.monotonic()
+        self.powered.set()
+
     def power(self) -> bool:
-        return self.button.is_pressed
+        return self.powered.is_set()
+
+    def wait_for_power(self, timeout: float = None) -> bool:
+        # Woken by the button edge, no polling.
+        return self.powered.wait(timeout)
     
-    def open_package_door(self):
-        print("Package door is opened!")
+    def open_package_door(self, timestamp: Union[float, None] = None):
+        requested = time.monotonic() if timestamp is None else timestamp
+
+        # Open, blink and close the door.
+        self.actuator.submit([
+            (0.0, lambda: self.door_open(requested)),
+            (0.3, self.led.off),
+            (0.6, self.led.on),
+            (0.9, self.led.off),
+            (1.2, self.close_package_door)
+        ])
+
+    def door_open(self, requested: float) -> None:
+        """
+        Open the door, called on the actuator thread.
+        :param requested: Capture timestamp of the frame, or the time of the call
+        """
+
         self.servo.min()
-        
-        def blink():
-            self.led.on()
-            sleep(0.3)
-            self.led.off()
-            sleep(0.3)
-            self.led.on()
-            sleep(0.3)
-            self.led.off()
-            sleep(0.3)
-            self.led.on()
-            self.servo.max()
-            
-        t1 = threading.Thread(target=blink)
-        t1.start()
-        
+        self.led.on()
+        self.door_opened = time.monotonic()
+
+        self.door_latency = self.door_opened - requested
+        self.door_count = self.door_count + 1
+        self.door_latency_total = self.door_latency_total + self.door_latency
+        self.door_latency_max = max(self.door_latency_max, self.door_latency)
+        print(f"Package door is opened! {self.door_latency * 1000:.1f} ms after the frame.")
+
+    def close_package_door(self) -> None:
+        """
+        Reset the servo after the ball is dropped.
+        """
+        self.led.on()
+        self.servo.max()
+        self.door_closed = time.monotonic()
+        if self.door_opened is not None:
+            print(f"Package door is closed after {self.door_closed - self.door_opened:.2f} seconds.")
+
+    def door_summary(self) -> str:
+        """
+        :return: One line summary of the door latencies
+        """
+
+        if self.door_count == 0:
+            return "Package door: never opened"
+
+        return (
+            f"Package door: opened {self.door_count} times, {self.door_latency_total / self.door_count * 1000:.1f} ms "
+            f"after the frame on average, {self.door_latency_max * 1000:.1f} ms max"
+        )
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+
+        self.actuator.close()
+        for device in (self.button, self.led, self.servo):
+            device.close()
+        print(self.door_summary())
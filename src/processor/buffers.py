@@ -0,0 +1,60 @@
+"""Preallocated buffers for the frame pipeline."""
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+
+class BufferPool:
+    """
+    Named arrays reused every frame, passed to OpenCV as dst so the stages don't allocate.
+    A buffer grows to the largest shape asked for its name, smaller requests get a view of it,
+    so regions that change size every frame (tracking windows) don't allocate either.
+    When disabled, get() returns None and OpenCV allocates as usual.
+    """
+
+    buffers: Dict[str, np.ndarray]
+    allocations: int = 0  # Arrays allocated, stays the same once the pool is warm
+
+    def __init__(self, enabled: bool = True) -> None:
+        """
+        :param enabled: Use the pool
+        """
+
+        self.enabled = enabled
+        self.buffers = {}
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype: np.dtype = np.uint8) -> Union[np.ndarray, None]:
+        """
+        Buffer of the name. Contents are undefined.
+        :param name: Buffer name, one per stage output that must not be overwritten by another stage
+        :param shape: Shape
+        :param dtype: Data type
+        :return: Array of the shape, None if the pool is disabled
+        """
+
+        if not self.enabled:
+            return None
+
+        buffer = self.buffers.get(name)
+        if (
+                buffer is None or
+                buffer.dtype != dtype or
+                buffer.ndim != len(shape) or
+                any(size > capacity for size, capacity in zip(shape, buffer.shape))
+        ):
+            capacity = tuple(shape)
+            if buffer is not None and buffer.dtype == dtype and buffer.ndim == len(shape):
+                capacity = tuple(max(size, current) for size, current in zip(shape, buffer.shape))
+            buffer = np.empty(capacity, dtype)
+            self.buffers[name] = buffer
+            self.allocations = self.allocations + 1
+
+        if buffer.shape == tuple(shape):
+            return buffer
+        return buffer[tuple(slice(0, size) for size in shape)]
+
+    def nbytes(self) -> int:
+        """
+        :return: Memory held by the pool in bytes
+        """
+        return sum(buffer.nbytes for buffer in self.buffers.values())
@@ -0,0 +1,317 @@
+"""Threaded frame capture."""
+from typing import Callable, List, Union
+
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from . import config as conf
+
+
+def open_capture(settings: conf.Config) -> cv2.VideoCapture:
+    """
+    Open the video source of the config.
+    :param settings: Config snapshot
+    :return: Video capture, may not be opened
+    """
+
+    if settings.general.video_source == "file":
+        src_video_path = settings.file.video_path
+        print(f"Capture initializing with file #{src_video_path}")
+        capture = cv2.VideoCapture(src_video_path)
+    else:
+        cam = settings.general.camera_index
+        print(f"Capture initializing with video input #{cam}")
+        capture = cv2.VideoCapture(cam)
+        if capture.isOpened(): print("Capture opened!")
+
+    # Fix size for simulator.
+    if settings.general.video_source == "simulator":
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+
+    capture.set(cv2.CAP_PROP_FPS, 30)
+    return capture
+
+
+class Frame:
+    """
+    Preallocated frame buffer with its capture metadata.
+    """
+
+    __slots__ = ("image", "timestamp", "sequence")
+
+    image: Union[np.ndarray, None]
+    timestamp: float  # time.monotonic() right after the frame is grabbed
+    sequence: int     # Increases by one for every grabbed frame
+
+    def __init__(self) -> None:
+        self.image = None
+        self.timestamp = 0.0
+        self.sequence = -1
+
+
+class FrameGrabber:
+    """
+    Grabbing side of a capture, shared by CaptureThread and the capture process of the workers.
+    Paces file sources like a camera would, grabs without decoding in standby
+    and backs off after failed grabs or retrieves until it gives up.
+    The owner picks the buffer to decode into and how to wait, so a stop or a resume can cut the waits short.
+    """
+
+    min_backoff: float = 0.01  # First delay after a failed grab or retrieve
+    max_backoff: float = 1.0
+    max_failures: int = 20     # Failures in a row before the capture is given up
+    failures: int = 0          # Current failures in a row
+    failed: bool = False       # Given up
+
+    pending: bool = False   # Frame grabbed in standby and not retrieved
+    timestamp: float = 0.0  # time.monotonic() right after the last grab
+
+    def __init__(self, capture: cv2.VideoCapture, loop: bool = False, pace: bool = True) -> None:
+        """
+        :param capture: Opened video capture
+        :param loop: Rewind the capture at the end of the stream and pace reads to the source FPS.
+        Used for video files.
+        :param pace: Pace the looped reads, False to read the file as fast as possible
+        """
+
+        self.capture = capture
+        self.loop = loop
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        self.period = 1 / fps if loop and pace and fps > 0 else 0
+        # Unpaced files are paced in standby, nothing waits for them.
+        self.standby_period = 1 / fps if loop and fps > 0 else 0
+        self.deadline = time.monotonic()
+
+    def grab(self, standby: bool, wait: Callable[[float], bool]) -> bool:
+        """
+        Wait for the next frame and grab it.
+        :param standby: Keep the frame grabbed but not decoded
+        :param wait: Waits up to the seconds passed, returns True if woken by a standby change or a stop
+        :return: Is a frame ready to retrieve
+        """
+
+        # Resumed from standby, the frame grabbed last is retrieved at once instead of waiting for the next.
+        if self.pending and not standby:
+            self.pending = False
+            return True
+
+        # Pace file sources like a camera would.
+        frame_period = self.standby_period if standby else self.period
+        if frame_period > 0:
+            self.deadline = max(self.deadline + frame_period, time.monotonic() - frame_period)
+            delay = self.deadline - time.monotonic()
+            if delay > 0 and wait(delay):
+                # Woken up, the next frame is grabbed at once instead of a period after this deadline.
+                self.deadline = time.monotonic() - self.period
+                return False
+
+        if not self.capture.grab():
+            if self.loop:
+                # Rewound, the first frame takes the place of the one that is not there.
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self.deadline = self.deadline - frame_period
+            self.pending = False
+            self.retry(wait)
+            return False
+
+        self.timestamp = time.monotonic()
+        if standby:
+            self.pending = True
+            return False
+        return True
+
+    def retrieve(self, image: Union[np.ndarray, None], wait: Callable[[float], bool]) -> Union[np.ndarray, None]:
+        """
+        Decode the grabbed frame.
+        :param image: Buffer to decode into, replaced if None or of another size
+        :param wait: See grab()
+        :return: Frame, None if the decoding failed
+        """
+
+        ret, image = self.capture.retrieve(image)
+        if not ret:
+            self.retry(wait)
+            return None
+
+        self.failures = 0
+        return image
+
+    def retry(self, wait: Callable[[float], bool]) -> None:
+        """
+        Count a failed grab or retrieve and back off before the next attempt.
+        The end of a looped file is rewound and read again at once.
+        :param wait: See grab()
+        """
+
+        self.failures = self.failures + 1
+        if self.failures >= self.max_failures:
+            print(f"Capture failed {self.failures} times in a row, giving up.")
+            self.failed = True
+            return
+
+        if self.loop and self.failures == 1:
+            return
+
+        # Exponential backoff
+        wait(min(self.min_backoff * 2 ** (self.failures - 1), self.max_backoff))
+
+
+class CaptureThread:
+    """
+    Reads the capture on a dedicated thread into a small ring of preallocated frame buffers.
+    Only the latest frame is handed to the consumer, frames that are overwritten before
+    they are read are counted as dropped.
+    """
+
+    frames: List[Frame]
+    thread: Union[threading.Thread, None] = None
+
+    running: bool = False
+    idle: bool = False  # Standby, frames are grabbed to keep the source streaming but not decoded
+    fps: float = 0.0   # Frame rate reported by the capture, 0 if unknown
+    captured: int = 0  # Frames grabbed from the capture
+    dropped: int = 0   # Frames that are never handed to the consumer
+
+    latest: Union[int, None] = None   # Slot index of the freshest frame
+    reading: Union[int, None] = None  # Slot index held by the consumer
+    last_sequence: int = -1           # Sequence number of the last frame handed out
+
+    def __init__(
+            self,
+            capture: cv2.VideoCapture,
+            buffers: int = 3,
+            loop: bool = False,
+            pace: bool = True
+    ) -> None:
+        """
+        :param capture: Opened video capture
+        :param buffers: Ring size, at least 3 (writing, latest and reading)
+        :param loop: Rewind the capture at the end of the stream and pace reads to the source FPS.
+        Used for video files.
+        :param pace: Pace the looped reads, False to read the file as fast as possible
+        """
+
+        self.capture = capture
+        self.grabber = FrameGrabber(capture, loop, pace)
+        self.fps = capture.get(cv2.CAP_PROP_FPS)
+        self.frames = [Frame() for _ in range(max(3, buffers))]
+        self.condition = threading.Condition()
+
+        # Preallocate buffers with the capture size.
+        width, height = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if width > 0 and height > 0:
+            for frame in self.frames:
+                frame.image = np.empty((height, width, 3), np.uint8)
+
+    def start(self) -> None:
+        """
+        Start capturing.
+        """
+
+        self.running = True
+        self.thread = threading.Thread(target=self.capture_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop capturing and wait until the thread is terminated.
+        """
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def standby(self, enabled: bool) -> None:
+        """
+        Keep the capture open and streaming without decoding the frames.
+        Frames from before the standby are never handed out, so they are not counted as dropped.
+        :param enabled: Standby or capture
+        """
+
+        with self.condition:
+            self.idle = enabled
+            self.condition.notify_all()
+            if not enabled and self.latest is not None:
+                self.last_sequence = max(self.last_sequence, self.frames[self.latest].sequence)
+
+    @property
+    def failed(self) -> bool:
+        """
+        :return: Is the capture given up, read() returns None from then on
+        """
+        return self.grabber.failed
+
+    def capture_loop(self) -> None:
+        """
+        Grab frames until stopped or the capture is given up.
+        """
+
+        sequence = 0
+        while self.running and not self.grabber.failed:
+
+            if not self.capture.isOpened():
+                break
+
+            # Pick a slot that is neither the latest frame nor held by the consumer.
+            with self.condition:
+                index = sequence % len(self.frames)
+                while index == self.latest or index == self.reading:
+                    index = (index + 1) % len(self.frames)
+
+            idle = self.idle
+
+            def wait(delay: float) -> bool:
+                with self.condition:
+                    return self.condition.wait_for(lambda: self.idle != idle or not self.running, delay)
+
+            if not self.grabber.grab(idle, wait):
+                continue
+
+            frame = self.frames[index]
+            image = self.grabber.retrieve(frame.image, wait)
+            if image is None:
+                continue
+
+            with self.condition:
+                frame.image = image
+                frame.timestamp = self.grabber.timestamp
+                frame.sequence = sequence
+                self.latest = index
+                self.captured = self.captured + 1
+                sequence = sequence + 1
+                self.condition.notify_all()
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def read(self, timeout: Union[float, None] = None) -> Union[Frame, None]:
+        """
+        Wait for a frame that is newer than the last one read.
+        The returned frame stays valid until the next call.
+        :param timeout: Seconds to wait, waits forever if None
+        :return: Latest frame or None if timed out, stopped or failed
+        """
+
+        with self.condition:
+            self.reading = None
+
+            while self.latest is None or self.frames[self.latest].sequence <= self.last_sequence:
+                if not self.running:
+                    return None
+                if not self.condition.wait(timeout):
+                    return None
+
+            frame = self.frames[self.latest]
+            self.dropped = self.dropped + frame.sequence - self.last_sequence - 1
+            self.last_sequence = frame.sequence
+            self.reading = self.latest
+
+        return frame
@@ -1,14 +1,413 @@
 """Configuration management."""
+from typing import Any, Callable, Dict, List, Tuple, Union
+
 import configparser
+import io
 import os
+import threading
+import typing
+
+from . import utilities
+
+
+class ConfigError(ValueError):
+    """
+    Raised when the configuration has invalid values.
+    """
+
+
+class Section:
+    """
+    Immutable group of typed config values, one per ini section.
+    Subclasses list their fields in __slots__ and annotate their types.
+    """
+
+    __slots__ = ()
+
+    NAME: str = ""                           # Section name in the ini file
+    KEYS: Dict[str, str] = {}                # Ini keys that are not the field name with "-" instead of "_"
+    CHOICES: Dict[str, Tuple[str, ...]] = {} # Allowed values of the string fields, compared in lower case
+    RANGES: Dict[str, Tuple] = {}            # Inclusive (minimum, maximum) of the numeric fields, None for no limit
+
+    def __init__(self, **values) -> None:
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Config is immutable, use ConfigUtil.replace()")
+
+    # Pickled when passed to the worker processes
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def __eq__(self, other: Any) -> bool:
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+    @classmethod
+    def key(cls, name: str) -> str:
+        """
+        :param name: Field name
+        :return: Ini key of the field
+        """
+        return cls.KEYS.get(name, name.replace("_", "-"))
+
+    @classmethod
+    def field(cls, key: str) -> str:
+        """
+        :param key: Ini key
+        :return: Field name of the key
+        """
+
+        name = key.replace("-", "_")
+        if name not in cls.__slots__:
+            raise ConfigError(f"Unknown config field: {cls.NAME.lower()}.{key}")
+        return name
+
+    @classmethod
+    def convert(cls, name: str, value: Any) -> Any:
+        """
+        Convert and validate a value of the field.
+        :param name: Field name
+        :param value: Value, strings are parsed
+        :return: Typed value
+        """
+
+        field_type = typing.get_type_hints(cls)[name]
+        locator = f"{cls.NAME.lower()}.{cls.key(name)}"
+
+        if field_type is bool:
+            if isinstance(value, bool):
+                return value
+            state = configparser.ConfigParser.BOOLEAN_STATES.get(str(value).strip().lower())
+            if state is None:
+                raise ConfigError(f"{locator}: expected true or false, got '{value}'")
+            return state
+
+        if field_type in (int, float):
+            try:
+                if isinstance(value, bool):
+                    raise ValueError()
+                converted = field_type(str(value).strip()) if isinstance(value, str) else field_type(value)
+            except ValueError:
+                kind = "an integer" if field_type is int else "a number"
+                raise ConfigError(f"{locator}: expected {kind}, got '{value}'") from None
+
+            minimum, maximum = cls.RANGES.get(name, (None, None))
+            if (minimum is not None and converted < minimum) or (maximum is not None and converted > maximum):
+                raise ConfigError(f"{locator}: {converted} is out of range [{minimum}, {maximum}]")
+            return converted
+
+        converted = str(value)
+        if name in cls.CHOICES:
+            converted = converted.strip().lower()
+            if converted not in cls.CHOICES[name]:
+                raise ConfigError(f"{locator}: expected one of {', '.join(cls.CHOICES[name])}, got '{value}'")
+        return converted
+
+    @classmethod
+    def parse(cls, section: configparser.SectionProxy) -> "Section":
+        """
+        :param section: Ini section, filled with the defaults
+        :return: Validated section
+        """
+
+        errors = []
+        values = {}
+        for name in cls.__slots__:
+            try:
+                values[name] = cls.convert(name, section[cls.key(name)])
+            except ConfigError as e:
+                errors.append(str(e))
+
+        if len(errors) > 0:
+            raise ConfigError("\n".join(errors))
+
+        return cls(**values)
+
+    def replace(self, **changes) -> "Section":
+        """
+        :param changes: Field names and their new values
+        :return: Copy with the changes, validated
+        """
+
+        values = {name: getattr(self, name) for name in self.__slots__}
+        for name, value in changes.items():
+            if name not in values:
+                raise ConfigError(f"Unknown config field: {self.NAME.lower()}.{self.key(name)}")
+            values[name] = self.convert(name, value)
+
+        return type(self)(**values)
+
+
+class GeneralConfig(Section):
+    __slots__ = (
+        "record", "logging", "preview", "visualize_processing", "record_dir", "video_source", "camera_index",
+        "capture_buffers", "profiling", "profiling_interval", "record_queue", "record_policy", "record_mode",
+        "record_preroll", "record_postroll", "record_preroll_memory", "record_preroll_quality",
+        "log_queue", "log_sync_interval", "telemetry", "buffer_pool",
+        "preview_fps", "multiprocess", "ring_slots", "worker_restarts", "pacing", "gpio"
+    )
+
+    NAME = "GENERAL"
+    CHOICES = {
+        "video_source": ("simulator", "file", "webcam", "raspberry"),
+        "record_policy": ("block", "drop-oldest", "drop-newest"),
+        "record_mode": ("continuous", "event"),
+        "pacing": ("source", "unthrottled"),
+        "gpio": ("gpiozero", "mock")
+    }
+    RANGES = {
+        "camera_index": (0, None),
+        "capture_buffers": (2, None),
+        "profiling_interval": (0, None),
+        "record_queue": (1, None),
+        "record_preroll": (0, None),
+        "record_postroll": (0, None),
+        "record_preroll_memory": (1, None),
+        "record_preroll_quality": (1, 100),
+        "log_queue": (1, None),
+        "log_sync_interval": (0, None),
+        "preview_fps": (0.1, None),
+        "ring_slots": (4, None),
+        "worker_restarts": (0, None)
+    }
+
+    record: bool
+    logging: bool
+    preview: bool
+    visualize_processing: bool
+    record_dir: str
+    video_source: str
+    camera_index: int
+    capture_buffers: int
+    profiling: bool
+    profiling_interval: int
+    record_queue: int
+    record_policy: str
+    record_mode: str
+    record_preroll: float
+    record_postroll: float
+    record_preroll_memory: int
+    record_preroll_quality: int
+    log_queue: int
+    log_sync_interval: float
+    telemetry: bool
+    buffer_pool: bool
+    preview_fps: float
+    multiprocess: bool
+    ring_slots: int
+    worker_restarts: int
+    pacing: str
+    gpio: str  # Raspberry devices, mock to run without GPIO
+
+
+class OpencvConfig(Section):
+    __slots__ = (
+        "upper_h", "upper_s", "upper_v", "lower_h", "lower_s", "lower_v",
+        "collision_box_width", "collision_box_height",
+        "collision_box_horizontal_offset", "collision_box_vertical_offset",
+        "tracking", "tracking_window", "tracking_max_misses",
+        "pyramid_factor", "detector", "min_blob_area", "fill_weight", "aspect_weight"
+    )
+
+    NAME = "OPENCV"
+    KEYS = {name: name for name in ("upper_h", "upper_s", "upper_v", "lower_h", "lower_s", "lower_v")}
+    CHOICES = {
+        "detector": ("contours", "components")  # components is experimental, see ComponentsDetector
+    }
+    RANGES = {
+        "upper_h": (0, 180),
+        "upper_s": (0, 255),
+        "upper_v": (0, 255),
+        "lower_h": (0, 180),
+        "lower_s": (0, 255),
+        "lower_v": (0, 255),
+        "tracking_window": (1, None),
+        "tracking_max_misses": (0, None),
+        "pyramid_factor": (1, None),
+        "min_blob_area": (0, None)
+    }
+
+    upper_h: int
+    upper_s: int
+    upper_v: int
+    lower_h: int
+    lower_s: int
+    lower_v: int
+    collision_box_width: int
+    collision_box_height: int
+    collision_box_horizontal_offset: int
+    collision_box_vertical_offset: int
+    tracking: bool
+    tracking_window: int
+    tracking_max_misses: int
+    pyramid_factor: int
+    detector: str  # contours, or components (experimental)
+    min_blob_area: int
+    fill_weight: float
+    aspect_weight: float
+
+
+class GroundstationConfig(Section):
+    __slots__ = ("enabled", "host", "query_port", "stream_port", "stream_quality", "mtu", "stream_bitrate", "stream_fps")
+
+    NAME = "GROUNDSTATION"
+    KEYS = {"query_port": "query_port", "stream_port": "stream_port"}
+    RANGES = {
+        "query_port": (1, 65535),
+        "stream_port": (1, 65535),
+        "stream_quality": (1, 100),
+        "mtu": (576, 65535),
+        "stream_bitrate": (1, None),
+        "stream_fps": (0.1, None)
+    }
+
+    enabled: bool
+    host: str
+    query_port: int
+    stream_port: int
+    stream_quality: int
+    mtu: int
+    stream_bitrate: int  # Kilobits per second
+    stream_fps: float
+
+
+class FileConfig(Section):
+    __slots__ = ("video_path",)
+
+    NAME = "FILE"
+
+    video_path: str
+
+
+class SimulatorConfig(Section):
+    __slots__ = ("host", "port")
+
+    NAME = "SIMULATOR"
+    RANGES = {"port": (1, 65535)}
+
+    host: str
+    port: int
+
+
+class Config:
+    """
+    Immutable snapshot of the whole configuration. Values are read as plain attributes,
+    e.g. config.opencv.lower_h, changes create a new snapshot with a higher version.
+    """
+
+    __slots__ = ("general", "opencv", "groundstation", "file", "simulator", "version")
+
+    SECTIONS = {
+        "general": GeneralConfig,
+        "opencv": OpencvConfig,
+        "groundstation": GroundstationConfig,
+        "file": FileConfig,
+        "simulator": SimulatorConfig
+    }
+
+    general: GeneralConfig
+    opencv: OpencvConfig
+    groundstation: GroundstationConfig
+    file: FileConfig
+    simulator: SimulatorConfig
+    version: int
+
+    def __init__(self, version: int = 0, **sections: Section) -> None:
+        object.__setattr__(self, "version", version)
+        for name in self.SECTIONS:
+            object.__setattr__(self, name, sections[name])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Config is immutable, use ConfigUtil.replace()")
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in ("version", *self.SECTIONS)}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def __eq__(self, other: Any) -> bool:
+        """
+        Compares the values, not the versions.
+        """
+        return isinstance(other, Config) and all(getattr(self, name) == getattr(other, name) for name in self.SECTIONS)
+
+    @classmethod
+    def parse(cls, parser: configparser.ConfigParser, version: int = 0) -> "Config":
+        """
+        :param parser: Parser filled with the defaults and the file
+        :param version: Version of the snapshot
+        :return: Validated snapshot
+        :raise ConfigError: With every invalid value listed
+        """
+
+        errors = []
+        sections = {}
+        for name, section in cls.SECTIONS.items():
+            try:
+                sections[name] = section.parse(parser[section.NAME])
+            except ConfigError as e:
+                errors.append(str(e))
+
+        if len(errors) > 0:
+            raise ConfigError("\n".join(errors))
+
+        return cls(version, **sections)
+
+    def get(self, locator: str) -> Any:
+        """
+        :param locator: Example locator: "simulator.port"
+        :return: Value
+        """
+
+        section_name, key = locator.split(".", 1)
+        section = getattr(self, section_name.lower())
+        return getattr(section, section.field(key))
+
+    def replace(self, changes: Dict[str, Any]) -> "Config":
+        """
+        :param changes: Locators and their new values, e.g. {"opencv.lower_h": 120}
+        :return: New snapshot with the next version, validated
+        """
+
+        grouped = {}
+        for locator, value in changes.items():
+            section_name, key = locator.split(".", 1)
+            section_name = section_name.lower()
+            if section_name not in self.SECTIONS:
+                raise ConfigError(f"Unknown config section: {section_name}")
+            grouped.setdefault(section_name, {})[self.SECTIONS[section_name].field(key)] = value
+
+        sections = {name: getattr(self, name) for name in self.SECTIONS}
+        for name, fields in grouped.items():
+            sections[name] = sections[name].replace(**fields)
+
+        return Config(self.version + 1, **sections)
 
 
 class ConfigUtil:
     """
-    Config utils.
+    Config utils. Loads configuration.ini once into an immutable Config snapshot.
+    Hot code reads plain attributes from the snapshot, changes go through replace() which swaps the snapshot.
     """
 
     config_parser: configparser.ConfigParser
+    snapshot: Config
+
+    listeners: List[Callable[[Config], None]]
+    watch_job: Union[utilities.Job, None] = None
+    mtime: float = 0.0  # Modification time of the file as last read or written
 
     @staticmethod
     def fill_config(conf: configparser.ConfigParser) -> None:
@@ -24,7 +423,27 @@ class ConfigUtil:
             "visualize-processing": True,
             "record-dir": "./",
             "video-source": "simulator",
-            "camera-index": 1
+            "camera-index": 1,
+            "capture-buffers": 3,
+            "profiling": False,
+            "profiling-interval": 10,
+            "record-queue": 60,
+            "record-policy": "drop-oldest",
+            "record-mode": "continuous",
+            "record-preroll": 5,
+            "record-postroll": 10,
+            "record-preroll-memory": 64,
+            "record-preroll-quality": 90,
+            "log-queue": 4096,
+            "log-sync-interval": 1.0,
+            "telemetry": False,
+            "buffer-pool": True,
+            "preview-fps": 15,
+            "multiprocess": False,
+            "ring-slots": 8,
+            "worker-restarts": 3,
+            "pacing": "source",
+            "gpio": "gpiozero"
         }
 
         conf["OPENCV"] = {
@@ -38,13 +457,25 @@ class ConfigUtil:
             "collision-box-height": 100,
             "collision-box-horizontal-offset": 0,
             "collision-box-vertical-offset": 0,
+            "tracking": False,
+            "tracking-window": 160,
+            "tracking-max-misses": 5,
+            "pyramid-factor": 1,
+            "detector": "contours",
+            "min-blob-area": 0,
+            "fill-weight": 1.0,
+            "aspect-weight": 1.0
         }
 
         conf["GROUNDSTATION"] = {
             "enabled": True,
             "host": "127.0.0.1",
             "query_port": 1864,
-            "stream_port": 2023
+            "stream_port": 2023,
+            "stream-quality": 60,
+            "mtu": 1500,
+            "stream-bitrate": 2000,
+            "stream-fps": 15
         }
 
         conf["FILE"] = {
@@ -56,33 +487,50 @@ class ConfigUtil:
             "port": 5710
         }
 
-    def __init__(self) -> None:
+    def __init__(self, path: Union[str, None] = None) -> None:
+        """
+        :param path: Config file, configuration.ini next to the package if None
+        :raise ConfigError: If the file has invalid values
+        """
 
-        # Create a config
-        self.config_parser = configparser.ConfigParser()
+        if path is None:
+            root_dir = os.path.dirname(os.path.abspath(__file__))
+            path = os.path.join(root_dir, "../configuration.ini")
 
-        # Fill with default variables
-        self.fill_config(self.config_parser)
+        self.conf_path = path
+        self.lock = threading.Lock()
+        self.listeners = []
 
         # Read data
-        root_dir = os.path.dirname(os.path.abspath(__file__))
-        self.conf_path = os.path.join(root_dir, "../configuration.ini")
-        self.config_parser.read(self.conf_path)
+        self.config_parser = self.read()
+        self.snapshot = Config.parse(self.config_parser)
 
-        # Write data
+        # Write the missing defaults
         self.save()
 
+    def read(self) -> configparser.ConfigParser:
+        """
+        Read the file over the defaults.
+        :return: Parser
+        """
+
+        parser = configparser.ConfigParser()
+        self.fill_config(parser)
+
+        if os.path.isfile(self.conf_path):
+            self.mtime = os.stat(self.conf_path).st_mtime
+        parser.read(self.conf_path)
+        return parser
+
     def get_string(self, locator: str) -> str:
         """
         Allows you to retrieve config data quickly.
+        Prefer reading the snapshot attributes in frequently called code.
         :param locator: Example locator: "simulator.enabled"
         :return: Matching data
         """
 
-        split_locator = locator.split(".")
-        split_locator[0] = split_locator[0].upper()
-
-        return self.config_parser[split_locator[0]][split_locator[1]]
+        return str(self.snapshot.get(locator))
 
     def get_bool(self, field: str) -> bool:
         """
@@ -91,7 +539,7 @@ class ConfigUtil:
         :return: Matching boolean data
         """
 
-        return self.get_string(field).lower() == "true"
+        return bool(self.snapshot.get(field))
 
     def get_int(self, field: str) -> int:
         """
@@ -100,27 +548,177 @@ class ConfigUtil:
         :return: Matching integer data
         """
 
-        try:
-            return int(self.get_string(field))
-        except ValueError:
-            return 0
+        return int(self.snapshot.get(field))
+
+    def get_float(self, field: str) -> float:
+        """
+        Returns float data from config.
+        :param field: Locator
+        :return: Matching float data
+        """
+
+        return float(self.snapshot.get(field))
 
     def set_field(self, locator: str, value: any) -> None:
         """
-        Allows you to set config data quickly.
+        Allows you to set config data quickly. Saved with save().
         :param locator: Where to set
         :param value: Value to set
         """
 
-        split_locator = locator.split(".")
-        split_locator[0] = split_locator[0].upper()
+        self.replace({locator: value}, False)
+
+    def replace(self, changes: Dict[str, Any], save: bool = True) -> Config:
+        """
+        Validate the changes and swap the snapshot. Nothing is changed if any value is invalid.
+        :param changes: Locators and their new values, e.g. {"opencv.lower_h": 120}
+        :param save: Write the file if the values changed
+        :return: New snapshot
+        :raise ConfigError: If a value is invalid
+        """
+
+        with self.lock:
+            snapshot = self.snapshot.replace(changes)
+            for locator in changes:
+                section_name, key = locator.split(".", 1)
+                section = getattr(snapshot, section_name.lower())
+                name = section.field(key)
+                self.config_parser[section.NAME][section.key(name)] = str(getattr(section, name))
+
+            changed = snapshot != self.snapshot
+            self.snapshot = snapshot
+
+            if save:
+                self.save()
+
+        if changed:
+            self.notify(snapshot)
+
+        return snapshot
+
+    def save(self) -> bool:
+        """
+        Save config if the file differs.
+        :return: True if the file is written
+        """
+
+        buffer = io.StringIO()
+        self.config_parser.write(buffer)
+        content = buffer.getvalue()
+
+        try:
+            with open(self.conf_path, 'r') as conf_file:
+                previous = conf_file.read()
+            content = self.keep_comments(content, previous)
+            if previous == content:
+                return False
+        except OSError:
+            pass
+
+        # Replace the file at once, so a reader never sees it half written.
+        temp_path = self.conf_path + ".tmp"
+        with open(temp_path, 'w') as conf_file:
+            conf_file.write(content)
+        os.replace(temp_path, self.conf_path)
+        self.mtime = os.stat(self.conf_path).st_mtime
+        return True
+
+    @staticmethod
+    def keep_comments(content: str, previous: str) -> str:
+        """
+        Put the comment lines of the previous file back above the same section or key, configparser drops them.
+        :param content: Written by configparser
+        :param previous: Current file
+        :return: Content with the comments
+        """
+
+        def anchor(section: str, line: str) -> Tuple[str, str]:
+            if line.startswith("["):
+                return line.strip(), ""
+            return section, line.split("=", 1)[0].strip().lower()
+
+        comments: Dict[Tuple[str, str], List[str]] = {}
+        pending = []
+        section = ""
+        for line in previous.splitlines():
+            if line.lstrip().startswith(("#", ";")):
+                pending.append(line)
+            elif line.strip() != "":
+                section = line.strip() if line.startswith("[") else section
+                if len(pending) > 0:
+                    comments[anchor(section, line)] = pending
+                    pending = []
+
+        if len(comments) == 0 and len(pending) == 0:
+            return content
+
+        lines = []
+        section = ""
+        for line in content.splitlines():
+            if line.strip() != "":
+                section = line.strip() if line.startswith("[") else section
+                lines.extend(comments.get(anchor(section, line), []))
+            lines.append(line)
+
+        return "\n".join(lines + pending) + "\n"
+
+    def watch(self, listener: Callable[[Config], None], interval: float = 1.0) -> None:
+        """
+        Reload the file when it is modified and call the listener with the new snapshot.
+        Listeners are called on the scheduler thread.
+        :param listener: Called with the new snapshot
+        :param interval: Seconds between modification time checks
+        """
+
+        self.listeners.append(listener)
+        if self.watch_job is None:
+            self.watch_job = utilities.scheduler.schedule(interval, self.reload, interval)
+
+    def unwatch(self) -> None:
+        """
+        Stop watching the file.
+        """
+
+        if self.watch_job is not None:
+            self.watch_job.cancel()
+            self.watch_job = None
+        self.listeners.clear()
+
+    def reload(self) -> None:
+        """
+        Read the file if it is modified and swap the snapshot.
+        Invalid files are reported and ignored.
+        """
+
+        try:
+            mtime = os.stat(self.conf_path).st_mtime
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+
+        with self.lock:
+            try:
+                parser = self.read()
+                snapshot = Config.parse(parser, self.snapshot.version + 1)
+            except (ConfigError, configparser.Error) as e:
+                print(f"Config is not reloaded, keeping the current values:\n{e}")
+                return
+
+            if snapshot == self.snapshot:
+                return
+
+            self.config_parser = parser
+            self.snapshot = snapshot
 
-        self.config_parser[split_locator[0]][split_locator[1]] = value
+        print(f"Config reloaded (version {snapshot.version}).")
+        self.notify(snapshot)
 
-    def save(self) -> None:
+    def notify(self, snapshot: Config) -> None:
         """
-        Save config.
+        Call the listeners.
+        :param snapshot: New snapshot
         """
 
-        with open(self.conf_path, 'w') as conf_file:
-            self.config_parser.write(conf_file)
+        for listener in list(self.listeners):
+            listener(snapshot)
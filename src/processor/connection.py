@@ -0,0 +1,222 @@
+"""Reconnecting TCP connection on a background event loop."""
+from typing import Tuple, Union
+
+import asyncio
+import socket
+import threading
+
+
+class ConnectionState:
+    """
+    States of a connection.
+    """
+
+    CONNECTING = "connecting"  # Trying to connect
+    CONNECTED = "connected"    # Connection is established
+    BACKOFF = "backoff"        # Waiting before the next attempt
+    CLOSED = "closed"          # Terminated
+
+
+class Connection:
+    """
+    TCP connection on a single asyncio event loop on a background thread,
+    reconnecting with exponential backoff until terminated.
+    Subclasses handle the messages and the established and terminated connections,
+    other threads hand work to the loop with loop.call_soon_threadsafe().
+    """
+
+    name: str = "peer"      # Used in the messages
+    no_delay: bool = False  # Disable Nagle's algorithm
+
+    state: str = ConnectionState.CONNECTING
+    running: bool = True     # This will terminate connection loop if False
+    connected: bool = False
+
+    min_backoff: float = 0.5
+    max_backoff: float = 30.0
+    backoff: float = 0.5    # Current reconnect delay
+    connections: int = 0    # Successful connections
+    failures: int = 0       # Failed connection attempts in a row
+
+    addr: Tuple[str, int]
+    loop: asyncio.AbstractEventLoop
+    thread: threading.Thread
+    main_task: Union[asyncio.Task, None] = None
+    writer: Union[asyncio.StreamWriter, None] = None
+
+    def __init__(self, host: str, port: int) -> None:
+        """
+        Starts connecting at once, subclasses set up their state before calling this.
+        :param host: Host
+        :param port: TCP port
+        """
+
+        self.addr = (host, port)
+
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self.thread = threading.Thread(target=self.run_loop, args=(started,), daemon=True)
+        self.thread.start()
+        started.wait()
+
+    def run_loop(self, started: threading.Event) -> None:
+        """
+        Event loop thread.
+        :param started: Set when the main task is created
+        """
+
+        asyncio.set_event_loop(self.loop)
+        self.main_task = self.loop.create_task(self.main())
+        started.set()
+
+        try:
+            self.loop.run_until_complete(self.main_task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"{self.name.capitalize()} connection failed: {e}")
+        finally:
+            # Let the cancelled tasks finish before closing the loop.
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    async def main(self) -> None:
+        """
+        Keep the connection alive until terminated.
+        """
+
+        try:
+            while self.running:
+                self.state = ConnectionState.CONNECTING
+                if await self.prepare():
+                    await self.connect()
+
+                if not self.running:
+                    break
+
+                # Exponential backoff
+                self.state = ConnectionState.BACKOFF
+                print(f"Trying to reach the {self.name} again in {self.backoff:g} seconds.")
+                await asyncio.sleep(self.backoff)
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+        finally:
+            self.connected = False
+            self.state = ConnectionState.CLOSED
+            if self.writer is not None:
+                self.writer.close()
+            self.on_closed()
+
+    async def prepare(self) -> bool:
+        """
+        Called before every connection attempt.
+        :return: False to skip the attempt and back off
+        """
+        return True
+
+    async def connect(self) -> None:
+        """
+        Connect, then listen until the connection is broken.
+        """
+
+        try:
+            reader, self.writer = await asyncio.open_connection(*self.addr)
+        except OSError as e:
+            self.failures = self.failures + 1
+            print(f"Failed to connect the {self.name}: {e}")
+            return
+
+        if self.no_delay:
+            sock = self.writer.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.connected = True
+        self.state = ConnectionState.CONNECTED
+        self.connections = self.connections + 1
+        self.failures = 0
+        self.backoff = self.min_backoff
+        self.on_established()
+
+        try:
+            while True:
+                data = await self.read(reader)
+                # Closed by the peer
+                if data == b'':
+                    print(f"{self.name.capitalize()} closed the connection.")
+                    break
+                self.on_message(data)
+        except OSError as e:
+            print(f"Unable to maintain the {self.name} connection: {e}")
+        finally:
+            self.connected = False
+            self.on_terminated()
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+
+    async def read(self, reader: asyncio.StreamReader) -> bytes:
+        """
+        :param reader: Reader of the connection
+        :return: Next message, empty when the connection is closed
+        """
+        return await reader.read(1024)
+
+    def on_message(self, data: bytes) -> None:
+        """
+        Triggered for every message, on the event loop.
+        :param data: Returned by read()
+        """
+
+    def on_established(self) -> None:
+        """
+        Triggered when the connection is established, on the event loop.
+        """
+
+    def on_terminated(self) -> None:
+        """
+        Triggered when the connection is broken, on the event loop.
+        """
+
+    def on_closed(self) -> None:
+        """
+        Triggered once when the connection loop ends, on the event loop.
+        """
+
+    def terminate(self, timeout: float = 5.0) -> None:
+        """
+        Close the connection and stop the event loop.
+        Returns after the loop thread is terminated.
+        :param timeout: Seconds to wait for the loop thread
+        """
+
+        self.running = False
+        self.connected = False
+
+        try:
+            self.loop.call_soon_threadsafe(self.main_task.cancel)
+        except RuntimeError:
+            # Loop is already closed
+            pass
+
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def status(self) -> dict:
+        """
+        Connection state for inspection.
+        :return: State and counters
+        """
+
+        return {
+            "state": self.state,
+            "connections": self.connections,
+            "failures": self.failures,
+            "backoff": self.backoff
+        }
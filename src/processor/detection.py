@@ -0,0 +1,205 @@
+"""Target detection."""
+from typing import Callable, List, Tuple, Union
+
+import numpy as np
+import cv2
+
+
+class Detection:
+    """
+    Detected target.
+    """
+
+    __slots__ = ("x", "y", "area", "box", "score")
+
+    x: float  # Centroid
+    y: float
+    area: float
+    box: Tuple[int, int, int, int]  # Bounding box (X, Y, Width, Height)
+    score: float  # Ranking of the detector, higher is better
+
+    def __init__(self, x: float, y: float, area: float, box: Tuple[int, int, int, int], score: float) -> None:
+        self.x = x
+        self.y = y
+        self.area = area
+        self.box = box
+        self.score = score
+
+
+class Detector:
+    """
+    Finds the target in a binary mask.
+    By extending this class, different detection backends can be selected from the config.
+    """
+
+    def detect(self, mask: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> Union[Detection, None]:
+        """
+        Find the best ranked blob.
+        :param mask: Binary mask
+        :param offset: Offset added to the results
+        :return: Detection or None if there is no target
+        """
+        raise NotImplementedError
+
+    def candidates(self, mask: np.ndarray, limit: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Bounding boxes of the best ranked blobs.
+        :param mask: Binary mask
+        :param limit: Maximum box count
+        :return: Boxes as (X, Y, Width, Height), best first
+        """
+        raise NotImplementedError
+
+
+class ContourDetector(Detector):
+    """
+    Picks the contour with the largest area.
+    """
+
+    def detect(self, mask: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> Union[Detection, None]:
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+        if len(contours) == 0:
+            return None
+
+        contour = max(contours, key=cv2.contourArea)
+        moments = cv2.moments(contour)
+        if moments["m00"] == 0:
+            return None
+
+        return Detection(
+            moments["m10"] / moments["m00"],
+            moments["m01"] / moments["m00"],
+            moments["m00"],
+            cv2.boundingRect(contour),
+            moments["m00"]
+        )
+
+    def candidates(self, mask: np.ndarray, limit: int) -> List[Tuple[int, int, int, int]]:
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = sorted(
+            (cv2.boundingRect(contour) for contour in contours),
+            key=lambda box: box[2] * box[3],
+            reverse=True
+        )
+        return boxes[:limit]
+
+
+class ComponentsDetector(Detector):
+    """
+    Labels the mask with connectedComponentsWithStats and ranks every blob at once with NumPy.
+    Score is area * fill ratio ^ fill_weight * aspect ratio ^ aspect_weight,
+    fill ratio is area / bounding box area and aspect ratio is short side / long side.
+
+    Experimental: about 15 times slower than ContourDetector on cluttered masks, and the score
+    can pick a different blob than the largest contour, centroids were up to 1620 px apart on
+    the sample video. Compare with "python -m benchmark.detectors --clutter" before using it.
+    """
+
+    def __init__(self, min_area: int = 0, fill_weight: float = 1.0, aspect_weight: float = 1.0) -> None:
+        """
+        :param min_area: Blobs smaller than this are ignored
+        :param fill_weight: Exponent of the fill ratio in the score
+        :param aspect_weight: Exponent of the aspect ratio in the score
+        """
+
+        self.min_area = min_area
+        self.fill_weight = fill_weight
+        self.aspect_weight = aspect_weight
+
+    def rank(self, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Label and score the blobs.
+        :param mask: Binary mask
+        :return: (Label indexes sorted by score, scores, stats, centroids)
+        """
+
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8, ltype=cv2.CV_32S)
+
+        # Label 0 is the background.
+        stats, centroids = stats[1:], centroids[1:]
+        area = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+        width = stats[:, cv2.CC_STAT_WIDTH]
+        height = stats[:, cv2.CC_STAT_HEIGHT]
+
+        scores = area * \
+            (area / (width * height)) ** self.fill_weight * \
+            (np.minimum(width, height) / np.maximum(width, height)) ** self.aspect_weight
+        scores[area < self.min_area] = -1
+
+        order = np.argsort(-scores, kind="stable")
+        return order[scores[order] >= 0], scores, stats, centroids
+
+    def detect(self, mask: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> Union[Detection, None]:
+        order, scores, stats, centroids = self.rank(mask)
+        if len(order) == 0:
+            return None
+
+        best = order[0]
+        x, y, width, height, area = stats[best].tolist()
+        return Detection(
+            centroids[best, 0] + offset[0],
+            centroids[best, 1] + offset[1],
+            area,
+            (x + offset[0], y + offset[1], width, height),
+            float(scores[best])
+        )
+
+    def candidates(self, mask: np.ndarray, limit: int) -> List[Tuple[int, int, int, int]]:
+        order, _, stats, _ = self.rank(mask)
+        return [tuple(box) for box in stats[order[:limit], :4].tolist()]
+
+
+def coarse_size(width: int, height: int, factor: int) -> Tuple[int, int]:
+    """
+    Size of the downscaled image in coarse to fine detection.
+    :return: (Width, Height)
+    """
+    return max(1, width // factor), max(1, height // factor)
+
+
+def coarse_to_fine(
+        image: np.ndarray,
+        create_mask: Callable[[np.ndarray], np.ndarray],
+        detector: Detector,
+        factor: int,
+        offset: Tuple[int, int] = (0, 0),
+        candidates: int = 3,
+        create_fine_mask: Union[Callable[[np.ndarray], np.ndarray], None] = None,
+        small: Union[np.ndarray, None] = None
+) -> Tuple[Union[Detection, None], np.ndarray]:
+    """
+    Find candidate blobs on the downscaled image, then threshold and detect
+    only inside the upscaled bounding boxes of the candidates at full resolution.
+    :param image: BGR image
+    :param create_mask: Thresholding function
+    :param detector: Detector to use at both resolutions
+    :param factor: Downscale factor, 2 means 1/4 of the pixels
+    :param offset: Offset added to the results
+    :param candidates: How many of the best coarse blobs are refined
+    :param create_fine_mask: Thresholding function of the full resolution regions, create_mask if None.
+    Must not overwrite the coarse mask when the masks are written into reused buffers.
+    :param small: Buffer of the downscaled image, see coarse_size()
+    :return: (Best full resolution detection or None, coarse mask)
+    """
+
+    height, width = image.shape[:2]
+    if create_fine_mask is None:
+        create_fine_mask = create_mask
+
+    small = cv2.resize(image, coarse_size(width, height, factor), small, interpolation=cv2.INTER_NEAREST)
+    coarse_mask = create_mask(small)
+
+    best = None
+    for x, y, box_width, box_height in detector.candidates(coarse_mask, candidates):
+        # One coarse pixel of margin around the box
+        start_x, start_y = max((x - 1) * factor, 0), max((y - 1) * factor, 0)
+        end_x, end_y = min((x + box_width + 1) * factor, width), min((y + box_height + 1) * factor, height)
+
+        result = detector.detect(
+            create_fine_mask(image[start_y:end_y, start_x:end_x]),
+            (offset[0] + start_x, offset[1] + start_y)
+        )
+        if result is not None and (best is None or result.score > best.score):
+            best = result
+
+    return best, coarse_mask
@@ -0,0 +1,23 @@
+"""GPIO devices of the Raspberry binding."""
+from typing import Tuple
+
+
+def devices(backend: str) -> Tuple[type, type, type]:
+    """
+    :param backend: "gpiozero", or "mock" for the mock pins of gpiozero, to run without GPIO.
+    The mock pins keep every state change with its time, see gpiozero.pins.mock.MockPin.states
+    :return: (Servo, LED, Button) classes
+    """
+
+    try:
+        from gpiozero import Device, Servo, LED, Button
+    except ImportError:
+        raise RuntimeError("GpioZero not found!")
+
+    if backend == "mock":
+        from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+        # PWM pins, the servo needs them.
+        Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+
+    return Servo, LED, Button
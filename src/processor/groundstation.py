@@ -1,176 +1,245 @@
 """Groundstation connection"""
-from typing import Tuple, Union
+from typing import List, Tuple, Union
 
-import pickle
-import socket as s
-import threading
-import time
+import asyncio
 
-import cv2
+import numpy as np
 
-from .utilities import PeriodicTimer
+from . import connection as conn
+from . import protocol
+from . import streamer
 
 
-class Groundstation:
+class StreamProtocol(asyncio.DatagramProtocol):
+    """
+    UDP endpoint of the stream. Sends only, errors are counted.
+    """
+
+    errors: int = 0
+
+    def error_received(self, exc: Exception) -> None:
+        self.errors = self.errors + 1
+
+
+class Groundstation(conn.Connection):
     """
     This class establishes the connection between groundstation and raspberry pi.
+    Everything runs on a single asyncio event loop on a background thread:
+    the TCP query connection with exponential backoff reconnects, the heartbeat
+    and the UDP stream endpoint. The processing thread only calls submit_frame().
     """
-    
-    tcp_socket: Union[s.socket, None] = None
-    udp_socket: Union[s.socket, None] = None
 
-    query_addr: Tuple[str, int]
+    name = "ground station"
+
     stream_addr: Tuple[str, int]
 
-    running: bool = True     # This will terminate connection loop if False
-    connected: bool = False  # This will prevent stream through UDP if False
-    next_try: int = 0
     heartbeat_frequency: int = 3
+    frame_id: int = 0
+
+    sent_frames: int = 0
+    congested_frames: int = 0
+
+    # Stream write buffer size that is considered congestion
+    buffer_limit: int = 256 * 1024
+
+    heartbeat_task: Union[asyncio.Task, None] = None
+    udp_transport: Union[asyncio.DatagramTransport, None] = None
+    udp_protocol: Union[StreamProtocol, None] = None
+
+    def __init__(
+            self,
+            host: str,
+            query_port: int,
+            stream_port: int,
+            quality: int = 30,
+            mtu: int = 1500,
+            bitrate: int = 2_000_000,
+            rate: float = 15.0
+    ) -> None:
+        """
+        :param host: Ground station host
+        :param query_port: TCP port
+        :param stream_port: UDP port of the stream
+        :param quality: Maximum JPEG quality of the stream
+        :param mtu: Maximum transmission unit, stream datagrams are fragmented to fit in
+        :param bitrate: Target bitrate of the stream in bits per second
+        :param rate: Maximum frames per second of the stream
+        """
 
-    heartbeat_timer: Tuple[PeriodicTimer, None] = None
-    reconnect_timer: Tuple[PeriodicTimer, None] = None
-    listen_tcp_timer: Tuple[PeriodicTimer, None] = None
-
-    def __init__(self, host: str, query_port: int, stream_port: int) -> None:
-        self.query_addr = (host, query_port)
         self.stream_addr = (host, stream_port)
-        self.thread = threading.Thread(target=self.initialize_conn)
-        self.thread.start()
+        self.mtu = mtu
+        self.streamer = streamer.StreamWorker(self.send_stream, bitrate, rate, quality)
+        self.streamer.start()
+
+        super().__init__(host, query_port)
 
-    def initialize_conn(self) -> None:
+    async def prepare(self) -> bool:
         """
-        Re-establish connection everytime connection is broken and receive messages.
+        Open the UDP endpoint of the stream if it is not open yet.
+        :return: False if it can't be opened, e.g. the host doesn't resolve yet
         """
 
-        # Connect server
-        self.tcp_socket = s.socket(s.AF_INET, s.SOCK_STREAM)
-        try:
-            self.tcp_socket.connect(self.query_addr)
-        except Exception as e:
-            print(f"Failed to connect groundstation: {e}")
-            print(f"Trying again in 3 seconds...")
-            self.tcp_socket.close()
-            
-            if self.running:
-                self.reconnect_timer = PeriodicTimer(3.0, 0.1, self.initialize_conn)
-                self.reconnect_timer.start()
-                
-            return
+        if self.udp_transport is not None:
+            return True
 
-        # Successfully connected
-        self.on_tcp_established()
-        # Start sending heartbeats
+        try:
+            self.udp_transport, self.udp_protocol = await self.loop.create_datagram_endpoint(
+                StreamProtocol,
+                remote_addr=self.stream_addr
+            )
+        except OSError as e:
+            self.failures = self.failures + 1
+            print(f"Failed to open the stream endpoint: {e}")
+            return False
 
-        # Listen server
-        self.listen_tcp()
-        # Connection terminated due to an error.
-        self.on_tcp_terminated()
-        
-        if self.running:
-            self.reconnect_timer = PeriodicTimer(3.0, 0.1, self.initialize_conn)
-            self.reconnect_timer.start()
+        return True
 
-    def terminate(self) -> None:
+    async def read(self, reader: asyncio.StreamReader) -> bytes:
         """
-        Terminate server.
+        The ground station sends lines, a line split across packets is returned whole.
         """
 
-        self.running = False
-        self.connected = False
-        if self.tcp_socket is not None:
-            self.tcp_socket.close()
-        if self.udp_socket is not None:
-            self.udp_socket.close()
-
-        if self.heartbeat_timer is not None:
-            self.heartbeat_timer.cancel()
-        if self.reconnect_timer is not None:
-            self.reconnect_timer.cancel()
-        if self.listen_tcp_timer is not None:
-            self.listen_tcp_timer.cancel()
+        while True:
+            try:
+                return await reader.readline()
+            except ValueError:
+                # Line over the reader limit, it is discarded.
+                continue
 
-    def listen_tcp(self) -> None:
+    async def heartbeat(self) -> None:
         """
-        Listen for TCP messages.
+        Send heartbeats while connected.
         """
 
-        while self.running:
+        try:
+            while self.connected:
+                await asyncio.sleep(self.heartbeat_frequency)
+                self.writer.write(b"heartbeat")
+                await self.writer.drain()
+        except OSError as e:
+            print(f"Failed to send heartbeat: {e}")
 
-            data: bytes = b''
-            try:
-                data = self.tcp_socket.recv(1024)
-            except Exception as e:
-                print(f"Unable to maintain ground station connection: {e}")
-                print("Trying to re-establish connection in 3 seconds.")
-                return
+    def terminate(self, timeout: float = 5.0) -> None:
+        """
+        Close the sockets and stop the event loop and the stream worker.
+        Returns after the loop thread is terminated.
+        :param timeout: Seconds to wait for the loop thread
+        """
 
-            self.on_tcp_message(data)
+        super().terminate(timeout)
+        self.streamer.stop()
 
-    def send_heartbeat(self) -> None:
-        if not self.running:
-            return
-        self.tcp_socket.send(b"heartbeat")
-        self.heartbeat_timer = PeriodicTimer(
-            float(self.heartbeat_frequency),
-            0.1,
-            self.send_heartbeat
-        )
-        self.heartbeat_timer.start()
+    def status(self) -> dict:
+        """
+        Connection state for inspection.
+        :return: State and counters
+        """
+
+        status = super().status()
+        status.update({
+            "sent_frames": self.sent_frames,
+            "congested_frames": self.congested_frames,
+            "skipped_frames": self.streamer.skipped,
+            "stream_errors": self.udp_protocol.errors if self.udp_protocol is not None else 0,
+            "bitrate": self.streamer.bitrate
+        })
+        return status
+
+    @property
+    def skipped(self) -> int:
+        """
+        :return: Frames replaced in the stream mailbox before being encoded
+        """
+        return self.streamer.skipped
 
-    def send_udp_message(self, frame) -> None:
+    def submit_frame(self, frame: np.ndarray) -> None:
         """
-        Stream frame to the groundstation.
+        Stream frame to the groundstation. Thread-safe, called from the processing thread.
+        Only hands the frame to the stream worker, encoding happens on its thread.
         :param frame: Frame
         """
 
-        # Cooldown & connection check
-        if self.next_try > time.time() or not self.connected:
+        if not self.connected:
             return
 
-        # Convert to byte array
-        encoded, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 30])
-        data = pickle.dumps(buffer)
+        self.streamer.submit(frame)
+
+    def send_stream(self, payload: bytes) -> bool:
+        """
+        Split the encoded frame into datagrams and send them on the event loop. Called from the stream worker.
+        :param payload: JPEG frame
+        :return: False if the stream is congested
+        """
+
+        if not self.connected or self.udp_transport is None:
+            return True
+
+        if self.udp_transport.get_write_buffer_size() > self.buffer_limit:
+            self.congested_frames = self.congested_frames + 1
+            return False
+
+        datagrams = protocol.fragment(self.frame_id, payload, protocol.Codec.JPEG, self.mtu)
+        self.frame_id = (self.frame_id + 1) & 0xFFFFFFFF
+        self.sent_frames = self.sent_frames + 1
 
-        # Stream
         try:
-            self.udp_socket.sendto(data, self.stream_addr)
-        except OSError as e:
-            if not self.connected:
-                return
-            self.next_try = int(time.time()) + 1000
-            print(f"Failed to stream output to groundstation: {e}")
-            print("Trying again")
+            self.loop.call_soon_threadsafe(self.send_datagrams, datagrams)
+        except RuntimeError:
+            # Loop is closed
+            return True
+
+        return True
 
-    def on_tcp_message(self, data: bytes) -> None:
+    def send_datagrams(self, datagrams: List[bytes]) -> None:
         """
-        Triggered when a packet is caught.
-        :param data: Packet
+        Runs on the event loop.
+        :param datagrams: Fragments of a frame
         """
-        pass
 
-    def on_tcp_established(self) -> None:
+        if self.udp_transport is None or self.udp_transport.is_closing():
+            return
+
+        for datagram in datagrams:
+            self.udp_transport.sendto(datagram)
+
+    def on_message(self, line: bytes) -> None:
+        """
+        Triggered when a line is received.
+        Ground station can send "report <received> <lost>" and "bitrate <bits per second>" lines
+        to adapt the stream.
+        :param line: Line
+        """
+
+        fields = line.decode(errors="ignore").split()
+        try:
+            if len(fields) == 3 and fields[0] == "report":
+                self.streamer.report(int(fields[1]), int(fields[2]))
+            elif len(fields) == 2 and fields[0] == "bitrate":
+                self.streamer.set_target(int(fields[1]))
+        except ValueError:
+            pass
+
+    def on_established(self) -> None:
         """
         Triggered when tcp connection is established.
         """
 
-        self.udp_socket = s.socket(s.AF_INET, s.SOCK_DGRAM)
-        self.connected = True
-        self.heartbeat_timer = PeriodicTimer(
-            float(self.heartbeat_frequency),
-            0.1,
-            self.send_heartbeat
-        )
-        self.heartbeat_timer.start()
-        
         print("Connection with the ground station has successfully established!")
+        self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
 
-    def on_tcp_terminated(self) -> None:
+    def on_terminated(self) -> None:
         """
         Triggered when tcp connection is broken.
         """
 
-        self.tcp_socket.close()
-        self.connected = False
-        
-        if self.udp_socket is not None:
-            self.udp_socket.close()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
+    def on_closed(self) -> None:
+        """
+        Close the stream endpoint.
+        """
+
+        if self.udp_transport is not None:
+            self.udp_transport.close()
@@ -0,0 +1,54 @@
+"""Color masks."""
+from typing import Union
+
+import numpy as np
+import cv2
+
+
+def in_hsv_range(
+        frame_hsv: np.ndarray,
+        lower_hsv: np.ndarray,
+        upper_hsv: np.ndarray,
+        dst: Union[np.ndarray, None] = None,
+        scratch: Union[np.ndarray, None] = None
+) -> np.ndarray:
+    """
+    Same as cv2.inRange but hue ranges wrap past 180 when lower hue is greater than the upper hue.
+    :param frame_hsv: HSV frame
+    :param lower_hsv: Lower HSV threshold
+    :param upper_hsv: Upper HSV threshold
+    :param dst: Mask buffer, allocated if None
+    :param scratch: Second mask buffer for wrapped hue ranges, allocated if None
+    :return: Binary mask
+    """
+
+    if lower_hsv[0] <= upper_hsv[0]:
+        return cv2.inRange(frame_hsv, lower_hsv, upper_hsv, dst)
+
+    # Red targets: [lower_h, 180] + [0, upper_h]
+    high = cv2.inRange(frame_hsv, lower_hsv, np.array([180, upper_hsv[1], upper_hsv[2]], np.uint8), dst)
+    low = cv2.inRange(frame_hsv, np.array([0, lower_hsv[1], lower_hsv[2]], np.uint8), upper_hsv, scratch)
+    return cv2.bitwise_or(high, low, high)
+
+
+def hsv_mask(
+        frame: np.ndarray,
+        lower_hsv: np.ndarray,
+        upper_hsv: np.ndarray,
+        hsv: Union[np.ndarray, None] = None,
+        dst: Union[np.ndarray, None] = None,
+        scratch: Union[np.ndarray, None] = None
+) -> np.ndarray:
+    """
+    Convert BGR frame to HSV and threshold it.
+    :param frame: BGR frame
+    :param lower_hsv: Lower HSV threshold
+    :param upper_hsv: Upper HSV threshold
+    :param hsv: HSV frame buffer, allocated if None
+    :param dst: Mask buffer, allocated if None
+    :param scratch: Second mask buffer for wrapped hue ranges, allocated if None
+    :return: Binary mask
+    """
+
+    return in_hsv_range(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, hsv), lower_hsv, upper_hsv, dst, scratch)
+
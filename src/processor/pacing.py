@@ -0,0 +1,97 @@
+"""Frame deadlines and load shedding."""
+from typing import Dict, Union
+
+import time
+
+
+class FramePacer:
+    """
+    Gives every frame a deadline one source frame period after it is captured, the processing
+    must be done by then to keep up with the source. Slack is the time left at the deadline.
+
+    The loop itself never sleeps, it waits for the next frame in the capture which paces the source.
+    When a frame misses its deadline, the optional work is shed one step at a time in SHED_ORDER,
+    and it comes back one step at a time after enough frames finish with slack to spare.
+    Unthrottled pacing has no deadlines and sheds nothing.
+    """
+
+    SHED_ORDER = ("overlay", "preview", "stream")
+
+    shed: int = 0          # Number of optional works shed, from the start of SHED_ORDER
+    frames: int = 0        # Frames with a deadline
+    missed: int = 0        # Frames that missed their deadline
+    spare_frames: int = 0  # Consecutive frames with spare slack
+    slack: float = 0.0     # Slack of the last frame in seconds, negative if missed
+    min_slack: Union[float, None] = None
+
+    def __init__(
+            self,
+            fps: float,
+            unthrottled: bool = False,
+            headroom: float = 0.25,
+            recover_frames: int = 30
+    ) -> None:
+        """
+        :param fps: Source frame rate, 30 is assumed if unknown
+        :param unthrottled: Run as fast as the frames come, without deadlines
+        :param headroom: Slack as a fraction of the period that is considered spare
+        :param recover_frames: Consecutive frames with spare slack to bring back one shed work
+        """
+
+        self.period = 0.0 if unthrottled else 1 / (fps if fps > 0 else 30)
+        self.headroom = headroom * self.period
+        self.recover_frames = recover_frames
+        self.order: Dict[str, int] = {work: i for i, work in enumerate(self.SHED_ORDER)}
+
+    def runs(self, work: str) -> bool:
+        """
+        :param work: One of SHED_ORDER
+        :return: Should the optional work run for this frame
+        """
+        return self.order[work] >= self.shed
+
+    def end_frame(self, timestamp: float) -> float:
+        """
+        Measure the slack of the frame and shed or restore the optional work.
+        :param timestamp: Capture timestamp of the frame
+        :return: Slack in seconds
+        """
+
+        if self.period == 0:
+            return 0.0
+
+        self.slack = timestamp + self.period - time.monotonic()
+        self.frames = self.frames + 1
+        if self.min_slack is None or self.slack < self.min_slack:
+            self.min_slack = self.slack
+
+        if self.slack < 0:
+            self.missed = self.missed + 1
+            self.spare_frames = 0
+            if self.shed < len(self.SHED_ORDER):
+                print(f"Frame missed its deadline by {-self.slack * 1000:.1f} ms, shedding {self.SHED_ORDER[self.shed]}.")
+                self.shed = self.shed + 1
+        elif self.slack > self.headroom:
+            self.spare_frames = self.spare_frames + 1
+            if self.shed > 0 and self.spare_frames >= self.recover_frames:
+                self.shed = self.shed - 1
+                self.spare_frames = 0
+                print(f"Frames are on time, restoring {self.SHED_ORDER[self.shed]}.")
+        else:
+            self.spare_frames = 0
+
+        return self.slack
+
+    def summary(self) -> str:
+        """
+        :return: One line summary
+        """
+
+        if self.period == 0:
+            return "Pacing: unthrottled"
+
+        min_slack = self.min_slack * 1000 if self.min_slack is not None else 0.0
+        return (
+            f"Pacing: {1 / self.period:.1f} FPS target, {self.missed}/{self.frames} frames missed the deadline, "
+            f"min slack {min_slack:.1f} ms, {self.shed} shed"
+        )
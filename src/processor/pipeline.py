@@ -0,0 +1,161 @@
+"""Detection path of the processor, without any capture, window, binding or network."""
+from typing import Tuple, Union
+
+import numpy as np
+
+from . import buffers
+from . import config as conf
+from . import detection
+from . import masking
+from . import profiler as prof
+from . import properties
+from . import tracker as trk
+
+
+class DetectionPipeline:
+    """
+    Thresholds the frame and finds the target according to the config:
+    detector backend, coarse to fine factor and region of interest tracking.
+    """
+
+    tracker: Union[trk.RoiTracker, None] = None
+    pyramid_factor: int = 1
+    detector: detection.Detector
+
+    # Tuning of the frame being processed
+    tuning: properties.Tuning
+
+    def __init__(
+            self,
+            config: Union[conf.ConfigUtil, conf.Config],
+            profiler: prof.Profiler,
+            pool: Union[buffers.BufferPool, None] = None
+    ) -> None:
+        """
+        :param config: Config or a snapshot of it, e.g. in a worker process
+        :param profiler: Stage timers
+        :param pool: Buffers of the masks, a disabled pool if None
+        """
+
+        self.profiler = profiler
+        self.pool = pool if pool is not None else buffers.BufferPool(False)
+        settings = config.snapshot if isinstance(config, conf.ConfigUtil) else config
+
+        # Detector backend
+        if settings.opencv.detector == "components":
+            self.detector = detection.ComponentsDetector(
+                settings.opencv.min_blob_area,
+                settings.opencv.fill_weight,
+                settings.opencv.aspect_weight
+            )
+        else:
+            self.detector = detection.ContourDetector()
+
+        # Coarse to fine detection
+        self.pyramid_factor = settings.opencv.pyramid_factor
+
+        # Region of interest tracking
+        if settings.opencv.tracking:
+            self.tracker = trk.RoiTracker(
+                settings.opencv.tracking_window,
+                settings.opencv.tracking_max_misses
+            )
+
+    def reserve(self, width: int, height: int) -> None:
+        """
+        Fill the pool with the full frame buffers up front, so the first frames don't allocate them.
+        :param width: Frame width
+        :param height: Frame height
+        """
+
+        if not self.pool.enabled:
+            return
+
+        self.tuning = properties.Properties.tuning
+        frame = np.zeros((height, width, 3), np.uint8)
+        self.create_mask(frame)
+
+        if self.pyramid_factor > 1:
+            small_width, small_height = detection.coarse_size(width, height, self.pyramid_factor)
+            self.create_mask(self.pool.get("coarse-image", (small_height, small_width, 3)))
+
+    def create_mask(self, image: np.ndarray, name: str = "mask") -> np.ndarray:
+        """
+        Threshold the image with the thresholds of the current frame.
+        :param image: BGR image
+        :param name: Buffer name of the mask, masks with different names don't overwrite each other
+        :return: Binary mask
+        """
+
+        height, width = image.shape[:2]
+        return masking.hsv_mask(
+            image,
+            self.tuning.lower_hsv,
+            self.tuning.upper_hsv,
+            self.pool.get(f"{name}-hsv", (height, width, 3)),
+            self.pool.get(name, (height, width)),
+            self.pool.get(f"{name}-scratch", (height, width))
+        )
+
+    def create_fine_mask(self, image: np.ndarray) -> np.ndarray:
+        """
+        Mask of a full resolution region in coarse to fine mode, kept apart from the coarse mask.
+        :param image: BGR image
+        :return: Binary mask
+        """
+        return self.create_mask(image, "fine-mask")
+
+    def detect(
+            self,
+            frame: np.ndarray,
+            timestamp: float,
+            tuning: properties.Tuning
+    ) -> Tuple[Union[detection.Detection, None], np.ndarray, Tuple[int, int, int, int]]:
+        """
+        Find the target in the frame.
+        :param frame: BGR frame
+        :param timestamp: Capture timestamp of the frame
+        :param tuning: Tuning to take the thresholds from
+        :return: (Detection or None, mask of the searched region, searched region as (Start X, Start Y, End X, End Y))
+        Mask is downscaled by the pyramid factor in coarse to fine mode.
+        """
+
+        frame_h, frame_w = frame.shape[:2]
+        self.tuning = tuning
+        t = self.profiler.start()
+
+        # Search only around the predicted position while tracking.
+        window = None
+        if self.tracker is not None:
+            window = self.tracker.search_window(timestamp, frame_w, frame_h)
+        if window is None:
+            window = (0, 0, frame_w, frame_h)
+        start_x, start_y, end_x, end_y = window
+
+        # Create the mask and find the target.
+        region = frame[start_y:end_y, start_x:end_x]
+        if self.pyramid_factor > 1:
+            small_width, small_height = detection.coarse_size(end_x - start_x, end_y - start_y, self.pyramid_factor)
+            target, mask = detection.coarse_to_fine(
+                region,
+                self.create_mask,
+                self.detector,
+                self.pyramid_factor,
+                (start_x, start_y),
+                create_fine_mask=self.create_fine_mask,
+                small=self.pool.get("coarse-image", (small_height, small_width, 3))
+            )
+            self.profiler.lap("detect", t)
+        else:
+            mask = self.create_mask(region)
+            t = self.profiler.lap("mask", t)
+            target = self.detector.detect(mask, (start_x, start_y))
+            self.profiler.lap("detect", t)
+
+        if self.tracker is not None:
+            if target is not None:
+                self.tracker.update(timestamp, (int(target.x), int(target.y)), target.box[2:])
+            else:
+                self.tracker.update(timestamp, None)
+
+        return target, mask, window
@@ -0,0 +1,171 @@
+"""Preview window frames."""
+from typing import List, Tuple, Union
+
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from . import utilities
+
+
+class PreviewFrame:
+    """
+    Raw frame published for the preview with what is needed to compose it.
+    """
+
+    __slots__ = ("image", "mask", "window", "overlay", "version")
+
+    image: Union[np.ndarray, None]  # BGR frame before the visualizations are drawn
+    mask: Union[np.ndarray, None]   # Mask of the searched region, may be downscaled
+    window: Tuple[int, int, int, int]  # Searched region as (Start X, Start Y, End X, End Y)
+    overlay: Union[tuple, None]     # (Target center or None, collision box, collision state), None to draw nothing
+    version: int
+
+    def __init__(self) -> None:
+        self.image = None
+        self.mask = None
+        self.window = (0, 0, 0, 0)
+        self.overlay = None
+        self.version = 0
+
+
+class PreviewPublisher:
+    """
+    Hands the latest processed frame from the processing thread to the window.
+    The processing thread only copies the raw frame and the mask into a free slot, at most fps times per second.
+    The window composes the masked image, the visualizations, resizing and color conversion on its own thread,
+    into a single reused buffer, and only when there is a new version.
+    """
+
+    slots: List[PreviewFrame]
+    latest: Union[int, None] = None   # Slot index of the latest frame
+    reading: Union[int, None] = None  # Slot index held by the window
+    version: int = 0                  # Version of the latest frame
+
+    published: int = 0  # Frames copied for the preview
+    skipped: int = 0    # Frames not copied due to the rate limit
+    composed: int = 0   # Frames composed by the window
+
+    next_due: float = 0.0
+
+    def __init__(self, fps: float = 15.0, size: Tuple[int, int] = (640, 360)) -> None:
+        """
+        :param fps: Maximum preview frames per second
+        :param size: Size of each half of the preview as (Width, Height)
+        """
+
+        self.period = 1 / fps if fps > 0 else 0.0
+        self.size = size
+        self.slots = [PreviewFrame() for _ in range(3)]
+        self.lock = threading.Lock()
+
+        width, height = size
+        self.composite = np.zeros((height, width * 2, 3), np.uint8)
+        self.output: Union[np.ndarray, None] = None  # Masked frame
+        self.scaled_mask: Union[np.ndarray, None] = None
+
+    def due(self) -> bool:
+        """
+        Called by the processing thread to skip the copy when the preview doesn't need a frame.
+        :return: Should the current frame be published
+        """
+
+        if time.monotonic() >= self.next_due:
+            return True
+
+        self.skipped = self.skipped + 1
+        return False
+
+    def publish(
+            self,
+            image: np.ndarray,
+            mask: np.ndarray,
+            window: Tuple[int, int, int, int],
+            overlay: Union[tuple, None]
+    ) -> None:
+        """
+        Copy the frame into a free slot and make it the latest.
+        :param image: BGR frame before the visualizations are drawn
+        :param mask: Mask of the searched region
+        :param window: Searched region as (Start X, Start Y, End X, End Y)
+        :param overlay: (Target center or None, collision box, collision state), None to draw nothing
+        """
+
+        now = time.monotonic()
+        self.next_due = max(self.next_due + self.period, now)
+
+        # Pick a slot that is neither the latest frame nor held by the window.
+        with self.lock:
+            index = 0
+            while index == self.latest or index == self.reading:
+                index = index + 1
+
+        slot = self.slots[index]
+        if slot.image is None or slot.image.shape != image.shape:
+            slot.image = np.empty_like(image)
+        if slot.mask is None or slot.mask.shape != mask.shape:
+            slot.mask = np.empty_like(mask)
+        np.copyto(slot.image, image)
+        np.copyto(slot.mask, mask)
+        slot.window = window
+        slot.overlay = overlay
+
+        with self.lock:
+            self.version = self.version + 1
+            slot.version = self.version
+            self.latest = index
+            self.published = self.published + 1
+
+    def take(self, version: int) -> Union[PreviewFrame, None]:
+        """
+        Called by the window. The returned frame stays valid until the next call.
+        :param version: Version already shown
+        :return: Latest frame if it is newer than the version
+        """
+
+        with self.lock:
+            self.reading = None
+            if self.latest is None or self.version <= version:
+                return None
+
+            self.reading = self.latest
+            return self.slots[self.latest]
+
+    def compose(self, frame: PreviewFrame) -> np.ndarray:
+        """
+        Frame with the visualizations on the left, masked frame on the right, in RGB.
+        :param frame: Frame returned by take()
+        :return: Composite, reused by the next call
+        """
+
+        image = frame.image
+        start_x, start_y, end_x, end_y = frame.window
+
+        # Masked image, before the visualizations are drawn
+        if self.output is None or self.output.shape != image.shape:
+            self.output = np.empty_like(image)
+        self.output.fill(0)
+
+        region = image[start_y:end_y, start_x:end_x]
+        mask = frame.mask
+        if mask.shape[:2] != region.shape[:2]:
+            if self.scaled_mask is None or self.scaled_mask.shape != region.shape[:2]:
+                self.scaled_mask = np.empty(region.shape[:2], np.uint8)
+            mask = cv2.resize(mask, (end_x - start_x, end_y - start_y), self.scaled_mask, interpolation=cv2.INTER_NEAREST)
+        cv2.bitwise_and(region, region, self.output[start_y:end_y, start_x:end_x], mask=mask)
+
+        if frame.overlay is not None:
+            center, box, collision = frame.overlay
+            utilities.draw_visualization(image, center, box, collision)
+
+        width, height = self.size
+        left, right = self.composite[:, :width], self.composite[:, width:]
+        cv2.resize(image, self.size, left)
+        cv2.cvtColor(left, cv2.COLOR_BGR2RGB, left)
+        cv2.resize(self.output, self.size, right)
+        cv2.cvtColor(right, cv2.COLOR_BGR2RGB, right)
+
+        self.composed = self.composed + 1
+        return self.composite
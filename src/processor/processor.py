@@ -1,30 +1,50 @@
 """Image processing."""
-from typing import Tuple
+from typing import List, Tuple
 
 import datetime
 import threading
+import time
 import os
 
-import numpy as np
 import PIL.Image
 import PIL.ImageTk
 import cv2
 
 from . import groundstation as gs
 from . import config as conf
+from . import buffers
+from . import capture as cap
+from . import recorder as rec
+from . import pacing
+from . import pipeline as pipe
+from . import preview as prev
+from . import profiler as prof
+from . import telemetry as tel
 from . import properties
 from . import windowless
 from . import utilities
 from . import windowed
+from . import workers as work
 from . import savelog
 from . import binder
 
 
+class State:
+    """
+    Power state of the processing loop.
+    """
+
+    STANDBY = "standby"  # Power is off, the capture only grabs
+    ARMED = "armed"      # Power is on, every frame is processed
+
+
 class Processor:
     """
     Processor going to call bindings according to processed video.
     """
 
+    ARM_BUDGET = 100.0  # Milliseconds from the power button to the first processed frame
+
     bindings: binder.Bindings
     properties: properties.Properties
     config: conf.ConfigUtil
@@ -33,12 +53,31 @@ class Processor:
     record: bool
 
     collided: bool = False
+    acquired: bool = False
     continue_processing: bool = True
-
-    result: cv2.VideoWriter = None
+    exited: bool = False  # Teardown is done, see safe_exit()
+    state: str = State.STANDBY
+    processing_thread: threading.Thread = None  # Runs start_loop() while the window has the main thread
+
+    arm_time: float = None  # Power button time, until the first frame after it is processed
+    arm_count: int = 0
+    arm_total: float = 0.0  # Milliseconds
+    arm_max: float = 0.0
+
+    result: rec.AsyncRecorder = None
+    closing: List[rec.AsyncRecorder] = []  # Released recorders still writing
+    telemetry: tel.TelemetryLog = None
     capture: cv2.VideoCapture = None
-
-    final_output: np.ndarray = None
+    capture_thread: cap.CaptureThread = None
+    workers: work.Workers = None
+
+    publisher: prev.PreviewPublisher = None
+    pool: buffers.BufferPool
+    box_key: Tuple[int, int, int] = None  # Tuning version and frame size of the cached collision box
+    box: Tuple[int, int, int, int] = None
+    pipeline: pipe.DetectionPipeline
+    profiler: prof.Profiler
+    pacer: pacing.FramePacer
     groundstation: gs.Groundstation = None
 
     def __init__(self) -> None:
@@ -46,25 +85,46 @@ class Processor:
         # Configuration
         config = conf.ConfigUtil()
         self.config = config
-        self.preview = self.config.get_bool("general.preview")
-        self.visualize = self.config.get_bool("general.visualize-processing")
-        self.record = self.config.get_bool("general.record")
-        self.logging = config.get_bool("general.logging")
+        settings = config.snapshot
+        self.preview = settings.general.preview
+        self.visualize = settings.general.visualize_processing
+        self.record = settings.general.record
+        self.logging = settings.general.logging
+        self.telemetry_enabled = settings.general.telemetry
+
+        # Stage timers
+        self.profiler = prof.Profiler(
+            ["capture", "mask", "detect", "latency", "overlay", "record", "stream", "preview", "slack"],
+            settings.general.profiling,
+            interval=settings.general.profiling_interval
+        )
+
+        # Detection path, stages write into preallocated buffers
+        self.pool = buffers.BufferPool(settings.general.buffer_pool)
+        self.pipeline = pipe.DetectionPipeline(config, self.profiler, self.pool)
+
+        # Composed on the window thread at the preview rate
+        if self.preview:
+            self.publisher = prev.PreviewPublisher(settings.general.preview_fps)
 
         # Unique folder
         self.record_dir = os.path.abspath(os.path.join(
-            config.get_string('general.record-dir'),
+            settings.general.record_dir,
             f"recording {datetime.datetime.now().strftime('%d.%m.%Y %H-%M-%S')}"
         ))
         if (
                 not os.path.exists(self.record_dir) and
-                (self.logging or self.record)
+                (self.logging or self.record or self.telemetry_enabled)
         ):
             os.makedirs(self.record_dir)
 
         # Logging
         if self.logging:
-            savelog.initialize(self.record_dir)
+            savelog.initialize(
+                self.record_dir,
+                settings.general.log_queue,
+                settings.general.log_sync_interval
+            )
 
         print(f"""Information:
 Output directory: {self.record_dir}
@@ -74,14 +134,14 @@ Logging:\t{'Enabled' if self.logging else 'Disabled'}"""
               )
 
         # Bindings
-        mode = config.get_string("general.video-source").lower()
+        mode = settings.general.video_source
         if mode == "simulator":
             # Simulator Mode.
             print("Binder: Simulator")
             print("Connecting to the server...")
             self.bindings = binder.Simulator(
-                config.get_string("simulator.host"), 
-                config.get_int("simulator.port")
+                settings.simulator.host, 
+                settings.simulator.port
             )
         elif mode == "file":
             # File Mode
@@ -94,41 +154,54 @@ Logging:\t{'Enabled' if self.logging else 'Disabled'}"""
         else:
             # Raspberry Pi Mode
             print("Binder: Raspberry")
-            self.bindings = binder.Raspberry()
+            self.bindings = binder.Raspberry(settings.general.gpio)
 
-        # Get webcam capture
-        if self.config.get_string("general.video-source") == "file":
-            src_video_path = self.config.get_string("file.video-path")
-            print(f"Capture initializing with file #{src_video_path}")
-            self.capture = cv2.VideoCapture(src_video_path)
+        if settings.general.multiprocess:
+            # Capture, recording and streaming run in their own processes over a shared frame ring.
+            self.workers = work.Workers(settings, self.record_dir)
+            self.capture_thread = self.workers.start()
         else:
-            cam = self.config.get_int("general.camera-index")
-            print(f"Capture initializing with video input #{cam}")
-            self.capture = cv2.VideoCapture(cam)
-            if self.capture.isOpened(): print("Capture opened!")
-
-        # Fix size for simulator.
-        if self.config.get_string("general.video-source") == "simulator":
-            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-
-        self.capture.set(cv2.CAP_PROP_FPS, 30)
-
-        if self.config.get_bool("groundstation.enabled"):
+            # Read frames on a dedicated thread so the processing always gets the freshest one.
+            self.capture = cap.open_capture(settings)
+            self.capture_thread = cap.CaptureThread(
+                self.capture,
+                settings.general.capture_buffers,
+                settings.general.video_source == "file",
+                settings.general.pacing == "source"
+            )
+            self.capture_thread.start()
+        self.reserve_buffers(*self.get_capture_size())
+
+        # Frame deadlines at the source frame rate
+        self.pacer = pacing.FramePacer(self.capture_thread.fps, settings.general.pacing == "unthrottled")
+        # Frames that take longer than the source frame period are late, also when unthrottled.
+        fps = self.capture_thread.fps
+        self.profiler.set_budget(1 / (fps if fps > 0 else 30))
+
+        if self.workers is not None:
+            self.groundstation = self.workers.stream
+        elif settings.groundstation.enabled:
             self.groundstation = gs.Groundstation(
-                self.config.get_string("groundstation.host"),
-                self.config.get_int("groundstation.query_port"),
-                self.config.get_int("groundstation.stream_port"),
+                settings.groundstation.host,
+                settings.groundstation.query_port,
+                settings.groundstation.stream_port,
+                settings.groundstation.stream_quality,
+                settings.groundstation.mtu,
+                settings.groundstation.stream_bitrate * 1000,
+                settings.groundstation.stream_fps
             )
 
+        # Apply the config file changes without a restart.
+        config.watch(self.on_config_reload)
+
         # Main loop
         if self.preview:
 
             self.properties = windowed.Windowed(self.config)
             print("Properties set to window.")
 
-            processing_thread = threading.Thread(target=self.start_loop)
-            processing_thread.start()
+            self.processing_thread = threading.Thread(target=self.start_loop)
+            self.processing_thread.start()
 
             # Create window loop in another thread
             self.tkinter_loop()
@@ -137,14 +210,64 @@ Logging:\t{'Enabled' if self.logging else 'Disabled'}"""
             try: 
                 self.start_loop()
             except KeyboardInterrupt:
+                pass
+            finally:
                 self.safe_exit()
 
+    def on_config_reload(self, settings: conf.Config) -> None:
+        """
+        Called on the scheduler thread when the config changes.
+        Thresholds and the collision box are applied at once, other changes need a restart.
+        :param settings: New config
+        """
+
+        # Window sliders are the source of the properties in preview.
+        if self.preview or not hasattr(self, "properties"):
+            return
+
+        self.properties.load(settings.opencv)
+        print("Thresholds and collision box are reloaded, other changes are applied on restart.")
+
+    def collision_box(self, tuning: properties.Tuning, frame_w: int, frame_h: int) -> Tuple[int, int, int, int]:
+        """
+        Collision box corners, computed again only if the tuning or the frame size is changed.
+        :param tuning: Tuning of the frame
+        :param frame_w: Frame width
+        :param frame_h: Frame height
+        :return: (Start X, Start Y, End X, End Y)
+        """
+
+        key = (tuning.version, frame_w, frame_h)
+        if key != self.box_key:
+            self.box = tuning.box(frame_w, frame_h)
+            self.box_key = key
+        return self.box
+
+    def reserve_buffers(self, width: int, height: int) -> None:
+        """
+        Size the buffer pool once for the capture.
+        :param width: Frame width
+        :param height: Frame height
+        """
+
+        # Capture could not be opened, the loop stops at once.
+        if width <= 0 or height <= 0:
+            return
+
+        self.pipeline.reserve(width, height)
+
+        if self.pool.enabled:
+            print(f"Buffer pool: {self.pool.allocations} buffers, {self.pool.nbytes() / (1024 * 1024):.1f} MB")
+
     def get_capture_size(self) -> Tuple[int, int]:
         """
         Returns the size of the 'self.capture'
         :return: (Width, Height)
         """
 
+        if self.capture is None:
+            return self.capture_thread.size
+
         frame_width = int(self.capture.get(3))
         frame_height = int(self.capture.get(4))
         return frame_width, frame_height
@@ -152,139 +275,233 @@ Logging:\t{'Enabled' if self.logging else 'Disabled'}"""
     def safe_exit(self) -> None:
         """
         Ensure all the threads are terminated.
+        Stops the processing loop and waits for it, then tears everything down once.
         """
         
         self.continue_processing = False
-        self.groundstation.terminate()
+        if self.exited:
+            return
+        self.exited = True
+
+        # Ends within a second, the standby wait for the power button times out.
+        if self.processing_thread is not None and self.processing_thread is not threading.current_thread():
+            self.processing_thread.join()
+
+        self.capture_thread.stop()
+        if self.capture is not None:
+            self.capture.release()
+        print(
+            f"Capture over: {self.capture_thread.captured} frames captured, "
+            f"{self.capture_thread.dropped} dropped."
+        )
+        if self.profiler.enabled:
+            print(self.profiler.summary())
+        print(self.pacer.summary())
+        print(self.arm_summary())
+
+        # Flush and close the recording.
+        self.close_segment(wait=True)
+
+        if self.groundstation is not None:
+            self.groundstation.terminate()
+
+        if self.workers is not None:
+            self.workers.stop()
+
+        self.bindings.close()
+        self.config.unwatch()
+        utilities.scheduler.shutdown()
     
-    def start_loop(self) -> None:
+    def open_segment(self) -> None:
         """
-        Main loop for image processing.
+        Open the recording and the telemetry of the next armed period.
+        Opened ahead of the power button, so arming only has to resume the capture.
         """
 
-        # Create recording if enabled.
-        video_path = os.path.join(self.record_dir, "video.avi")
-        num = 0
-        while os.path.isfile(video_path):
-            num = num + 1
-            video_path = os.path.join(self.record_dir, f"video_{num}.avi")
+        settings = self.config.snapshot
 
-        if self.record:
-            print(f"Recording video: {video_path}")
-            size = self.get_capture_size()
-            self.result = cv2.VideoWriter(os.path.abspath(video_path), cv2.VideoWriter_fourcc(*'XVID'), 30, size)
-            self.result.set(cv2.CAP_PROP_HW_ACCELERATION, cv2.CAP_DSHOW)
-            print("Record started.")
+        if self.record and self.workers is not None:
+            self.result = self.workers.record(settings, ahead=True)
+        elif self.record:
+            self.result = rec.open_recorder(settings.general, self.record_dir, self.get_capture_size())
+            for recorder in self.closing:
+                self.result.take_buffers(recorder)
 
-        # Windowed
-        if not self.preview:
-            self.properties = windowless.Windowless(self.config)
-            print("Properties set to config.")
+        # Per frame telemetry
+        if self.telemetry_enabled:
+            self.telemetry = tel.TelemetryLog(utilities.unique_path(self.record_dir, "telemetry", ".bin"))
 
-        while self.bindings.power():
+    def close_segment(self, wait: bool = False) -> None:
+        """
+        Close the recording and the telemetry of the armed period.
+        Empty ones, e.g. opened ahead but never armed, are removed when they are closed.
+        :param wait: Wait until the recordings being closed are written
+        """
 
-            # Terminate
-            if not self.continue_processing or not self.capture.isOpened():
-                self.capture.release()
+        if self.result is not None:
+            self.result.release(wait)
+            # Written on its own thread meanwhile, joined on exit.
+            if not wait and self.workers is None and self.result not in self.closing:
+                self.closing = [r for r in self.closing if r.thread.is_alive()] + [self.result]
 
-                if self.result is not None:
-                    self.result.release()
+        if self.telemetry is not None:
+            self.telemetry.close()
 
-                return
+        if wait:
+            for recorder in self.closing:
+                recorder.release()
+            self.closing = []
 
-            self.process()
-            cv2.waitKey(5)
+    def arm(self) -> None:
+        """
+        Power is on, resume the capture. The segment is already open.
+        """
+
+        # From the button edge if the binding tracks it
+        edge = self.bindings.power_time
+        self.arm_time = edge if edge is not None else time.monotonic()
+        self.capture_thread.standby(False)
+        self.state = State.ARMED
+        print("Armed.")
+
+    def disarm(self) -> None:
+        """
+        Power is off, close the segment and open the next one while the capture only grabs.
+        """
 
         print("Record over.")
+        self.capture_thread.standby(True)
+        self.state = State.STANDBY
+        self.close_segment()
+        self.open_segment()
 
-        if self.result is not None:
-            self.result.release()
+    def armed(self) -> None:
+        """
+        Called for the first processed frame after arming.
+        """
+
+        delay = (time.monotonic() - self.arm_time) * 1000
+        self.arm_count = self.arm_count + 1
+        self.arm_total = self.arm_total + delay
+        self.arm_max = max(self.arm_max, delay)
+        self.arm_time = None
+
+        warning = f", over the {self.ARM_BUDGET:.0f} ms budget" if delay > self.ARM_BUDGET else ""
+        print(f"First frame {delay:.1f} ms after arming{warning}.")
+
+    def arm_summary(self) -> str:
+        """
+        :return: One line summary of the button to first frame delays
+        """
+
+        if self.arm_count == 0:
+            return "Arming: never armed"
+
+        return (
+            f"Arming: {self.arm_count} times, first frame after {self.arm_total / self.arm_count:.1f} ms on average, "
+            f"{self.arm_max:.1f} ms max"
+        )
+
+    def start_loop(self) -> None:
+        """
+        Main loop for image processing. Switches between standby and armed with the power button,
+        the capture stays open and the next segment is opened ahead in standby.
+        Returns when the capture ends or safe_exit() is called.
+        """
+
+        # Windowed
+        if not self.preview:
+            self.properties = windowless.Windowless(self.config)
+            print("Properties set to config.")
+
+        self.open_segment()
+        self.capture_thread.standby(True)
+        self.state = State.STANDBY
+
+        while self.continue_processing and self.capture_thread.running:
+
+            if self.workers is not None:
+                self.workers.check()
+
+            if self.state == State.STANDBY:
+                # Woken by the power button.
+                if self.bindings.wait_for_power(1.0):
+                    self.arm()
+            elif not self.bindings.power():
+                self.disarm()
+            elif self.process() and self.arm_time is not None:
+                self.armed()
 
-        while not self.bindings.power():
-            cv2.waitKey(100)
+        if self.capture_thread.failed:
+            print("Capture is lost, processing is stopped.")
 
-        self.start_loop()
+        # Terminated, torn down by safe_exit()
 
     def tkinter_loop(self) -> None:
         """
         Initialize window loop.
         """
 
-        def mainloop():
-            if self.final_output is None:
-                self.properties.capture_canvas.after(5, mainloop)
-                return
+        canvas = self.properties.capture_canvas
+        # Poll twice per preview frame, composing happens here only when there is a new frame.
+        interval = max(int(self.publisher.period * 500), 5)
+        shown = 0
 
-            img = PIL.Image.fromarray(self.final_output)
-            imgtk = PIL.ImageTk.PhotoImage(image=img)
-            self.properties.capture_canvas.imgtk = imgtk
-            self.properties.capture_canvas.configure(image=imgtk)
-            self.properties.capture_canvas.after(5, mainloop)
+        def mainloop():
+            nonlocal shown
+            frame = self.publisher.take(shown)
+            if frame is not None:
+                shown = frame.version
+                composite = self.publisher.compose(frame)
+                img = PIL.Image.fromarray(composite)
+                if getattr(canvas, "imgtk", None) is None:
+                    canvas.imgtk = PIL.ImageTk.PhotoImage(image=img)
+                    canvas.configure(image=canvas.imgtk)
+                else:
+                    canvas.imgtk.paste(img)
+            canvas.after(interval, mainloop)
 
         print("Window loop starting.")
         mainloop()
         self.properties.app.mainloop()
 
-    def process(self) -> None:
+    def process(self) -> bool:
         """
         Grab the frame and process.
+        :return: Is a frame processed
         """
 
-        ret, frame = self.capture.read()
-
-        if not ret:
-            self.capture.set(1, 0)
-            return
+        # Waiting for the frame is recorded as the capture stage but it is not part of the frame time.
+        wait_start = self.profiler.start()
+        captured = self.capture_thread.read(0.5)
+        if captured is None:
+            return False
 
+        frame_start = self.profiler.lap("capture", wait_start)
+        frame = captured.image
         frame_h, frame_w = frame.shape[:2]
 
-        box_start_x, \
-            box_start_y, \
-            box_end_x, \
-            box_end_y = \
-            int(
-                frame_w / 2
-                - self.properties.box_collision_width / 2
-                + self.properties.box_collision_horizontal
-            ), \
-            int(
-                frame_h / 2
-                - self.properties.box_collision_height / 2
-                + self.properties.box_collision_vertical
-            ), \
-            int(
-                frame_w / 2
-                + self.properties.box_collision_width / 2
-                + self.properties.box_collision_horizontal
-            ), \
-            int(
-                frame_h / 2
-                + self.properties.box_collision_height / 2
-                + self.properties.box_collision_vertical
-            )
+        # Tunables of this frame, taken once so every stage sees the same values.
+        tuning = self.properties.tuning
+        box_start_x, box_start_y, box_end_x, box_end_y = self.collision_box(tuning, frame_w, frame_h)
 
-        # Create the mask
-        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(
-            frame_hsv,
-            self.properties.lower_hsv,
-            self.properties.upper_hsv
+        # Find the target.
+        target, mask, (start_x, start_y, end_x, end_y) = self.pipeline.detect(
+            frame,
+            captured.timestamp,
+            tuning
         )
 
-        # Find contours.
-        contours, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
         # Calculate center of the color
         cx, cy = 0, 0
-        if len(contours) > 0:
-            c = max(contours, key=cv2.contourArea)
-            c_moments = cv2.moments(c)
-            try:
-                cx, cy = \
-                    int(c_moments['m10'] / c_moments['m00']), \
-                    int(c_moments['m01'] / c_moments['m00'])
-            except ZeroDivisionError:
-                return
+        if target is not None:
+            cx, cy = int(target.x), int(target.y)
+
+        # First frame of the target
+        if (target is not None) != self.acquired:
+            self.acquired = target is not None
+            if self.acquired and self.result is not None:
+                self.result.trigger("acquired", captured.timestamp)
 
         # If detected object is colliding with the box.
         collision_state = (
@@ -297,48 +514,66 @@ Logging:\t{'Enabled' if self.logging else 'Disabled'}"""
             if not self.collided:
                 print("Collision detected.")
                 self.collided = True
-                self.bindings.open_package_door()
+                self.bindings.open_package_door(captured.timestamp)
+                if self.result is not None:
+                    self.result.trigger("collision", captured.timestamp)
         elif self.collided:
             self.collided = False
             print("Collision over.")
 
-        if self.visualize:
-            if len(contours) > 0:
-                # cv2.drawContours(output, contours, 0, (255, 255, 255), 2)
-                cv2.circle(frame, (cx, cy), 10, (255, 255, 255), -1)
-                cv2.line(frame, (cx, 0), (cx, cy - 40), (255, 255, 255), 3)
-                cv2.line(frame, (cx, frame_h), (cx, cy + 40), (255, 255, 255), 3)
-                cv2.line(frame, (0, cy), (cx - 40, cy), (255, 255, 255), 3)
-                cv2.line(frame, (frame_w, cy), (cx + 40, cy), (255, 255, 255), 3)
-
-            collision_color = (0, 255, 0) if collision_state else (255, 255, 255)
-            utilities.draw_square(
+        # Glass to decision
+        latency = time.monotonic() - captured.timestamp
+        if self.profiler.enabled:
+            self.profiler.record("latency", int(latency * 1e9))
+        t = self.profiler.start()
+
+        center = (cx, cy) if target is not None else None
+        box = (box_start_x, box_start_y, box_end_x, box_end_y)
+
+        # Optional work, shed when the frames miss their deadlines
+        overlay = self.visualize and self.pacer.runs("overlay")
+
+        # Preview gets the raw frame and the mask, the window thread composes it.
+        if self.publisher is not None and self.pacer.runs("preview") and self.publisher.due():
+            self.publisher.publish(
                 frame,
-                (box_start_x, box_start_y),
-                (box_end_x, box_end_y),
-                collision_color,
-                3
+                mask,
+                (start_x, start_y, end_x, end_y),
+                (center, box, collision_state) if overlay else None
             )
+            t = self.profiler.lap("preview", t)
+
+        if overlay:
+            utilities.draw_visualization(frame, center, box, collision_state)
+            t = self.profiler.lap("overlay", t)
 
         # Record Video
         if self.record:
-            self.result.write(frame)
+            self.result.write(frame, captured.timestamp)
+            t = self.profiler.lap("record", t)
 
         # Stream Video
-        if self.groundstation is not None:
-            self.groundstation.send_udp_message(frame)
-
-        # Special visualizations for preview
-        if self.preview:
-            output = cv2.bitwise_and(frame_hsv, frame_hsv, mask=mask)
-            output = cv2.cvtColor(output, cv2.COLOR_HSV2RGB)
-
-            # Resize
-            frame = cv2.resize(frame, (640, 360))
-            output = cv2.resize(output, (640, 360))
-
-            # Color convert
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.groundstation is not None and self.pacer.runs("stream"):
+            self.groundstation.submit_frame(frame)
+            t = self.profiler.lap("stream", t)
+
+        if self.telemetry is not None:
+            self.telemetry.append(
+                captured.sequence,
+                captured.timestamp,
+                latency,
+                center,
+                target.area if target is not None else 0,
+                collision_state,
+                tuning.lower_hsv,
+                tuning.upper_hsv,
+                self.capture_thread.dropped,
+                self.result.dropped if self.result is not None else 0,
+                self.groundstation.skipped if self.groundstation is not None else 0
+            )
 
-            # Final Output
-            self.final_output = cv2.hconcat([frame, output])
+        slack = self.pacer.end_frame(captured.timestamp)
+        if self.profiler.enabled:
+            self.profiler.record("slack", int(slack * 1e9))
+        self.profiler.end_frame(frame_start, self.capture_thread.dropped)
+        return True
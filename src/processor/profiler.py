@@ -0,0 +1,181 @@
+"""Per stage latency measurement."""
+from typing import Dict, List
+
+import time
+
+import numpy as np
+
+
+class Profiler:
+    """
+    Low overhead stage timers. Durations are written into preallocated ring buffers,
+    percentiles are only calculated when the stats are requested.
+    When disabled, every call returns immediately.
+
+    Usage:
+        t = profiler.start()
+        ...
+        t = profiler.lap("mask", t)
+        ...
+        profiler.end_frame(frame_start)
+    """
+
+    frames: int = 0            # Processed frames
+    late: int = 0              # Frames that took longer than the budget
+    dropped: int = 0           # Frames dropped before processing, reported by the capture
+    last_summary: float = 0.0  # time.monotonic() of the last summary
+
+    def __init__(
+            self,
+            stages: List[str],
+            enabled: bool = True,
+            size: int = 1024,
+            interval: float = 10.0,
+            budget: float = 1 / 30
+    ) -> None:
+        """
+        :param stages: Stage names
+        :param enabled: Measure or not
+        :param size: Samples kept per stage
+        :param interval: Seconds between summaries in the log, 0 to disable
+        :param budget: Frame time in seconds, frames that take longer are counted as late
+        """
+
+        self.enabled = enabled
+        self.size = size
+        self.interval = interval
+        self.set_budget(budget)
+
+        self.stages = list(stages) + ["total"]
+        self.index = {stage: i for i, stage in enumerate(self.stages)}
+        self.samples = np.zeros((len(self.stages), size), np.int64)
+        self.counts = [0] * len(self.stages)
+        self.maximums = [0] * len(self.stages)
+
+        self.frame_times = np.zeros(size, np.int64)  # perf_counter_ns() at the end of each frame
+        self.last_summary = time.monotonic()
+
+    def set_budget(self, budget: float) -> None:
+        """
+        :param budget: Frame time in seconds, frames that take longer are counted as late
+        """
+        self.budget = int(budget * 1e9)
+
+    def start(self) -> int:
+        """
+        :return: Current time to pass to lap()
+        """
+
+        if not self.enabled:
+            return 0
+
+        return time.perf_counter_ns()
+
+    def lap(self, stage: str, start: int) -> int:
+        """
+        Record the time passed since start.
+        :param stage: Stage name
+        :param start: Value returned from start() or lap()
+        :return: Current time, start of the next stage
+        """
+
+        if not self.enabled:
+            return 0
+
+        now = time.perf_counter_ns()
+        self.record(stage, now - start)
+        return now
+
+    def record(self, stage: str, duration: int) -> None:
+        """
+        Record a duration that is measured elsewhere.
+        :param stage: Stage name
+        :param duration: Nanoseconds
+        """
+
+        if not self.enabled:
+            return
+
+        i = self.index[stage]
+        count = self.counts[i]
+        self.samples[i, count % self.size] = duration
+        self.counts[i] = count + 1
+        if duration > self.maximums[i]:
+            self.maximums[i] = duration
+
+    def end_frame(self, start: int, dropped: int = 0) -> None:
+        """
+        Record the total time of the frame and print the summary if it is time.
+        :param start: Value returned from start() at the beginning of the frame
+        :param dropped: Total dropped frame count of the capture
+        """
+
+        if not self.enabled:
+            return
+
+        now = time.perf_counter_ns()
+        duration = now - start
+        self.record("total", duration)
+        self.frame_times[self.frames % self.size] = now
+        self.frames = self.frames + 1
+        self.dropped = dropped
+        if duration > self.budget:
+            self.late = self.late + 1
+
+        if self.interval > 0 and time.monotonic() - self.last_summary >= self.interval:
+            self.last_summary = time.monotonic()
+            print(self.summary())
+
+    def fps(self) -> float:
+        """
+        Frames per second over the kept frames.
+        :return: FPS
+        """
+
+        count = min(self.frames, self.size)
+        if count < 2:
+            return 0.0
+
+        latest = (self.frames - 1) % self.size
+        oldest = (self.frames - count) % self.size
+        elapsed = self.frame_times[latest] - self.frame_times[oldest]
+        return (count - 1) * 1e9 / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Rolling stats of every stage that has samples.
+        :return: {stage: {"p50", "p95", "p99", "max", "max_all"}} in milliseconds
+        """
+
+        result = {}
+        for stage, i in self.index.items():
+            count = min(self.counts[i], self.size)
+            if count == 0:
+                continue
+
+            samples = self.samples[i, :count]
+            p50, p95, p99 = np.percentile(samples, (50, 95, 99)) / 1e6
+            result[stage] = {
+                "p50": p50,
+                "p95": p95,
+                "p99": p99,
+                "max": samples.max() / 1e6,
+                "max_all": self.maximums[i] / 1e6
+            }
+
+        return result
+
+    def summary(self) -> str:
+        """
+        Human readable stats.
+        :return: Multi line summary
+        """
+
+        lines = [f"Profiler: {self.fps():.1f} FPS, {self.frames} frames, {self.late} late, {self.dropped} dropped"]
+        for stage, stat in self.stats().items():
+            lines.append(
+                f"{stage:>10}: p50 {stat['p50']:7.2f} ms\tp95 {stat['p95']:7.2f} ms"
+                f"\tp99 {stat['p99']:7.2f} ms\tmax {stat['max']:7.2f} ms"
+            )
+
+        return "\n".join(lines)
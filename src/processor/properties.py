@@ -1,20 +1,136 @@
 """The class that wraps properties for processor."""
+from typing import Any, Tuple
+
+import itertools
+import threading
 import tkinter as tk
 
 import numpy as np
 
+# Versions are unique across all the Properties, so a version identifies the values.
+versions = itertools.count(1)
+
+
+class Tuning:
+    """
+    Immutable set of the tunables. Changes create a new Tuning with a new version,
+    so a reader that takes Properties.tuning once per frame always sees consistent values.
+    """
+
+    __slots__ = (
+        "lower_hsv", "upper_hsv",
+        "box_width", "box_height", "box_horizontal", "box_vertical",
+        "version"
+    )
+
+    lower_hsv: np.ndarray  # Read-only
+    upper_hsv: np.ndarray  # Read-only
+    box_width: int
+    box_height: int
+    box_horizontal: int
+    box_vertical: int
+    version: int
+
+    def __init__(
+            self,
+            lower_hsv: Any,
+            upper_hsv: Any,
+            box_width: int,
+            box_height: int,
+            box_horizontal: int,
+            box_vertical: int,
+            version: int = 0
+    ) -> None:
+
+        lower_hsv = np.array(lower_hsv, np.uint8)
+        upper_hsv = np.array(upper_hsv, np.uint8)
+        lower_hsv.flags.writeable = False
+        upper_hsv.flags.writeable = False
+
+        for name, value in (
+                ("lower_hsv", lower_hsv),
+                ("upper_hsv", upper_hsv),
+                ("box_width", int(box_width)),
+                ("box_height", int(box_height)),
+                ("box_horizontal", int(box_horizontal)),
+                ("box_vertical", int(box_vertical)),
+                ("version", version)
+        ):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Tuning is immutable, use Properties.publish()")
+
+    def replace(self, **changes) -> "Tuning":
+        """
+        :param changes: Fields to change
+        :return: Copy with the changes and a new version
+        """
+
+        values = {name: getattr(self, name) for name in self.__slots__ if name != "version"}
+        values.update(changes)
+        return Tuning(**values, version=next(versions))
+
+    def box(self, frame_w: int, frame_h: int) -> Tuple[int, int, int, int]:
+        """
+        Collision box corners.
+        :param frame_w: Frame width
+        :param frame_h: Frame height
+        :return: (Start X, Start Y, End X, End Y)
+        """
+
+        return \
+            int(frame_w / 2 - self.box_width / 2 + self.box_horizontal), \
+            int(frame_h / 2 - self.box_height / 2 + self.box_vertical), \
+            int(frame_w / 2 + self.box_width / 2 + self.box_horizontal), \
+            int(frame_h / 2 + self.box_height / 2 + self.box_vertical)
+
 
 class Properties:
-    """Wraps properties as fields for processor."""
-    
-    upper_hsv: np.array
-    lower_hsv: np.array
-    
-    box_collision_width: int
-    box_collision_height: int
-    box_collision_horizontal: int
-    box_collision_vertical: int
+    """
+    Wraps properties as fields for processor.
+    The tunables are published as a whole with publish(), the processing thread reads tuning without locks.
+    """
+
+    tuning: Tuning = Tuning((0, 0, 0), (0, 0, 0), 0, 0, 0, 0)
+    publish_lock = threading.Lock()  # Serializes the writers only
 
     # Optional properties
     app: tk.Tk
     capture_canvas: tk.Label
+
+    def publish(self, **changes) -> Tuning:
+        """
+        Replace the tunables with a single reference swap.
+        :param changes: Tuning fields to change
+        :return: Published tuning
+        """
+
+        with self.publish_lock:
+            tuning = self.tuning.replace(**changes)
+            self.tuning = tuning
+        return tuning
+
+    @property
+    def upper_hsv(self) -> np.ndarray:
+        return self.tuning.upper_hsv
+
+    @property
+    def lower_hsv(self) -> np.ndarray:
+        return self.tuning.lower_hsv
+
+    @property
+    def box_collision_width(self) -> int:
+        return self.tuning.box_width
+
+    @property
+    def box_collision_height(self) -> int:
+        return self.tuning.box_height
+
+    @property
+    def box_collision_horizontal(self) -> int:
+        return self.tuning.box_horizontal
+
+    @property
+    def box_collision_vertical(self) -> int:
+        return self.tuning.box_vertical
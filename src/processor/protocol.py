@@ -0,0 +1,240 @@
+"""
+Binary stream protocol between the processor and the ground station.
+
+Every encoded frame is split into datagrams that fit the MTU. Each datagram starts with a header:
+
+    magic          2 bytes   b"YK"
+    version        1 byte
+    codec          1 byte    Codec
+    frame id       4 bytes   Increases by one for every frame, wraps around
+    fragment index 2 bytes
+    fragment count 2 bytes
+    timestamp      8 bytes   Sender time.time() in microseconds
+    payload length 2 bytes
+
+All fields are big-endian. The receiver side uses Reassembler to put the frames back together.
+"""
+from typing import Dict, List, Union
+
+import struct
+import time
+
+HEADER = struct.Struct("!2sBBIHHQH")
+MAGIC = b"YK"
+VERSION = 1
+
+# IPv4 + UDP headers
+UDP_OVERHEAD = 28
+
+
+class Codec:
+    """
+    Payload encodings.
+    """
+
+    JPEG = 1
+
+
+class ProtocolError(ValueError):
+    """
+    Raised when a datagram is not a valid stream packet.
+    """
+
+
+class Packet:
+    """
+    Parsed datagram.
+    """
+
+    __slots__ = ("codec", "frame_id", "index", "count", "timestamp", "payload")
+
+    codec: int
+    frame_id: int
+    index: int
+    count: int
+    timestamp: int  # Microseconds
+    payload: bytes
+
+    def __init__(self, codec: int, frame_id: int, index: int, count: int, timestamp: int, payload: bytes) -> None:
+        self.codec = codec
+        self.frame_id = frame_id
+        self.index = index
+        self.count = count
+        self.timestamp = timestamp
+        self.payload = payload
+
+
+def fragment(
+        frame_id: int,
+        payload: bytes,
+        codec: int = Codec.JPEG,
+        mtu: int = 1500,
+        timestamp: Union[int, None] = None
+) -> List[bytes]:
+    """
+    Split an encoded frame into datagrams.
+    :param frame_id: Frame id, wraps around at 2^32
+    :param payload: Encoded frame
+    :param codec: Codec of the payload
+    :param mtu: Maximum transmission unit of the link
+    :param timestamp: Microseconds, time.time() if None
+    :return: Datagrams
+    """
+
+    if timestamp is None:
+        timestamp = int(time.time() * 1e6)
+
+    chunk = mtu - UDP_OVERHEAD - HEADER.size
+    if chunk <= 0:
+        raise ValueError(f"MTU is too small: {mtu}")
+
+    count = max(1, -(-len(payload) // chunk))
+    if count > 0xFFFF:
+        raise ValueError(f"Frame is too large: {len(payload)} bytes")
+
+    view = memoryview(payload)
+    frame_id = frame_id & 0xFFFFFFFF
+    return [
+        HEADER.pack(
+            MAGIC, VERSION, codec, frame_id, index, count, timestamp,
+            len(view[index * chunk:(index + 1) * chunk])
+        ) + view[index * chunk:(index + 1) * chunk]
+        for index in range(count)
+    ]
+
+
+def parse(datagram: bytes) -> Packet:
+    """
+    Parse a datagram.
+    :param datagram: Received datagram
+    :return: Packet
+    """
+
+    if len(datagram) < HEADER.size:
+        raise ProtocolError("Datagram is shorter than the header")
+
+    magic, version, codec, frame_id, index, count, timestamp, length = HEADER.unpack_from(datagram)
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError("Unknown magic or version")
+    if index >= count or len(datagram) - HEADER.size != length:
+        raise ProtocolError("Malformed fragment")
+
+    return Packet(codec, frame_id, index, count, timestamp, datagram[HEADER.size:])
+
+
+class Frame:
+    """
+    Reassembled frame.
+    """
+
+    __slots__ = ("codec", "frame_id", "timestamp", "payload", "latency")
+
+    codec: int
+    frame_id: int
+    timestamp: int   # Sender time in microseconds
+    payload: bytes
+    latency: float   # Seconds from the sender timestamp to the last fragment, needs synchronized clocks
+
+    def __init__(self, codec: int, frame_id: int, timestamp: int, payload: bytes, latency: float) -> None:
+        self.codec = codec
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.payload = payload
+        self.latency = latency
+
+
+class Reassembler:
+    """
+    Receiver side. Collects fragments and returns complete frames.
+    Incomplete frames are dropped after the timeout, frames older than the last completed one are ignored.
+    """
+
+    completed: int = 0  # Frames reassembled
+    expired: int = 0    # Incomplete frames dropped after the timeout
+    lost: int = 0       # Frames never completed, counted from the frame id gaps
+    invalid: int = 0    # Datagrams that are not valid packets
+    last_frame_id: Union[int, None] = None
+
+    def __init__(self, timeout: float = 0.5) -> None:
+        """
+        :param timeout: Seconds to wait for the missing fragments of a frame
+        """
+
+        self.timeout = timeout
+        self.partial: Dict[int, List] = {}  # frame id: [first arrival, fragments, received count]
+
+    def feed(self, datagram: bytes, now: Union[float, None] = None) -> Union[Frame, None]:
+        """
+        Add a received datagram.
+        :param datagram: Received datagram
+        :param now: time.time() of the arrival, current time if None
+        :return: Frame if this datagram completed one
+        """
+
+        if now is None:
+            now = time.time()
+
+        self.expire(now)
+
+        try:
+            packet = parse(datagram)
+        except ProtocolError:
+            self.invalid = self.invalid + 1
+            return None
+
+        # Late fragment of a frame that is completed, expired or superseded
+        if self.last_frame_id is not None and not self.is_newer(packet.frame_id, self.last_frame_id):
+            return None
+
+        entry = self.partial.get(packet.frame_id)
+        if entry is None:
+            entry = [now, [None] * packet.count, 0]
+            self.partial[packet.frame_id] = entry
+
+        fragments = entry[1]
+        if packet.count != len(fragments) or fragments[packet.index] is not None:
+            return None
+
+        fragments[packet.index] = packet.payload
+        entry[2] = entry[2] + 1
+        if entry[2] < len(fragments):
+            return None
+
+        # Complete
+        del self.partial[packet.frame_id]
+        if self.last_frame_id is not None:
+            self.lost = self.lost + ((packet.frame_id - self.last_frame_id - 1) & 0xFFFFFFFF)
+        self.last_frame_id = packet.frame_id
+        self.completed = self.completed + 1
+
+        # Older incomplete frames can't be shown anymore.
+        for frame_id in [frame_id for frame_id in self.partial if not self.is_newer(frame_id, packet.frame_id)]:
+            del self.partial[frame_id]
+            self.expired = self.expired + 1
+
+        return Frame(
+            packet.codec,
+            packet.frame_id,
+            packet.timestamp,
+            b"".join(fragments),
+            now - packet.timestamp / 1e6
+        )
+
+    def expire(self, now: float) -> None:
+        """
+        Drop the incomplete frames that are waiting longer than the timeout.
+        :param now: Current time.time()
+        """
+
+        for frame_id in [frame_id for frame_id, entry in self.partial.items() if now - entry[0] > self.timeout]:
+            del self.partial[frame_id]
+            self.expired = self.expired + 1
+
+    @staticmethod
+    def is_newer(frame_id: int, other: int) -> bool:
+        """
+        Compare frame ids with wrap around.
+        :return: Is frame_id after other
+        """
+
+        return 0 < ((frame_id - other) & 0xFFFFFFFF) < 0x80000000
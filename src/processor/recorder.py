@@ -0,0 +1,408 @@
+"""Video recording on a dedicated thread."""
+from typing import Deque, List, Tuple, Union
+
+import collections
+import datetime
+import os
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from . import config as conf
+from . import utilities
+
+
+class QueuePolicy:
+    """
+    What to do when the queue is full.
+    """
+
+    BLOCK = "block"              # Wait for the writer, detection slows down with the disk
+    DROP_OLDEST = "drop-oldest"  # Replace the oldest queued frame
+    DROP_NEWEST = "drop-newest"  # Skip the frame being written
+
+    ALL = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+class AsyncRecorder:
+    """
+    Drop-in replacement for cv2.VideoWriter that encodes on a writer thread.
+    Frames are copied into a bounded pool of buffers so the caller can reuse its frame right after write() returns.
+    Buffers are allocated when the queue grows, up to queue_size, and reused afterwards.
+    """
+
+    writer: Union[cv2.VideoWriter, None]
+    path: Union[str, None]
+    thread: threading.Thread
+    free: List[np.ndarray]                      # Buffers ready to be filled
+    pending: Deque[Tuple[np.ndarray, float]]    # Buffers and their timestamps waiting for the writer
+
+    running: bool = True
+    allocated: int = 0  # Buffers allocated so far
+    written: int = 0    # Frames encoded
+    dropped: int = 0    # Frames dropped due to the queue policy
+    max_depth: int = 0  # Highest queue depth seen
+
+    def __init__(
+            self,
+            path: str,
+            fourcc: int,
+            fps: float,
+            size: Tuple[int, int],
+            queue_size: int = 60,
+            policy: str = QueuePolicy.DROP_OLDEST
+    ) -> None:
+        """
+        :param path: Video path, None if the subclass opens its own writers
+        :param fourcc: Codec
+        :param fps: Frame rate of the video
+        :param size: (Width, Height)
+        :param queue_size: Maximum frames waiting for the writer
+        :param policy: One of QueuePolicy
+        """
+
+        if policy not in QueuePolicy.ALL:
+            raise ValueError(f"Unknown record queue policy: {policy}")
+
+        self.path = path
+        self.policy = policy
+        self.fourcc = fourcc
+        self.fps = fps
+        self.size = size
+        self.writer = cv2.VideoWriter(path, fourcc, fps, size) if path is not None else None
+
+        self.queue_size = max(1, queue_size)
+        self.free = []
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    @property
+    def depth(self) -> int:
+        """
+        :return: Frames waiting for the writer
+        """
+        return len(self.pending)
+
+    @property
+    def buffer_bytes(self) -> int:
+        """
+        :return: Memory of the allocated buffers
+        """
+        width, height = self.size
+        return self.allocated * width * height * 3
+
+    def take_buffers(self, other: "AsyncRecorder") -> None:
+        """
+        Reuse the free buffers of a released recorder that is still writing its queue,
+        so the next recording doesn't allocate while the previous one drains.
+        :param other: Released recorder
+        """
+
+        if other.size != self.size:
+            return
+
+        with other.condition:
+            if other.running:
+                return
+            count = min(len(other.free), self.queue_size - self.allocated)
+            buffers = other.free[:count]
+            del other.free[:count]
+            other.allocated = other.allocated - count
+
+        with self.condition:
+            self.free.extend(buffers)
+            self.allocated = self.allocated + count
+
+    def write(self, frame: np.ndarray, timestamp: Union[float, None] = None) -> None:
+        """
+        Queue the frame.
+        :param frame: BGR frame
+        :param timestamp: Capture timestamp, time.monotonic() if None
+        """
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        with self.condition:
+            if not self.running:
+                return
+
+            if len(self.free) > 0:
+                buffer = self.free.pop()
+            elif self.allocated < self.queue_size:
+                # Allocated below, outside the lock
+                buffer = None
+                self.allocated = self.allocated + 1
+            elif self.policy == QueuePolicy.DROP_NEWEST:
+                self.dropped = self.dropped + 1
+                return
+            elif self.policy == QueuePolicy.DROP_OLDEST and len(self.pending) > 0:
+                buffer, _ = self.pending.popleft()
+                self.dropped = self.dropped + 1
+            else:
+                while len(self.free) == 0 and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                buffer = self.free.pop()
+
+        # Buffer is owned by the caller until it is queued.
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = np.empty_like(frame)
+        np.copyto(buffer, frame)
+
+        with self.condition:
+            self.pending.append((buffer, timestamp))
+            self.max_depth = max(self.max_depth, len(self.pending))
+            self.condition.notify_all()
+
+    def write_loop(self) -> None:
+        """
+        Encode queued frames until released and the queue is empty.
+        """
+
+        while True:
+            with self.condition:
+                while len(self.pending) == 0 and self.running:
+                    self.condition.wait()
+                if len(self.pending) == 0:
+                    break
+                buffer, timestamp = self.pending.popleft()
+
+            self.encode(buffer, timestamp)
+
+            with self.condition:
+                self.free.append(buffer)
+                self.written = self.written + 1
+                self.condition.notify_all()
+
+        self.finish()
+        self.free = []
+
+        print(f"Recording closed: {self.written} frames written, {self.dropped} dropped, max queue depth {self.max_depth}.")
+
+    def encode(self, frame: np.ndarray, timestamp: float) -> None:
+        """
+        Called on the writer thread for every queued frame.
+        :param frame: BGR frame
+        :param timestamp: Capture timestamp
+        """
+
+        self.writer.write(frame)
+
+    def finish(self) -> None:
+        """
+        Called on the writer thread after the last frame.
+        """
+
+        self.writer.release()
+
+        # Opened ahead but never armed
+        if self.written == 0 and os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def trigger(self, event: str, timestamp: Union[float, None] = None) -> None:
+        """
+        Notify the recorder about an event. Continuous recording records everything anyway.
+        :param event: Event name
+        :param timestamp: Capture timestamp of the frame the event happened at
+        """
+
+    def release(self, wait: bool = True) -> None:
+        """
+        Write the queued frames and close the file, can be called again to wait for it.
+        Frames written after this call are ignored.
+        :param wait: Wait until the file is closed
+        """
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if wait and self.thread is not threading.current_thread():
+            self.thread.join()
+
+
+class EventRecorder(AsyncRecorder):
+    """
+    Keeps the last seconds as JPEG frames in a memory bounded ring and records
+    a clip only when an event is triggered: the pre-roll plus the post-roll after the last event.
+    The queue buffers count towards the memory limit, the ring gets what they leave.
+    Events are listed in clips.csv next to the clips.
+    """
+
+    ring: Deque[Tuple[bytes, float]]  # JPEG frames and their timestamps
+    ring_bytes: int = 0
+
+    clip_count: int = 0
+    clip_deadline: float = 0.0  # Timestamp the current clip ends at
+    events: Deque[Tuple[str, datetime.datetime, float]]  # Triggered events waiting for the writer thread
+
+    def __init__(
+            self,
+            directory: str,
+            fourcc: int,
+            fps: float,
+            size: Tuple[int, int],
+            queue_size: int = 60,
+            policy: str = QueuePolicy.DROP_OLDEST,
+            preroll: float = 5.0,
+            postroll: float = 10.0,
+            memory: int = 64,
+            quality: int = 90
+    ) -> None:
+        """
+        :param directory: Directory to save clips and clips.csv
+        :param preroll: Seconds kept before an event
+        :param postroll: Seconds recorded after the last event
+        :param memory: Limit of the ring and the queue buffers in megabytes
+        :param quality: JPEG quality of the ring
+        """
+
+        self.directory = directory
+        self.preroll = preroll
+        self.postroll = postroll
+        self.memory = memory * 1024 * 1024
+        self.quality = quality
+        self.ring = collections.deque()
+        self.events = collections.deque()
+        self.index_path = os.path.join(directory, "clips.csv")
+
+        if not os.path.isfile(self.index_path):
+            with open(self.index_path, "w") as index_file:
+                index_file.write("clip,event,time,preroll_frames\n")
+
+        # The queue alone stays under the limit.
+        width, height = size
+        queue_size = min(queue_size, max(1, self.memory // (width * height * 3)))
+
+        super().__init__(None, fourcc, fps, size, queue_size, policy)
+
+    def trigger(self, event: str, timestamp: Union[float, None] = None) -> None:
+        """
+        Start a clip with the pre-roll or extend the current one.
+        :param event: Event name, written to the index
+        :param timestamp: Capture timestamp of the frame the event happened at, time.monotonic() if None
+        """
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        with self.condition:
+            self.events.append((event, datetime.datetime.now(), timestamp))
+            self.condition.notify_all()
+
+    def encode(self, frame: np.ndarray, timestamp: float) -> None:
+
+        # Events up to this frame
+        while len(self.events) > 0 and self.events[0][2] <= timestamp:
+            event, event_time, event_timestamp = self.events.popleft()
+            self.clip_deadline = event_timestamp + self.postroll
+            preroll_frames = 0
+
+            if self.writer is None:
+                preroll_frames = self.open_clip()
+
+            clip = f"clip_{self.clip_count}.avi"
+            with open(self.index_path, "a") as index_file:
+                index_file.write(f"{clip},{event},{event_time.isoformat()},{preroll_frames}\n")
+            print(f"Event recording: {event}, {clip}")
+
+        if self.writer is not None:
+            self.writer.write(frame)
+            if timestamp >= self.clip_deadline:
+                self.close_clip()
+            return
+
+        # Keep in the ring
+        ret, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not ret:
+            return
+
+        data = buffer.tobytes()
+        self.ring.append((data, timestamp))
+        self.ring_bytes = self.ring_bytes + len(data)
+        while len(self.ring) > 0 and (
+                self.ring_bytes + self.buffer_bytes > self.memory or
+                timestamp - self.ring[0][1] > self.preroll
+        ):
+            self.ring_bytes = self.ring_bytes - len(self.ring.popleft()[0])
+
+    def open_clip(self) -> int:
+        """
+        Open the next clip and write the pre-roll.
+        :return: Pre-roll frame count
+        """
+
+        self.clip_count = self.clip_count + 1
+        path = os.path.join(self.directory, f"clip_{self.clip_count}.avi")
+        while os.path.isfile(path):
+            self.clip_count = self.clip_count + 1
+            path = os.path.join(self.directory, f"clip_{self.clip_count}.avi")
+
+        self.writer = cv2.VideoWriter(path, self.fourcc, self.fps, self.size)
+
+        preroll_frames = len(self.ring)
+        while len(self.ring) > 0:
+            data, _ = self.ring.popleft()
+            self.writer.write(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+        self.ring_bytes = 0
+
+        return preroll_frames
+
+    def close_clip(self) -> None:
+        """
+        Close the current clip.
+        """
+
+        self.writer.release()
+        self.writer = None
+
+    def finish(self) -> None:
+        if self.writer is not None:
+            self.close_clip()
+
+
+def open_recorder(general: conf.GeneralConfig, directory: str, size: Tuple[int, int]) -> AsyncRecorder:
+    """
+    Start a recording as configured.
+    :param general: General section of the config
+    :param directory: Recording directory
+    :param size: (Width, Height)
+    :return: Event or continuous recorder
+    """
+
+    if general.record_mode == "event":
+        print(f"Recording events: {directory}")
+        result = EventRecorder(
+            directory,
+            cv2.VideoWriter_fourcc(*'XVID'),
+            30,
+            size,
+            general.record_queue,
+            general.record_policy,
+            general.record_preroll,
+            general.record_postroll,
+            general.record_preroll_memory,
+            general.record_preroll_quality
+        )
+    else:
+        video_path = utilities.unique_path(directory, "video", ".avi")
+        print(f"Recording video: {video_path}")
+        result = AsyncRecorder(
+            os.path.abspath(video_path),
+            cv2.VideoWriter_fourcc(*'XVID'),
+            30,
+            size,
+            general.record_queue,
+            general.record_policy
+        )
+        result.writer.set(cv2.CAP_PROP_HW_ACCELERATION, cv2.CAP_DSHOW)
+
+    print("Record started.")
+    return result
@@ -1,7 +1,162 @@
 """Logging"""
-import sys
-import os
+from typing import Deque, List, TextIO, Tuple, Union
+
+import atexit
+import collections
 import datetime
+import os
+import signal
+import sys
+import threading
+
+
+class LogWriter:
+    """
+    Writes the log files on a background thread.
+    Messages are queued without locks, so printing from any thread (or a signal handler) never waits for the disk.
+    Queued messages are written in batches, files are synced every sync_interval seconds and on close.
+    When the queue is full, new messages are dropped and the drop count is written to the files.
+    """
+
+    thread: threading.Thread
+    files: List[TextIO]
+    queue: Deque[Tuple[TextIO, str]]
+
+    running: bool = True
+    dropped: int = 0          # Messages dropped since the last notice
+    total_dropped: int = 0
+
+    def __init__(self, queue_size: int = 4096, sync_interval: float = 1.0) -> None:
+        """
+        :param queue_size: Maximum messages waiting for the writer
+        :param sync_interval: Seconds between fsyncs
+        """
+
+        self.queue_size = queue_size
+        self.sync_interval = sync_interval
+        self.files = []
+        self.queue = collections.deque()
+        self.wake = threading.Event()
+        self.synced = threading.Event()
+        self.sync_requested = False
+
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    def open(self, filename: str) -> TextIO:
+        """
+        Open a log file served by this writer.
+        :param filename: Path
+        :return: File
+        """
+
+        file = open(filename, 'w')
+        self.files.append(file)
+        return file
+
+    def put(self, file: TextIO, message: str) -> None:
+        """
+        Queue the message, drop it if the queue is full.
+        :param file: File opened with open()
+        :param message: Message
+        """
+
+        if not self.running or len(self.queue) >= self.queue_size:
+            self.dropped = self.dropped + 1
+            return
+
+        self.queue.append((file, message))
+        self.wake.set()
+
+    def write_loop(self) -> None:
+        """
+        Write queued messages until closed.
+        """
+
+        last_sync = datetime.datetime.now()
+
+        while True:
+            self.wake.wait(self.sync_interval)
+            self.wake.clear()
+
+            self.write_pending()
+
+            now = datetime.datetime.now()
+            if self.sync_requested or not self.running or (now - last_sync).total_seconds() >= self.sync_interval:
+                self.sync()
+                last_sync = now
+                if self.sync_requested:
+                    self.sync_requested = False
+                    self.synced.set()
+
+            if not self.running and len(self.queue) == 0:
+                break
+
+        for file in self.files:
+            file.close()
+
+    def write_pending(self) -> None:
+        """
+        Write everything in the queue, one write call per file.
+        """
+
+        batches = {}
+        while len(self.queue) > 0:
+            file, message = self.queue.popleft()
+            batches.setdefault(file, []).append(message)
+
+        if self.dropped > 0:
+            dropped, self.dropped = self.dropped, 0
+            self.total_dropped = self.total_dropped + dropped
+            for file in self.files:
+                batches.setdefault(file, []).append(f"[Logger] {dropped} messages dropped, the disk is too slow.\n")
+
+        for file, messages in batches.items():
+            try:
+                file.write("".join(messages))
+            except (OSError, ValueError):
+                continue
+
+    def sync(self) -> None:
+        """
+        Flush and fsync the files.
+        """
+
+        for file in self.files:
+            try:
+                file.flush()
+                os.fsync(file.fileno())
+            except (OSError, ValueError):
+                continue
+
+    def flush(self, timeout: float = 1.0) -> None:
+        """
+        Ask the writer to write and sync everything queued so far, and wait for it.
+        :param timeout: Seconds to wait
+        """
+
+        if not self.thread.is_alive() or self.thread is threading.current_thread():
+            return
+
+        self.synced.clear()
+        self.sync_requested = True
+        self.wake.set()
+        self.synced.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Write the remaining messages, sync and close the files.
+        :param timeout: Seconds to wait for the writer
+        """
+
+        if not self.running:
+            return
+
+        self.running = False
+        self.wake.set()
+
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
 
 
 class CustomOut:
@@ -9,9 +164,10 @@ class CustomOut:
     This class saves prints into a log file.
     """
 
-    def __init__(self, filename: str, std, format_msg=False) -> None:
+    def __init__(self, filename: str, std, writer: LogWriter, format_msg=False) -> None:
         self.console = std
-        self.file = open(filename, 'w')
+        self.writer = writer
+        self.file = writer.open(filename)
         self.format_msg = format_msg
 
     def write(self, message) -> None:
@@ -21,33 +177,64 @@ class CustomOut:
         """
         if self.format_msg and message != "\n":
             message = f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {message}"
-            
+
         self.console.write(message)
-        
+
         # Write logs
-        self.file.write(message)
-        self.file.flush()
-        os.fsync(self.file.fileno())
+        self.writer.put(self.file, message)
 
     def flush(self) -> None:
         """
-        Flush I/O
+        Flush I/O. Files are synced by the writer.
         """
         self.console.flush()
-        self.file.flush()
-        os.fsync(self.file.fileno())
 
 
-def initialize(directory: str) -> None:
+writer: Union[LogWriter, None] = None
+previous_handlers = {}  # Signal handlers replaced by on_signal
+
+
+def on_signal(signum, frame) -> None:
+    """
+    Sync the logs before the process is terminated by a signal,
+    then let the previous handler or the default action handle it.
+    """
+
+    if writer is not None:
+        writer.flush()
+
+    previous = previous_handlers.get(signum, signal.SIG_DFL)
+    if callable(previous):
+        previous(signum, frame)
+    elif previous == signal.SIG_DFL:
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+def initialize(directory: str, queue_size: int = 4096, sync_interval: float = 1.0) -> None:
     """
     Initialize logging system.
     :param directory: Directory to save stdout.txt and stderr.txt
+    :param queue_size: Maximum messages waiting for the disk, the rest are dropped
+    :param sync_interval: Seconds between fsyncs
     """
+    global writer
+
     # Create directory if it doesn't exist.
     if not os.path.exists(directory):
         os.mkdir(directory)
 
-    sys.stdout = CustomOut(os.path.join(directory, "stdout.txt"), sys.stdout, True)  # Stdout
-    sys.stderr = CustomOut(os.path.join(directory, "stderr.txt"), sys.stderr)  # Stderr
+    writer = LogWriter(queue_size, sync_interval)
+    sys.stdout = CustomOut(os.path.join(directory, "stdout.txt"), sys.stdout, writer, True)  # Stdout
+    sys.stderr = CustomOut(os.path.join(directory, "stderr.txt"), sys.stderr, writer)  # Stderr
+
+    # Write everything on exit and on termination signals.
+    atexit.register(writer.close)
+    if threading.current_thread() is threading.main_thread():
+        for name in ("SIGTERM", "SIGHUP"):
+            if hasattr(signal, name):
+                signum = getattr(signal, name)
+                previous_handlers[signum] = signal.getsignal(signum)
+                signal.signal(signum, on_signal)
 
     print("Logger initialized.")
@@ -0,0 +1,190 @@
+"""Frame ring in shared memory for the worker processes."""
+from multiprocessing import shared_memory
+from typing import Tuple, Union
+
+import contextlib
+import multiprocessing
+
+import numpy as np
+
+
+class SharedRing:
+    """
+    Fixed-size frame slots in shared memory. One writer fills the slots in sequence order,
+    readers in other processes find a frame by its sequence number: the slot index is sequence % slots.
+    Nothing is pickled or queued, the processes only exchange the shared memory name once.
+
+    The writer never waits for the readers. A slot is marked with sequence -1 while it is written,
+    so a reader checks the sequence of the slot before and after copying it to detect frames
+    that are overwritten while being read.
+
+    Memory ordering: the sequences and timestamps are only accessed under a lock shared by every process,
+    the images are copied outside of it. Lock operations are full memory barriers (POSIX semaphores
+    synchronize memory), so a reader that sees a committed sequence also sees the image written before
+    the commit, and a slot claimed while a reader copies it is seen by the check after the copy.
+    Plain loads and stores to the shared memory would give neither on ARM.
+    A process that dies holding the lock can't block the others, the lock is taken over after LOCK_TIMEOUT.
+
+    Memory layout: latest sequence and the (sequence, timestamp) of every slot, then the frames.
+    """
+
+    META = np.dtype([("sequence", "<i8"), ("timestamp", "<f8")])
+    ALIGNMENT = 64
+    LOCK_TIMEOUT = 1.0  # Seconds, the lock is only held for a few loads and stores
+
+    memory: shared_memory.SharedMemory
+    meta: np.ndarray    # meta[0] holds the latest sequence, meta[1 + index] the slots
+    images: np.ndarray  # (Slots, Height, Width, Channels)
+
+    owner: bool  # Created the memory, unlinks it
+    closed: bool = False
+
+    def __init__(
+            self,
+            shape: Tuple[int, ...],
+            slots: int = 8,
+            name: Union[str, None] = None,
+            lock=None
+    ) -> None:
+        """
+        :param shape: Frame shape, e.g. (720, 1280, 3)
+        :param slots: Number of frames, bounds how late a reader can be before frames are lost
+        :param name: Shared memory to attach to, creates a new one if None
+        :param lock: multiprocessing.Lock of the ring, created if None. It can only be handed to the other
+        processes when they are started, so a ring that is created after them needs a lock created before.
+        """
+
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = name is None
+        self.lock = lock if lock is not None else multiprocessing.get_context("spawn").Lock()
+
+        meta_bytes = -(-self.META.itemsize * (slots + 1) // self.ALIGNMENT) * self.ALIGNMENT
+        frame_bytes = int(np.prod(self.shape))
+        self.memory = shared_memory.SharedMemory(name, self.owner, meta_bytes + frame_bytes * slots)
+
+        self.meta = np.ndarray((slots + 1,), self.META, self.memory.buf)
+        self.images = np.ndarray((slots, *self.shape), np.uint8, self.memory.buf, meta_bytes)
+
+        if self.owner:
+            self.meta["sequence"] = -1
+            self.meta["timestamp"] = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def handle(self) -> Tuple[str, Tuple[int, ...], int]:
+        """
+        :return: Arguments to attach to the ring from another process: (Name, Shape, Slots), the lock is passed apart
+        """
+        return self.memory.name, self.shape, self.slots
+
+    @classmethod
+    def attach(cls, handle: Tuple[str, Tuple[int, ...], int], lock) -> "SharedRing":
+        """
+        :param handle: Returned by handle()
+        :param lock: Lock of the ring
+        :return: Ring on the same memory
+        """
+
+        name, shape, slots = handle
+        return cls(shape, slots, name, lock)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Hold the lock of the metadata.
+        """
+
+        if not self.lock.acquire(True, self.LOCK_TIMEOUT):
+            print("Frame ring lock is not released, taking it over.")
+        try:
+            yield
+        finally:
+            try:
+                self.lock.release()
+            except ValueError:
+                # Released by the holder after it was taken over
+                pass
+
+    def latest(self) -> int:
+        """
+        :return: Sequence number of the latest frame, -1 if nothing is written yet
+        """
+
+        with self.locked():
+            return int(self.meta[0]["sequence"])
+
+    def claim(self) -> Tuple[int, np.ndarray]:
+        """
+        Called by the writer. The slot is invalid until commit() is called.
+        :return: Next sequence and the image of its slot to write into
+        """
+
+        with self.locked():
+            sequence = int(self.meta[0]["sequence"]) + 1
+            index = sequence % self.slots
+            self.meta[1 + index]["sequence"] = -1
+        return sequence, self.images[index]
+
+    def commit(self, sequence: int, timestamp: float) -> None:
+        """
+        Called by the writer after the claimed image is written, makes it the latest frame.
+        :param sequence: Sequence returned by claim()
+        :param timestamp: Capture timestamp
+        """
+
+        slot = self.meta[1 + sequence % self.slots]
+        with self.locked():
+            slot["timestamp"] = timestamp
+            slot["sequence"] = sequence
+            self.meta[0]["sequence"] = sequence
+
+    def valid(self, sequence: int) -> bool:
+        """
+        :param sequence: Sequence number
+        :return: Is the frame still in its slot
+        """
+
+        with self.locked():
+            return int(self.meta[1 + sequence % self.slots]["sequence"]) == sequence
+
+    def read(self, sequence: int, out: np.ndarray) -> Union[float, None]:
+        """
+        Copy the frame out of the ring.
+        :param sequence: Sequence number
+        :param out: Array of the frame shape
+        :return: Capture timestamp, None if the frame is overwritten
+        """
+
+        slot = self.meta[1 + sequence % self.slots]
+        with self.locked():
+            timestamp = float(slot["timestamp"])
+            if int(slot["sequence"]) != sequence:
+                return None
+
+        np.copyto(out, self.images[sequence % self.slots])
+
+        # Overwritten while copying
+        with self.locked():
+            if int(slot["sequence"]) != sequence or float(slot["timestamp"]) != timestamp:
+                return None
+        return timestamp
+
+    def close(self) -> None:
+        """
+        Detach from the memory, unlinks it if this is the owner. Can be called again.
+        """
+
+        if self.closed:
+            return
+        self.closed = True
+
+        # Views must be released before the memory is closed.
+        del self.meta
+        del self.images
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
@@ -0,0 +1,254 @@
+"""Command channel to the simulator."""
+from typing import Deque, List, Tuple, Union
+
+import bisect
+import collections
+import threading
+import time
+
+from . import connection as conn
+
+
+class Command:
+    """
+    Single byte commands of the simulator.
+    """
+
+    DROP = b"\x01"  # Open the package door
+    ACK = b"\x06"   # Sent back by the simulator for every command it carried out, optional
+
+
+class LatencyHistogram:
+    """
+    Latency counts in fixed logarithmic buckets, ten per decade from 0.1 ms to 1 s.
+    Adding a sample is a bisect and an increment, percentiles are the upper bound of the bucket they fall into.
+    """
+
+    BOUNDS = tuple(1e-4 * 10 ** (i / 10) for i in range(41))  # Seconds
+
+    count: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(self.BOUNDS) + 1)
+
+    def add(self, seconds: float) -> None:
+        """
+        :param seconds: Latency
+        """
+
+        index = bisect.bisect_left(self.BOUNDS, seconds)
+        self.counts[index] = self.counts[index] + 1
+        self.count = self.count + 1
+        self.total = self.total + seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, percent: float) -> float:
+        """
+        :param percent: Between 0 and 100
+        :return: Upper bound of the bucket in seconds, at most the maximum
+        """
+
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen = seen + count
+            if count > 0 and seen >= rank:
+                return min(self.BOUNDS[index], self.maximum) if index < len(self.BOUNDS) else self.maximum
+        return self.maximum
+
+    def summary(self) -> str:
+        """
+        :return: One line summary in milliseconds
+        """
+
+        if self.count == 0:
+            return "no samples"
+
+        return (
+            f"{self.count} samples, mean {self.total / self.count * 1000:.2f} ms, "
+            f"p50 <= {self.percentile(50) * 1000:.3g} ms, p99 <= {self.percentile(99) * 1000:.3g} ms, "
+            f"max {self.maximum * 1000:.2f} ms"
+        )
+
+    def table(self) -> str:
+        """
+        :return: One line per non-empty bucket
+        """
+
+        lines = []
+        for index, count in enumerate(self.counts):
+            if count == 0:
+                continue
+            bound = f"<= {self.BOUNDS[index] * 1000:.3g} ms" if index < len(self.BOUNDS) else f"> {self.BOUNDS[-1] * 1000:.3g} ms"
+            lines.append(f"{bound:>12} {count:6d} {'#' * max(1, round(40 * count / self.count))}")
+        return "\n".join(lines)
+
+
+class SimulatorLink(conn.Connection):
+    """
+    TCP command connection to the simulator on a single asyncio event loop on a background thread,
+    reconnecting with exponential backoff like the ground station.
+    Nagle's algorithm is disabled, a command is a single byte that must not wait for more.
+
+    The processing thread only puts the commands into a bounded outbox, it never blocks on the socket.
+    Commands that wait longer than max_age, e.g. while disconnected, are not sent: a late drop misses the target.
+    The simulator may acknowledge each command with an ACK byte. Acks carry no id, TCP keeps them
+    in order, so each one is matched with the oldest command in flight.
+    """
+
+    name = "simulator"
+    no_delay = True
+
+    sent: int = 0        # Commands written to the socket
+    acked: int = 0       # Commands acknowledged
+    unacked: int = 0     # Commands never acknowledged, the connection was lost or too many were in flight
+    expired: int = 0     # Commands older than max_age when they could be sent
+    overflowed: int = 0  # Commands replaced in the full outbox
+
+    outbox: Deque[Tuple[bytes, float]]     # (Command, Request time), shared with the caller threads
+    in_flight: Deque[Tuple[float, float]]  # (Request time, Sent time) of the commands waiting for an ack
+
+    def __init__(
+            self,
+            host: str,
+            port: int,
+            max_outbox: int = 16,
+            max_age: float = 1.0,
+            max_in_flight: int = 64
+    ) -> None:
+        """
+        :param host: Simulator host
+        :param port: Simulator port
+        :param max_outbox: Commands waiting for the connection, the oldest one is replaced when full
+        :param max_age: Seconds a command may wait in the outbox
+        :param max_in_flight: Commands waiting for an ack, more means the simulator doesn't ack
+        """
+
+        self.max_outbox = max_outbox
+        self.max_age = max_age
+        self.max_in_flight = max_in_flight
+        self.outbox = collections.deque()
+        self.in_flight = collections.deque()
+        self.lock = threading.Lock()
+
+        self.queued = LatencyHistogram()      # Request to socket write
+        self.round_trip = LatencyHistogram()  # Socket write to ack
+        self.closed_loop = LatencyHistogram()  # Request to ack
+
+        super().__init__(host, port)
+
+    def send(self, command: bytes, timestamp: Union[float, None] = None) -> bool:
+        """
+        Queue a command. Thread-safe and never blocks, called from the processing thread.
+        :param command: One of Command
+        :param timestamp: time.monotonic() the command is decided at, e.g. the capture timestamp of the frame. Now if None
+        :return: False if the link is terminated
+        """
+
+        requested = time.monotonic() if timestamp is None else timestamp
+
+        with self.lock:
+            if len(self.outbox) >= self.max_outbox:
+                self.outbox.popleft()
+                self.overflowed = self.overflowed + 1
+            self.outbox.append((command, requested))
+
+        try:
+            self.loop.call_soon_threadsafe(self.flush)
+        except RuntimeError:
+            # Loop is closed
+            return False
+
+        return True
+
+    def flush(self) -> None:
+        """
+        Write the outbox to the socket. Runs on the event loop, the write only fills the transport buffer.
+        """
+
+        if not self.connected or self.writer is None:
+            return
+
+        with self.lock:
+            commands = list(self.outbox)
+            self.outbox.clear()
+
+        now = time.monotonic()
+        for command, requested in commands:
+            if now - requested > self.max_age:
+                self.expired = self.expired + 1
+                continue
+
+            self.writer.write(command)
+            self.sent = self.sent + 1
+            self.queued.add(now - requested)
+
+            self.in_flight.append((requested, now))
+            if len(self.in_flight) > self.max_in_flight:
+                self.in_flight.popleft()
+                self.unacked = self.unacked + 1
+
+    def on_message(self, data: bytes) -> None:
+        """
+        Match the acks with the commands in flight, other bytes are ignored.
+        :param data: Received bytes
+        """
+
+        now = time.monotonic()
+        for _ in range(data.count(Command.ACK)):
+            if len(self.in_flight) == 0:
+                break
+
+            requested, sent = self.in_flight.popleft()
+            self.acked = self.acked + 1
+            self.round_trip.add(now - sent)
+            self.closed_loop.add(now - requested)
+
+    def on_established(self) -> None:
+        """
+        Triggered when the connection is established, sends the commands queued meanwhile.
+        """
+
+        print("Successfully connected to the simulator!")
+        self.flush()
+
+    def on_terminated(self) -> None:
+        """
+        Triggered when the connection is broken, the commands in flight can't be acknowledged anymore.
+        """
+
+        self.unacked = self.unacked + len(self.in_flight)
+        self.in_flight.clear()
+
+    def status(self) -> dict:
+        """
+        Connection state for inspection.
+        :return: State and counters
+        """
+
+        status = super().status()
+        status.update({
+            "sent": self.sent,
+            "acked": self.acked,
+            "unacked": self.unacked,
+            "expired": self.expired,
+            "overflowed": self.overflowed
+        })
+        return status
+
+    def summary(self) -> str:
+        """
+        :return: Counters and latency summaries
+        """
+
+        lines = [
+            f"Simulator commands: {self.sent} sent, {self.acked} acked, {self.unacked} unacked, "
+            f"{self.expired} expired, {self.overflowed} overflowed",
+            f"  Queued:      {self.queued.summary()}"
+        ]
+        if self.acked > 0:
+            lines.append(f"  Round trip:  {self.round_trip.summary()}")
+            lines.append(f"  Closed loop: {self.closed_loop.summary()}")
+        return "\n".join(lines)
@@ -0,0 +1,199 @@
+"""Adaptive bitrate encoder for the ground station stream."""
+from typing import Callable, Union
+
+import threading
+import time
+
+import numpy as np
+import cv2
+
+
+class StreamWorker:
+    """
+    Encodes the stream on its own thread. The processing thread only copies the frame into
+    a one-slot mailbox, frames that arrive while the worker is busy replace the waiting one.
+    Resolution, JPEG quality and send rate are adjusted to keep the stream under the target bitrate,
+    stepping down on congestion and back up when there is headroom.
+    """
+
+    # Downscale steps of the stream
+    SCALES = (1.0, 0.75, 0.5, 0.375, 0.25)
+
+    QUALITY_STEP = 10
+    MIN_QUALITY = 20
+    MIN_RATE = 2.0
+
+    thread: Union[threading.Thread, None] = None
+    running: bool = False
+
+    mailbox: Union[np.ndarray, None] = None  # Latest submitted frame
+    waiting: bool = False                    # Mailbox has a frame that is not encoded yet
+    skipped: int = 0                         # Frames replaced in the mailbox before being encoded
+    sent: int = 0                            # Frames sent
+    congestions: int = 0                     # Congestion signals received
+
+    bitrate: float = 0.0       # Measured bits per second, moving average
+    last_sent: Union[float, None] = None  # time.monotonic() of the previous send
+    scale_index: int = 0
+    last_change: float = 0.0   # time.monotonic() of the last step
+    congested: bool = False    # Congestion signal waiting to be handled
+
+    def __init__(
+            self,
+            send: Callable[[bytes], bool],
+            target_bitrate: int = 2_000_000,
+            max_rate: float = 15.0,
+            max_quality: int = 60
+    ) -> None:
+        """
+        :param send: Sends the encoded frame, returns False on congestion
+        :param target_bitrate: Bits per second
+        :param max_rate: Maximum frames per second
+        :param max_quality: Maximum JPEG quality
+        """
+
+        self.send = send
+        self.target_bitrate = target_bitrate
+        self.max_rate = max_rate
+        self.max_quality = max_quality
+
+        self.rate = max_rate
+        self.quality = max_quality
+        self.condition = threading.Condition()
+
+    def start(self) -> None:
+        """
+        Start the worker.
+        """
+
+        self.running = True
+        self.thread = threading.Thread(target=self.encode_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker and wait for it.
+        """
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def submit(self, frame: np.ndarray) -> None:
+        """
+        Put the frame into the mailbox. Called from the processing thread.
+        :param frame: BGR frame
+        """
+
+        with self.condition:
+            if self.mailbox is None or self.mailbox.shape != frame.shape:
+                self.mailbox = np.empty_like(frame)
+            if self.waiting:
+                self.skipped = self.skipped + 1
+
+            np.copyto(self.mailbox, frame)
+            self.waiting = True
+            self.condition.notify_all()
+
+    def report(self, received: int, lost: int) -> None:
+        """
+        Receiver report from the ground station.
+        :param received: Frames received since the last report
+        :param lost: Frames lost since the last report
+        """
+
+        if lost > 0 and lost / max(received + lost, 1) > 0.05:
+            self.congested = True
+
+    def set_target(self, bitrate: int) -> None:
+        """
+        Change the target bitrate.
+        :param bitrate: Bits per second
+        """
+
+        self.target_bitrate = bitrate
+
+    def encode_loop(self) -> None:
+        """
+        Encode and send the mailbox until stopped.
+        """
+
+        frame = None
+        next_send = time.monotonic()
+
+        while True:
+            # Send rate
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.running, delay)
+
+            with self.condition:
+                self.condition.wait_for(lambda: self.waiting or not self.running)
+                if not self.running:
+                    return
+
+                # Swap the mailbox with the previous buffer, so the next submit doesn't allocate.
+                frame, self.mailbox = self.mailbox, frame
+                self.waiting = False
+
+            start = time.monotonic()
+            next_send = start + 1 / self.rate
+
+            scale = self.SCALES[self.scale_index]
+            image = frame
+            if scale < 1.0:
+                image = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+            encoded, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            if not encoded:
+                continue
+
+            if self.send(buffer.tobytes()):
+                self.sent = self.sent + 1
+            else:
+                self.congested = True
+
+            # Bits per second over the time since the previous send, the frames may come slower than the rate.
+            elapsed = 1 / self.rate if self.last_sent is None else max(start - self.last_sent, 1e-3)
+            self.last_sent = start
+            self.bitrate = 0.8 * self.bitrate + 0.2 * buffer.size * 8 / elapsed
+            self.adapt(start)
+
+    def adapt(self, now: float) -> None:
+        """
+        Step the quality, resolution and rate down on congestion or when over the target,
+        step back up when there is headroom. Down steps happen at most every 0.5 seconds,
+        up steps every 2 seconds.
+        :param now: time.monotonic()
+        """
+
+        if self.congested or self.bitrate > self.target_bitrate * 1.1:
+            if now - self.last_change < 0.5:
+                return
+            if self.congested:
+                self.congestions = self.congestions + 1
+            self.congested = False
+            self.last_change = now
+
+            if self.quality - self.QUALITY_STEP >= self.MIN_QUALITY:
+                self.quality = self.quality - self.QUALITY_STEP
+            elif self.scale_index < len(self.SCALES) - 1:
+                self.scale_index = self.scale_index + 1
+                self.quality = self.max_quality
+            else:
+                self.rate = max(self.MIN_RATE, self.rate / 2)
+
+        elif self.bitrate < self.target_bitrate * 0.6 and now - self.last_change >= 2.0:
+            self.last_change = now
+
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate * 2)
+            elif self.quality + self.QUALITY_STEP <= self.max_quality:
+                self.quality = self.quality + self.QUALITY_STEP
+            elif self.scale_index > 0:
+                self.scale_index = self.scale_index - 1
+                self.quality = self.MIN_QUALITY
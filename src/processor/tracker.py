@@ -0,0 +1,143 @@
+"""Predictive region of interest tracking."""
+from typing import Tuple, Union
+
+
+class TrackerState:
+    """
+    States of the tracker.
+    """
+
+    TRACKING = "tracking"        # Target is found in the last frame
+    REACQUIRING = "reacquiring"  # Target is missed, searching around the predicted position
+    LOST = "lost"                # Target is missed too many times, searching the whole frame
+
+
+class RoiTracker:
+    """
+    Constant velocity (alpha-beta) predictor that keeps a search window around the target,
+    so thresholding and contour search only run on a small part of the frame.
+    Falls back to the full frame after too many misses.
+    """
+
+    state: str = TrackerState.LOST
+    misses: int = 0
+
+    x: float = 0.0
+    y: float = 0.0
+    velocity_x: float = 0.0
+    velocity_y: float = 0.0
+    width: int = 0
+    height: int = 0
+    timestamp: float = 0.0
+
+    def __init__(
+            self,
+            window: int,
+            max_misses: int,
+            alpha: float = 0.75,
+            beta: float = 0.45
+    ) -> None:
+        """
+        :param window: Minimum width and height of the search window
+        :param max_misses: Misses in a row before falling back to the full frame search
+        :param alpha: Position correction gain
+        :param beta: Velocity correction gain
+        """
+
+        self.window = window
+        self.max_misses = max_misses
+        self.alpha = alpha
+        self.beta = beta
+
+    def predict(self, timestamp: float) -> Tuple[float, float]:
+        """
+        Predicted position of the target.
+        :param timestamp: Capture timestamp of the frame
+        :return: (X, Y)
+        """
+
+        dt = timestamp - self.timestamp
+        return self.x + self.velocity_x * dt, self.y + self.velocity_y * dt
+
+    def search_window(
+            self,
+            timestamp: float,
+            frame_width: int,
+            frame_height: int
+    ) -> Union[Tuple[int, int, int, int], None]:
+        """
+        Region to search the target in.
+        :param timestamp: Capture timestamp of the frame
+        :param frame_width: Width of the frame
+        :param frame_height: Height of the frame
+        :return: (Start X, Start Y, End X, End Y) or None to search the whole frame
+        """
+
+        if self.state == TrackerState.LOST:
+            return None
+
+        x, y = self.predict(timestamp)
+
+        # Window grows with every miss.
+        scale = 1 + self.misses
+        half_width = max(self.window, self.width * 2) * scale // 2
+        half_height = max(self.window, self.height * 2) * scale // 2
+
+        start_x = min(max(int(x) - half_width, 0), frame_width)
+        start_y = min(max(int(y) - half_height, 0), frame_height)
+        end_x = min(max(int(x) + half_width, 0), frame_width)
+        end_y = min(max(int(y) + half_height, 0), frame_height)
+
+        if start_x >= end_x or start_y >= end_y:
+            return None
+
+        return start_x, start_y, end_x, end_y
+
+    def update(
+            self,
+            timestamp: float,
+            centroid: Union[Tuple[int, int], None],
+            size: Tuple[int, int] = (0, 0)
+    ) -> None:
+        """
+        Correct the prediction with the detection result.
+        :param timestamp: Capture timestamp of the frame
+        :param centroid: Detected centroid, None if the target is not found
+        :param size: Bounding box size of the target
+        """
+
+        previous_state = self.state
+
+        if centroid is None:
+            if self.state != TrackerState.LOST:
+                self.misses = self.misses + 1
+                self.state = TrackerState.REACQUIRING
+                if self.misses > self.max_misses:
+                    self.state = TrackerState.LOST
+                    self.misses = 0
+                    self.velocity_x, self.velocity_y = 0.0, 0.0
+        elif self.state == TrackerState.LOST:
+            # First detection, nothing to predict from.
+            self.x, self.y = centroid
+            self.velocity_x, self.velocity_y = 0.0, 0.0
+            self.timestamp = timestamp
+            self.width, self.height = size
+            self.state = TrackerState.TRACKING
+        else:
+            dt = timestamp - self.timestamp
+            predicted_x, predicted_y = self.predict(timestamp)
+            residual_x, residual_y = centroid[0] - predicted_x, centroid[1] - predicted_y
+
+            self.x = predicted_x + self.alpha * residual_x
+            self.y = predicted_y + self.alpha * residual_y
+            if dt > 0:
+                self.velocity_x = self.velocity_x + self.beta * residual_x / dt
+                self.velocity_y = self.velocity_y + self.beta * residual_y / dt
+
+            self.timestamp = timestamp
+            self.width, self.height = size
+            self.misses = 0
+            self.state = TrackerState.TRACKING
+
+        if (self.state == TrackerState.LOST) != (previous_state == TrackerState.LOST):
+            print(f"Tracker: {self.state}")
@@ -1,55 +1,152 @@
-from typing import Tuple
+from typing import Callable, List, Tuple, Union
 
+import heapq
+import itertools
+import os
 import threading
 import time
 
 import numpy as np
 import cv2
 
-class PeriodicTimer:
+class Job:
     """
-    Periodic timer can be cancelled without waiting through the cooldown
-    thanks to its algorithm which is sleeping in specified periods. 
+    Scheduled callback. Can be cancelled any time.
     """
-    __cancel: bool = False
-    
-    def __init__(
-            self, 
-            delay: float, 
-            period: float, 
-            callback: callable
-        ) -> None:
-        
-        self.delay = delay
+
+    __slots__ = ("deadline", "period", "callback", "cancelled")
+
+    deadline: float             # time.monotonic() to run at
+    period: Union[float, None]  # Seconds between runs, None for one-shot jobs
+    callback: Callable[[], None]
+    cancelled: bool
+
+    def __init__(self, deadline: float, period: Union[float, None], callback: Callable[[], None]) -> None:
+        self.deadline = deadline
         self.period = period
         self.callback = callback
-    
-    def loop(self) -> None:
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """
+        Cancel the job. It won't run again, a run that is already started completes.
+        """
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Runs every timer on a single thread. Deadlines are kept in a heap and the thread
+    sleeps on a condition variable until the earliest one, so it only wakes up when there is work.
+    Callbacks must be short, they delay the other jobs.
+    """
+
+    thread: Union[threading.Thread, None] = None
+    running: bool = False
+
+    def __init__(self) -> None:
+        self.heap: List[Tuple[float, int, Job]] = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def schedule(self, delay: float, callback: Callable[[], None], period: Union[float, None] = None) -> Job:
         """
-        Call the callback function when wait ends.
+        Run the callback after the delay.
+        :param delay: Seconds to wait
+        :param callback: Function to call on the scheduler thread
+        :param period: Repeat every period seconds if given, greater than 0
+        :return: Job to cancel
         """
-        
-        while self.delay > 0:
-            self.delay = self.delay - self.period
-            time.sleep(self.period)
-            if self.__cancel:
-                return
-            
-        self.callback()
-    
-    def start(self) -> None:
+
+        job = Job(time.monotonic() + delay, period, callback)
+
+        with self.condition:
+            heapq.heappush(self.heap, (job.deadline, next(self.counter), job))
+
+            # Start on demand, also after a shutdown.
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+            self.condition.notify()
+
+        return job
+
+    def run(self) -> None:
         """
-        Start waiting.
+        Scheduler loop.
         """
-        
-        self.thread = threading.Thread(target=self.loop)
-        self.thread.start()
-    
-    def cancel(self) -> None:
+
+        with self.condition:
+            # An old thread exits even if the scheduler is restarted right after a shutdown.
+            while self.running and self.thread is threading.current_thread():
+
+                # Lazily remove the cancelled jobs.
+                while len(self.heap) > 0 and self.heap[0][2].cancelled:
+                    heapq.heappop(self.heap)
+
+                if len(self.heap) == 0:
+                    self.condition.wait()
+                    continue
+
+                delay = self.heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                _, _, job = heapq.heappop(self.heap)
+                if job.period is not None:
+                    # Keep the cadence, skip the missed runs.
+                    missed = max(0, int((time.monotonic() - job.deadline) // job.period))
+                    job.deadline = job.deadline + (missed + 1) * job.period
+                    heapq.heappush(self.heap, (job.deadline, next(self.counter), job))
+
+                self.condition.release()
+                try:
+                    job.callback()
+                except Exception as e:
+                    print(f"Scheduled job failed: {e}")
+                finally:
+                    self.condition.acquire()
+
+    def shutdown(self, wait: bool = True) -> None:
         """
-        Cancel the callback.
+        Cancel every job and stop the thread.
+        :param wait: Wait for the running callback to complete
         """
-        self.__cancel = True
+
+        with self.condition:
+            self.running = False
+            for _, _, job in self.heap:
+                job.cancel()
+            self.heap.clear()
+            self.condition.notify_all()
+            thread = self.thread
+
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+
+# Shared by the whole processor
+scheduler = Scheduler()
+
+
+def unique_path(directory: str, name: str, extension: str) -> str:
+    """
+    First path that doesn't exist: name.ext, name_1.ext, name_2.ext...
+    :param directory: Directory
+    :param name: File name without the extension
+    :param extension: Extension with the dot
+    :return: Path
+    """
+
+    path = os.path.join(directory, f"{name}{extension}")
+    num = 0
+    while os.path.isfile(path):
+        num = num + 1
+        path = os.path.join(directory, f"{name}_{num}{extension}")
+    return path
 
 
 def draw_square(
@@ -134,3 +231,36 @@ def draw_square(
         color,
         thickness
     )
+
+
+def draw_visualization(
+        frame: np.ndarray,
+        center: Union[Tuple[int, int], None],
+        box: Tuple[int, int, int, int],
+        collision: bool
+) -> None:
+    """
+    Draw the target crosshair and the collision box.
+    :param frame: OpenCV frame
+    :param center: Target center, None if there is no target
+    :param box: Collision box as (Start X, Start Y, End X, End Y)
+    :param collision: Is the target in the collision box
+    """
+
+    frame_h, frame_w = frame.shape[:2]
+    if center is not None:
+        cx, cy = center
+        cv2.circle(frame, (cx, cy), 10, (255, 255, 255), -1)
+        cv2.line(frame, (cx, 0), (cx, cy - 40), (255, 255, 255), 3)
+        cv2.line(frame, (cx, frame_h), (cx, cy + 40), (255, 255, 255), 3)
+        cv2.line(frame, (0, cy), (cx - 40, cy), (255, 255, 255), 3)
+        cv2.line(frame, (frame_w, cy), (cx + 40, cy), (255, 255, 255), 3)
+
+    collision_color = (0, 255, 0) if collision else (255, 255, 255)
+    draw_square(
+        frame,
+        (box[0], box[1]),
+        (box[2], box[3]),
+        collision_color,
+        3
+    )
@@ -4,12 +4,13 @@ import tkinter
 import numpy as np
 import colorsys
 
+from . import config as conf
 from . import properties
 
 
 class Windowed(properties.Properties):
     
-    def __init__(self, config) -> None:
+    def __init__(self, config: conf.ConfigUtil) -> None:
     
         self.app = tkinter.Tk()
         self.app.title("Yelkiran UAV - Image Processing - Preview")
@@ -34,21 +35,21 @@ class Windowed(properties.Properties):
         lower_h_panel.pack(side=tkinter.LEFT)
         tkinter.Label(lower_h_panel, text="Hue").pack()
         lower_h = tkinter.Scale(lower_h_panel, from_=0, to=180)
-        lower_h.set(config.get_int("opencv.lower_h"))
+        lower_h.set(config.snapshot.opencv.lower_h)
         lower_h.pack()
     
         lower_s_panel = tkinter.Frame(lower_hsv_panel)
         lower_s_panel.pack(side=tkinter.LEFT)
         tkinter.Label(lower_s_panel, text="Saturation").pack()
         lower_s = tkinter.Scale(lower_s_panel, from_=0, to=255)
-        lower_s.set(config.get_int("opencv.lower_s"))
+        lower_s.set(config.snapshot.opencv.lower_s)
         lower_s.pack()
     
         lower_v_panel = tkinter.Frame(lower_hsv_panel)
         lower_v_panel.pack(side=tkinter.LEFT)
         tkinter.Label(lower_v_panel, text="Value").pack()
         lower_v = tkinter.Scale(lower_v_panel, from_=0, to=255)
-        lower_v.set(config.get_int("opencv.lower_v"))
+        lower_v.set(config.snapshot.opencv.lower_v)
         lower_v.pack(side=tkinter.LEFT)
     
         # Lower HSV Example
@@ -78,21 +79,21 @@ class Windowed(properties.Properties):
         upper_h_panel.pack(side=tkinter.LEFT)
         tkinter.Label(upper_h_panel, text="Hue").pack()
         upper_h = tkinter.Scale(upper_h_panel, from_=0, to=180)
-        upper_h.set(config.get_int("opencv.upper_h"))
+        upper_h.set(config.snapshot.opencv.upper_h)
         upper_h.pack()
     
         upper_s_panel = tkinter.Frame(upper_hsv_panel)
         upper_s_panel.pack(side=tkinter.LEFT)
         tkinter.Label(upper_s_panel, text="Saturation").pack()
         upper_s = tkinter.Scale(upper_s_panel, from_=0, to=255)
-        upper_s.set(config.get_int("opencv.upper_s"))
+        upper_s.set(config.snapshot.opencv.upper_s)
         upper_s.pack()
     
         upper_v_panel = tkinter.Frame(upper_hsv_panel)
         upper_v_panel.pack(side=tkinter.LEFT)
         tkinter.Label(upper_v_panel, text="Value").pack()
         upper_v = tkinter.Scale(upper_v_panel, from_=0, to=255)
-        upper_v.set(config.get_int("opencv.upper_v"))
+        upper_v.set(config.snapshot.opencv.upper_v)
         upper_v.pack(side=tkinter.LEFT)
     
         # Utilities
@@ -117,7 +118,7 @@ class Windowed(properties.Properties):
             h, s, v = get_upper_hsv()
             rgb = np.array(colorsys.hsv_to_rgb(h / 180, s / 255, v / 255)) * 255
             rgb = np.uint32(rgb)
-            self.upper_hsv = np.array([h, s, v], np.uint8)
+            self.publish(upper_hsv=(h, s, v))
     
             upper_hsv_example.itemconfigure(
                 upper_hsv_example_fill,
@@ -134,7 +135,7 @@ class Windowed(properties.Properties):
             h, s, v = get_lower_hsv()
             rgb = np.array(colorsys.hsv_to_rgb(h / 180, s / 255, v / 255)) * 255
             rgb = np.uint32(rgb)
-            self.lower_hsv = np.array([h, s, v], np.uint8)
+            self.publish(lower_hsv=(h, s, v))
     
             lower_hsv_example.itemconfigure(
                 lower_hsv_example_fill,
@@ -199,11 +200,8 @@ class Windowed(properties.Properties):
             """
             Update the collision data.
             """
-            self.box_collision_width, \
-                self.box_collision_height, \
-                self.box_collision_horizontal, \
-                self.box_collision_vertical \
-                = get_collision_box_data()
+            width, height, horizontal, vertical = get_collision_box_data()
+            self.publish(box_width=width, box_height=height, box_horizontal=horizontal, box_vertical=vertical)
         
         def fill_collision_box_data() -> None:
             """
@@ -213,10 +211,10 @@ class Windowed(properties.Properties):
             col_box_height_sb.delete(0, "end")
             col_box_horizontal_offset_sb.delete(0, "end")
             col_box_vertical_offset_sb.delete(0, "end")
-            col_box_width_sb.insert(0, config.get_string("opencv.collision-box-width"))
-            col_box_height_sb.insert(0, config.get_string("opencv.collision-box-height"))
-            col_box_horizontal_offset_sb.insert(0, config.get_string("opencv.collision-box-horizontal-offset"))
-            col_box_vertical_offset_sb.insert(0, config.get_string("opencv.collision-box-vertical-offset"))
+            col_box_width_sb.insert(0, config.snapshot.opencv.collision_box_width)
+            col_box_height_sb.insert(0, config.snapshot.opencv.collision_box_height)
+            col_box_horizontal_offset_sb.insert(0, config.snapshot.opencv.collision_box_horizontal_offset)
+            col_box_vertical_offset_sb.insert(0, config.snapshot.opencv.collision_box_vertical_offset)
     
         fill_collision_box_data()
         update_collision_box_data()
@@ -231,35 +229,37 @@ class Windowed(properties.Properties):
             Save changes.
             """
 
-            h, s, v = get_upper_hsv()
-            config.set_field("opencv.upper_h", str(h))
-            config.set_field("opencv.upper_s", str(s))
-            config.set_field("opencv.upper_v", str(v))
-    
-            h, s, v = get_lower_hsv()
-            config.set_field("opencv.lower_h", str(h))
-            config.set_field("opencv.lower_s", str(s))
-            config.set_field("opencv.lower_v", str(v))
-    
+            upper_h_value, upper_s_value, upper_v_value = get_upper_hsv()
+            lower_h_value, lower_s_value, lower_v_value = get_lower_hsv()
             width, height, horizontal, vertical = get_collision_box_data()
-            config.set_field("opencv.collision-box-width", str(width))
-            config.set_field("opencv.collision-box-height", str(height))
-            config.set_field("opencv.collision-box-horizontal-offset", str(horizontal))
-            config.set_field("opencv.collision-box-vertical-offset", str(vertical))
-    
-            config.save()
+
+            try:
+                config.replace({
+                    "opencv.upper_h": upper_h_value,
+                    "opencv.upper_s": upper_s_value,
+                    "opencv.upper_v": upper_v_value,
+                    "opencv.lower_h": lower_h_value,
+                    "opencv.lower_s": lower_s_value,
+                    "opencv.lower_v": lower_v_value,
+                    "opencv.collision-box-width": width,
+                    "opencv.collision-box-height": height,
+                    "opencv.collision-box-horizontal-offset": horizontal,
+                    "opencv.collision-box-vertical-offset": vertical
+                })
+            except conf.ConfigError as e:
+                print(f"Changes are not saved: {e}")
     
         def discard():
             """
             Discard changes
             """
 
-            upper_h.set(config.get_int("opencv.upper_h"))
-            upper_v.set(config.get_int("opencv.upper_v"))
-            upper_s.set(config.get_int("opencv.upper_s"))
-            lower_h.set(config.get_int("opencv.lower_h"))
-            lower_s.set(config.get_int("opencv.lower_s"))
-            lower_v.set(config.get_int("opencv.lower_v"))
+            upper_h.set(config.snapshot.opencv.upper_h)
+            upper_v.set(config.snapshot.opencv.upper_v)
+            upper_s.set(config.snapshot.opencv.upper_s)
+            lower_h.set(config.snapshot.opencv.lower_h)
+            lower_s.set(config.snapshot.opencv.lower_s)
+            lower_v.set(config.snapshot.opencv.lower_v)
             fill_collision_box_data()
     
         def quit_command():
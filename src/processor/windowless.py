@@ -1,43 +1,16 @@
+from . import config as conf
 from . import properties
 
-import numpy as np
-
 
 class Windowless(properties.Properties):
     """
     Retrieve properties in the case window is not enabled.
     """
 
-    def __init__(self, config) -> None:
-    
-        self.upper_hsv = np.array(
-            [
-                config.get_int("opencv.upper_h"), 
-                config.get_int("opencv.upper_s"), 
-                config.get_int("opencv.upper_v")
-            ], 
-            np.uint8
-        )
-        
-        self.lower_hsv = np.array(
-            [
-                config.get_int("opencv.lower_h"), 
-                config.get_int("opencv.lower_s"),
-                config.get_int("opencv.lower_v")
-            ],
-            np.uint8
-        )
-        
-        self.box_collision_width, \
-            self.box_collision_height, \
-            self.box_collision_horizontal, \
-            self.box_collision_vertical \
-            = \
-            config.get_int("opencv.collision-box-width"), \
-            config.get_int("opencv.collision-box-height"), \
-            config.get_int("opencv.collision-box-horizontal-offset"), \
-            config.get_int("opencv.collision-box-vertical-offset")
-        
+    def __init__(self, config: conf.ConfigUtil) -> None:
+
+        self.load(config.snapshot.opencv)
+
         print(
             f"""Properties:
 Upper HSV:\t{str(self.upper_hsv.tolist())}
@@ -46,4 +19,19 @@ Col width:\t{self.box_collision_width}
 Col height:\t{self.box_collision_height}
 Col horizontal:\t{self.box_collision_horizontal}
 Col vertical:\t{self.box_collision_vertical}"""
-        )
\ No newline at end of file
+        )
+
+    def load(self, opencv: conf.OpencvConfig) -> None:
+        """
+        Take the properties from the config, also called when the config is reloaded.
+        :param opencv: OpenCV section of the config
+        """
+
+        self.publish(
+            lower_hsv=(opencv.lower_h, opencv.lower_s, opencv.lower_v),
+            upper_hsv=(opencv.upper_h, opencv.upper_s, opencv.upper_v),
+            box_width=opencv.collision_box_width,
+            box_height=opencv.collision_box_height,
+            box_horizontal=opencv.collision_box_horizontal_offset,
+            box_vertical=opencv.collision_box_vertical_offset
+        )
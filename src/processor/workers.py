@@ -0,0 +1,738 @@
+"""Capture, recording and streaming in worker processes over a shared frame ring."""
+from typing import Callable, Tuple, Union
+
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+import numpy as np
+import cv2
+
+from . import capture as cap
+from . import config as conf
+from . import groundstation as gs
+from . import recorder as rec
+from . import sharedring
+
+# Workers start from a fresh interpreter, forking a process that runs threads and OpenCV is not safe.
+context = multiprocessing.get_context("spawn")
+
+
+# Main process of a worker, set by worker_init()
+parent_pid: int = 0
+
+
+def worker_init() -> None:
+    """
+    Called first in every worker process.
+    """
+
+    global parent_pid
+    parent_pid = os.getppid()
+
+    # Ctrl+C reaches the whole process group, the main process stops the workers in order.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def keep_running(stop) -> bool:
+    """
+    :param stop: Stop event of the worker
+    :return: Should the worker continue, False if stopped or the main process is gone
+    """
+    return not stop.is_set() and os.getppid() == parent_pid
+
+
+def wait_frame(ring: sharedring.SharedRing, wakeup, after: int, timeout: float) -> Union[int, None]:
+    """
+    Wait for a frame newer than the sequence.
+    :param ring: Frame ring
+    :param wakeup: Semaphore released by the capture for every frame
+    :param after: Last sequence read
+    :param timeout: Seconds to wait
+    :return: Latest sequence, None if timed out
+    """
+
+    deadline = time.monotonic() + timeout
+    while ring.latest() <= after:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not wakeup.acquire(True, remaining):
+            return None
+
+    # Only the latest sequence matters, forget the wakeups of the frames before it.
+    while wakeup.acquire(False):
+        pass
+    return ring.latest()
+
+
+def capture_main(settings: conf.Config, connection, lock, wakeups: Tuple, active, paused, failed, ready, stop) -> None:
+    """
+    Capture process. Reports the frame size, attaches to the ring the main process creates
+    and decodes the frames right into its slots.
+    :param settings: Config snapshot
+    :param connection: Pipe to the main process
+    :param lock: Lock of the ring, the ring is created after this process
+    :param wakeups: Semaphores of the readers, released for every frame
+    :param active: Event cleared in standby, frames are grabbed but not decoded
+    :param paused: Event set once the standby is seen, no frame is committed after it
+    :param failed: Event set if the capture is given up
+    :param ready: Event to set once the ring is attached
+    :param stop: Event to stop
+    """
+
+    worker_init()
+    capture = cap.open_capture(settings)
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if not capture.isOpened() or width <= 0 or height <= 0:
+        connection.send(None)
+        return
+
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    connection.send((width, height, fps))
+    ring = sharedring.SharedRing.attach(connection.recv(), lock)
+    ready.set()
+
+    grabber = cap.FrameGrabber(
+        capture,
+        settings.general.video_source == "file",
+        settings.general.pacing == "source"
+    )
+
+    try:
+        while keep_running(stop) and capture.isOpened() and not grabber.failed:
+
+            standby = not active.is_set()
+            if standby:
+                paused.set()
+
+            def wait(delay: float) -> bool:
+                # Resumed from standby, or stopped
+                return active.wait(delay) if standby else stop.wait(delay)
+
+            if not grabber.grab(standby, wait):
+                continue
+
+            sequence, image = ring.claim()
+            retrieved = grabber.retrieve(image, wait)
+            if retrieved is None or retrieved.shape != image.shape:
+                continue
+
+            ring.commit(sequence, grabber.timestamp)
+            for wakeup in wakeups:
+                wakeup.release()
+    finally:
+        if grabber.failed:
+            failed.set()
+        capture.release()
+        ring.close()
+
+
+def record_main(settings: conf.Config, directory: str, handle: Tuple, lock, wakeup, commands, idle, dropped, ready, stop) -> None:
+    """
+    Recording process. Records every frame of the ring while a recording is open,
+    frames that leave the ring before they are read are counted as dropped.
+    :param settings: Config snapshot
+    :param directory: Recording directory
+    :param handle: Ring handle
+    :param lock: Lock of the ring
+    :param wakeup: Semaphore released for every frame of the ring
+    :param commands: Queue of ("open", Sequence), ("trigger", Event, Timestamp) and ("close", Sequence).
+    The sequence is the latest frame when the command is sent, the recording starts or ends with it.
+    A recording opened in standby starts with the next frame, the sequence after the latest.
+    :param idle: Event set while no recording is open
+    :param dropped: Shared dropped frame counter of the open recording
+    :param ready: Event to set once the ring is attached
+    :param stop: Event to stop
+    """
+
+    worker_init()
+    ring = sharedring.SharedRing.attach(handle, lock)
+    height, width = ring.shape[:2]
+    frame = np.empty(ring.shape, np.uint8)
+
+    recorder: Union[rec.AsyncRecorder, None] = None
+    sequence = ring.latest()  # Last frame written or skipped
+    lost = 0
+    ready.set()
+
+    def write_until(last: int) -> None:
+        nonlocal sequence, lost
+
+        # Frames that are overwritten before this process could read them
+        oldest = ring.latest() - ring.slots + 1
+        if sequence < oldest - 1:
+            lost = lost + oldest - 1 - sequence
+            sequence = oldest - 1
+
+        while sequence < last:
+            sequence = sequence + 1
+            timestamp = ring.read(sequence, frame)
+            if timestamp is None:
+                lost = lost + 1
+            else:
+                recorder.write(frame, timestamp)
+
+        dropped.value = recorder.dropped + lost
+
+    try:
+        while keep_running(stop):
+
+            latest = wait_frame(ring, wakeup, sequence, 0.1)
+            if latest is not None and recorder is not None:
+                write_until(latest)
+            elif latest is not None:
+                sequence = latest
+
+            while True:
+                try:
+                    command = commands.get_nowait()
+                except queue.Empty:
+                    break
+
+                if command[0] == "open" and recorder is None:
+                    recorder = rec.open_recorder(settings.general, directory, (width, height))
+                    sequence = max(min(command[1], ring.latest() + 1), 0) - 1
+                    lost = 0
+                    idle.clear()
+                elif command[0] == "trigger" and recorder is not None:
+                    recorder.trigger(command[1], command[2])
+                elif command[0] == "close" and recorder is not None:
+                    write_until(min(command[1], ring.latest()))
+                    recorder.release()
+                    recorder = None
+                    idle.set()
+    finally:
+        if recorder is not None:
+            recorder.release()
+        idle.set()
+        ring.close()
+
+
+def stream_main(settings: conf.Config, handle: Tuple, lock, wakeup, skipped, ready, stop) -> None:
+    """
+    Ground station process. Submits the latest frame of the ring to the stream.
+    :param settings: Config snapshot
+    :param handle: Ring handle
+    :param lock: Lock of the ring
+    :param wakeup: Semaphore released by the capture for every frame
+    :param skipped: Shared skipped frame counter
+    :param ready: Event to set once the stream is started
+    :param stop: Event to stop
+    """
+
+    worker_init()
+    ring = sharedring.SharedRing.attach(handle, lock)
+    frame = np.empty(ring.shape, np.uint8)
+    groundstation = gs.Groundstation(
+        settings.groundstation.host,
+        settings.groundstation.query_port,
+        settings.groundstation.stream_port,
+        settings.groundstation.stream_quality,
+        settings.groundstation.mtu,
+        settings.groundstation.stream_bitrate * 1000,
+        settings.groundstation.stream_fps
+    )
+
+    sequence = ring.latest()
+    ready.set()
+    try:
+        while keep_running(stop):
+            latest = wait_frame(ring, wakeup, sequence, 0.1)
+            if latest is None:
+                continue
+
+            sequence = latest
+            if ring.read(sequence, frame) is not None:
+                groundstation.submit_frame(frame)
+            skipped.value = groundstation.skipped
+    finally:
+        groundstation.terminate()
+        ring.close()
+
+
+class Worker:
+    """
+    Child process that is started again when it dies, up to a limit,
+    so a crashing sink doesn't take the detection down with it.
+    """
+
+    name: str = "Worker"
+    target: Callable
+    process: Union[multiprocessing.process.BaseProcess, None] = None
+    stop_event = None
+    ready = None  # Set by the process once it is ready
+
+    restarts: int = 0      # Times started again after dying
+    max_restarts: int = 0
+
+    def __init__(self, max_restarts: int = 0) -> None:
+        """
+        :param max_restarts: Times to start again after dying
+        """
+        self.max_restarts = max_restarts
+
+    def arguments(self) -> tuple:
+        """
+        :return: Arguments of the target after the settings, created again for every start
+        """
+        return ()
+
+    def start(self) -> None:
+        """
+        Start the process.
+        """
+
+        self.stop_event = context.Event()
+        self.ready = context.Event()
+        self.process = context.Process(
+            target=self.target,
+            args=(*self.arguments(), self.ready, self.stop_event),
+            name=self.name,
+            daemon=True
+        )
+        self.process.start()
+
+    def wait_ready(self, timeout: float = 30.0) -> bool:
+        """
+        :param timeout: Seconds to wait
+        :return: Is the process ready
+        """
+
+        deadline = time.monotonic() + timeout
+        while not self.ready.wait(0.1):
+            if not self.alive or time.monotonic() > deadline:
+                return False
+        return True
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def check(self) -> None:
+        """
+        Start the process again if it died.
+        """
+
+        if self.process is None or self.stop_event.is_set() or self.process.is_alive():
+            return
+
+        print(f"{self.name} process exited with code {self.process.exitcode}.")
+        if self.restarts >= self.max_restarts:
+            print(f"{self.name} process is not started again, restart limit reached.")
+            self.process = None
+            return
+
+        self.restarts = self.restarts + 1
+        print(f"{self.name} process is starting again ({self.restarts}/{self.max_restarts}).")
+        self.start()
+        self.started()
+
+    def started(self) -> None:
+        """
+        Called after the process is started again.
+        """
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop the process, killed if it doesn't stop in time.
+        :param timeout: Seconds to wait
+        """
+
+        if self.process is None:
+            return
+
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            print(f"{self.name} process is not responding, terminating.")
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+
+
+class SharedCapture(Worker):
+    """
+    Drop-in replacement for CaptureThread when the capture runs in its own process.
+    The ring is created here once the capture reports the frame size.
+    Frames are copied out of the ring, so the processing can draw on them.
+    """
+
+    name = "Capture"
+    ring: Union[sharedring.SharedRing, None] = None
+    frame: cap.Frame
+    size: Tuple[int, int] = (0, 0)
+    fps: float = 0.0
+
+    dropped: int = 0  # Frames that are never handed to the processing
+
+    def __init__(self, settings: conf.Config, wakeups: Tuple) -> None:
+        """
+        :param settings: Config snapshot
+        :param wakeups: Semaphores released for every frame, the first one is for the processing
+        """
+
+        super().__init__()
+        self.target = capture_main
+        self.settings = settings
+        self.wakeups = wakeups
+        self.wakeup = wakeups[0]
+        self.active = context.Event()
+        self.active.set()
+        self.paused = context.Event()
+        self.lost = context.Event()
+        self.lock = context.Lock()
+        self.frame = cap.Frame()
+
+    def arguments(self) -> tuple:
+        self.connection, child = context.Pipe()
+        return self.settings, child, self.lock, self.wakeups, self.active, self.paused, self.lost
+
+    def start(self, timeout: float = 30.0) -> None:
+        """
+        Start the capture and create the ring.
+        :param timeout: Seconds to wait for the capture to open
+        """
+
+        super().start()
+        if not self.connection.poll(timeout):
+            print("Capture process did not respond.")
+            return
+
+        opened = self.connection.recv()
+        if opened is None:
+            print("Capture could not be opened.")
+            return
+
+        width, height, self.fps = opened
+        self.size = (width, height)
+        self.ring = sharedring.SharedRing((height, width, 3), self.settings.general.ring_slots, lock=self.lock)
+        self.connection.send(self.ring.handle())
+        self.frame.image = np.empty(self.ring.shape, np.uint8)
+        print(f"Frame ring: {self.ring.slots} slots, {self.ring.memory.size / (1024 * 1024):.1f} MB")
+
+    @property
+    def running(self) -> bool:
+        return self.ring is not None and self.alive
+
+    @property
+    def failed(self) -> bool:
+        """
+        :return: Is the capture given up by the capture process
+        """
+        return self.lost.is_set()
+
+    def standby(self, enabled: bool) -> None:
+        """
+        Keep the capture open and streaming without decoding the frames.
+        :param enabled: Standby or capture
+        """
+
+        if enabled:
+            # Wait for the frame being decoded, the latest sequence is final after it.
+            self.paused.clear()
+            self.active.clear()
+            if self.alive:
+                self.paused.wait(1.0)
+            return
+
+        # Frames from before the standby are never handed out.
+        if self.ring is not None:
+            self.frame.sequence = max(self.frame.sequence, self.ring.latest())
+        self.active.set()
+
+    @property
+    def captured(self) -> int:
+        return self.ring.latest() + 1 if self.ring is not None else 0
+
+    def read(self, timeout: Union[float, None] = None) -> Union[cap.Frame, None]:
+        """
+        Wait for a frame that is newer than the last one read.
+        The returned frame stays valid until the next call.
+        :param timeout: Seconds to wait, waits forever if None
+        :return: Latest frame or None if timed out or stopped
+        """
+
+        if self.ring is None:
+            return None
+
+        while True:
+            sequence = None
+            while sequence is None:
+                sequence = wait_frame(self.ring, self.wakeup, self.frame.sequence, 0.5 if timeout is None else timeout)
+                if sequence is None and (timeout is not None or not self.alive):
+                    return None
+
+            timestamp = self.ring.read(sequence, self.frame.image)
+            if timestamp is not None:
+                break
+
+        self.dropped = self.dropped + sequence - self.frame.sequence - 1
+        self.frame.sequence = sequence
+        self.frame.timestamp = timestamp
+        return self.frame
+
+
+class RecordSink(Worker):
+    """
+    Drop-in replacement for AsyncRecorder when the recording runs in its own process.
+    The process records the frames of a ring:
+    - annotated: write() copies the processed frames with the visualizations into a ring of their own,
+      the recording is the same as in the single process mode.
+    - Otherwise the capture ring and write() does nothing: the recording has every captured frame,
+      also the ones the processing skips, without any copy in the main process.
+    """
+
+    name = "Recorder"
+    commands = None
+    opened: bool = False
+    annotated: bool = False  # write() hands the frames over
+
+    def __init__(
+            self,
+            settings: conf.Config,
+            directory: str,
+            ring: sharedring.SharedRing,
+            wakeup,
+            max_restarts: int,
+            annotated: bool = False
+    ) -> None:
+        """
+        :param settings: Config snapshot
+        :param directory: Recording directory
+        :param ring: Frame ring to record
+        :param wakeup: Semaphore released for every frame of the ring
+        :param max_restarts: Times to start again after dying
+        :param annotated: The ring is written by write() instead of the capture
+        """
+
+        super().__init__(max_restarts)
+        self.target = record_main
+        self.settings = settings
+        self.directory = directory
+        self.ring = ring
+        self.wakeup = wakeup
+        self.annotated = annotated
+        self.idle = context.Event()
+        self.shared_dropped = context.Value("q", 0, lock=False)
+
+    def arguments(self) -> tuple:
+        # Fresh queue, the one of a dead process may be left locked.
+        self.commands = context.Queue()
+        self.idle.set()
+        return (
+            self.settings, self.directory, self.ring.handle(), self.ring.lock,
+            self.wakeup, self.commands, self.idle, self.shared_dropped
+        )
+
+    def started(self) -> None:
+        # Continue in a new file
+        if self.opened:
+            self.open(self.settings)
+
+    def open(self, settings: conf.Config, ahead: bool = False) -> None:
+        """
+        Start a recording from the current frame.
+        :param settings: Config snapshot
+        :param ahead: Opened in standby, start from the first frame after it instead
+        """
+
+        self.settings = settings
+        self.opened = True
+        self.idle.clear()
+        self.shared_dropped.value = 0
+        self.commands.put(("open", self.ring.latest() + 1 if ahead else self.ring.latest()))
+
+    @property
+    def dropped(self) -> int:
+        return self.shared_dropped.value
+
+    def write(self, frame: np.ndarray, timestamp: Union[float, None] = None) -> None:
+        """
+        Hand the processed frame over to the recorder process, if it records the annotated frames.
+        :param frame: Frame of the ring shape
+        :param timestamp: Capture timestamp of the frame
+        """
+
+        if not self.annotated or not self.opened:
+            return
+
+        sequence, image = self.ring.claim()
+        np.copyto(image, frame)
+        self.ring.commit(sequence, time.monotonic() if timestamp is None else timestamp)
+        self.wakeup.release()
+
+    def trigger(self, event: str, timestamp: Union[float, None] = None) -> None:
+        """
+        Notify the recorder about an event.
+        :param event: Event name
+        :param timestamp: Capture timestamp of the frame the event happened at
+        """
+
+        if self.opened:
+            self.commands.put(("trigger", event, time.monotonic() if timestamp is None else timestamp))
+
+    def release(self, wait: bool = True) -> None:
+        """
+        Close the recording, the process stays for the next one.
+        :param wait: Wait until the file is closed
+        """
+
+        if not self.opened:
+            return
+
+        self.opened = False
+        self.commands.put(("close", self.ring.latest()))
+        while wait and not self.idle.wait(0.5):
+            if not self.alive:
+                break
+
+
+class StreamSink(Worker):
+    """
+    Drop-in replacement for Groundstation when the stream runs in its own process.
+    The process reads the frames from the ring, so submit_frame() does nothing.
+    """
+
+    name = "Groundstation"
+
+    def __init__(self, settings: conf.Config, ring: sharedring.SharedRing, wakeup, max_restarts: int) -> None:
+        """
+        :param settings: Config snapshot
+        :param ring: Frame ring
+        :param wakeup: Semaphore released for every frame
+        :param max_restarts: Times to start again after dying
+        """
+
+        super().__init__(max_restarts)
+        self.target = stream_main
+        self.settings = settings
+        self.ring = ring
+        self.wakeup = wakeup
+        self.shared_skipped = context.Value("q", 0, lock=False)
+
+    def arguments(self) -> tuple:
+        return self.settings, self.ring.handle(), self.ring.lock, self.wakeup, self.shared_skipped
+
+    @property
+    def skipped(self) -> int:
+        return self.shared_skipped.value
+
+    def submit_frame(self, frame: np.ndarray) -> None:
+        pass
+
+    def terminate(self, timeout: float = 10.0) -> None:
+        self.stop(timeout)
+
+
+class Workers:
+    """
+    Runs the capture, the recording and the ground station stream in their own processes,
+    the main process keeps the detection, the bindings and the window.
+    Frames are handed over by slot index and sequence number in a shared ring, without pickling.
+    A sink that dies is started again by check(), the detection keeps running meanwhile.
+
+    Detection is not moved to a process of its own: the GPIO bindings and the Tk window have to stay
+    in the main process and act on every detection, so a detection process would only add a hop
+    for every binder command. With the decoding and the encoding moved out,
+    the main process is left with the detection.
+    """
+
+    capture: SharedCapture
+    recorder: Union[RecordSink, None] = None
+    stream: Union[StreamSink, None] = None
+    annotated: Union[sharedring.SharedRing, None] = None  # Processed frames for the recorder, see RecordSink
+
+    check_interval: float = 1.0
+    next_check: float = 0.0
+
+    def __init__(self, settings: conf.Config, record_dir: str) -> None:
+        """
+        :param settings: Config snapshot
+        :param record_dir: Recording directory
+        """
+
+        self.settings = settings
+        self.record_dir = record_dir
+
+        # Processing, recording and streaming wakeups
+        self.wakeups = tuple(context.Semaphore(0) for _ in range(3))
+        # The recorder of the visualizations is woken by the processing, not the capture.
+        self.annotate = settings.general.record and settings.general.visualize_processing
+        self.capture = SharedCapture(settings, (self.wakeups[0], self.wakeups[2]) if self.annotate else self.wakeups)
+
+    def start(self) -> SharedCapture:
+        """
+        Start the capture and the sinks.
+        :return: Capture to read the frames from
+        """
+
+        print("Starting the worker processes.")
+        self.capture.start()
+        if self.capture.ring is None:
+            return self.capture
+
+        restarts = self.settings.general.worker_restarts
+        if self.settings.general.record:
+            ring = self.capture.ring
+            if self.annotate:
+                self.annotated = sharedring.SharedRing(ring.shape, ring.slots)
+                ring = self.annotated
+            self.recorder = RecordSink(self.settings, self.record_dir, ring, self.wakeups[1], restarts, self.annotate)
+            self.recorder.start()
+
+        if self.settings.groundstation.enabled:
+            self.stream = StreamSink(self.settings, self.capture.ring, self.wakeups[2], restarts)
+            self.stream.start()
+
+        # Processing starts once the sinks can keep up, frames before that would be lost for them.
+        for worker in (self.recorder, self.stream):
+            if worker is not None and not worker.wait_ready():
+                print(f"{worker.name} process is not ready.")
+
+        return self.capture
+
+    def record(self, settings: conf.Config, ahead: bool = False) -> Union[RecordSink, None]:
+        """
+        Start a recording in the recorder process.
+        :param settings: Config snapshot
+        :param ahead: Start from the next frame, see RecordSink.open()
+        :return: Recorder
+        """
+
+        if self.recorder is None:
+            return None
+
+        self.recorder.open(settings, ahead)
+        return self.recorder
+
+    def check(self) -> None:
+        """
+        Start the dead sinks again. Called from the processing loop, checks once per interval.
+        """
+
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+
+        for worker in (self.recorder, self.stream):
+            if worker is not None:
+                worker.check()
+
+    def stop(self) -> None:
+        """
+        Stop the sinks, then the capture and release the rings.
+        """
+
+        for worker in (self.recorder, self.stream, self.capture):
+            if worker is not None:
+                worker.stop()
+
+        if self.capture.ring is not None:
+            self.capture.ring.close()
+            self.capture.ring = None
+        if self.annotated is not None:
+            self.annotated.close()
+            self.annotated = None
@@ -0,0 +1,4 @@
+"""
+Local stand-ins of the external systems, to run the processor without the real ones.
+Run from the src directory, e.g. "python -m standins.groundstation"
+"""
@@ -0,0 +1,180 @@
+"""
+Stand-in ground station. Accepts the query connection, prints the heartbeats,
+reassembles the stream and answers with receiver reports so the adaptive bitrate can be exercised.
+
+Example:
+    python -m standins.groundstation --query-port 1864 --stream-port 2023
+    python -m standins.groundstation --drop 0.1 --restart 20
+"""
+from typing import List, Union
+
+import argparse
+import asyncio
+import random
+import time
+
+from processor import protocol
+
+
+class StreamReceiver(asyncio.DatagramProtocol):
+    """
+    Reassembles the stream. Drops a share of the datagrams on purpose if asked to.
+    """
+
+    def __init__(self, drop: float) -> None:
+        """
+        :param drop: Share of the datagrams to drop, between 0 and 1
+        """
+
+        self.drop = drop
+        self.reassembler = protocol.Reassembler()
+        self.received = 0     # Frames since the last report
+        self.bytes = 0        # Payload bytes since the last report
+        self.latency = 0.0    # Moving average in seconds
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if self.drop > 0 and random.random() < self.drop:
+            return
+
+        frame = self.reassembler.feed(data)
+        if frame is None:
+            return
+
+        self.received = self.received + 1
+        self.bytes = self.bytes + len(frame.payload)
+        self.latency = 0.9 * self.latency + 0.1 * frame.latency
+
+
+class GroundStation:
+    """
+    TCP query server and UDP stream receiver.
+    """
+
+    writers: List[asyncio.StreamWriter]
+    receiver: StreamReceiver
+    server: Union[asyncio.AbstractServer, None] = None
+    transport: Union[asyncio.DatagramTransport, None] = None
+    last_lost: int = 0
+
+    def __init__(self, host: str, query_port: int, stream_port: int, drop: float, interval: float) -> None:
+        """
+        :param host: Address to listen on
+        :param query_port: TCP port, 0 for any free port
+        :param stream_port: UDP port, 0 for any free port
+        :param drop: Share of the stream datagrams to drop
+        :param interval: Seconds between the receiver reports
+        """
+
+        self.host = host
+        self.query_port = query_port
+        self.stream_port = stream_port
+        self.interval = interval
+        self.writers = []
+        self.receiver = StreamReceiver(drop)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Query connection of a processor.
+        """
+
+        print(f"Processor connected: {writer.get_extra_info('peername')}")
+        self.writers.append(writer)
+
+        try:
+            while True:
+                data = await reader.read(1024)
+                if data == b'':
+                    break
+                print(f"[{time.strftime('%H:%M:%S')}] {data.decode(errors='ignore')}")
+        except OSError:
+            pass
+        finally:
+            self.writers.remove(writer)
+            writer.close()
+            print("Processor disconnected.")
+
+    async def report(self) -> None:
+        """
+        Send "report <received> <lost>" to the processors periodically.
+        """
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            reassembler = self.receiver.reassembler
+            lost = reassembler.lost + reassembler.expired
+            received, lost, self.last_lost = self.receiver.received, lost - self.last_lost, lost
+            kbps = self.receiver.bytes * 8 / self.interval / 1000
+            self.receiver.received = 0
+            self.receiver.bytes = 0
+
+            print(f"Stream: {received} frames, {lost} lost, {kbps:.0f} kbps, latency {self.receiver.latency * 1000:.1f} ms")
+            for writer in self.writers:
+                writer.write(f"report {received} {lost}\n".encode())
+
+    async def start(self) -> None:
+        """
+        Start listening. The stream endpoint stays open across restarts of the query server.
+        """
+
+        if self.transport is None:
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: self.receiver,
+                local_addr=(self.host, self.stream_port)
+            )
+            self.stream_port = self.transport.get_extra_info("sockname")[1]
+
+        self.server = await asyncio.start_server(self.handle, self.host, self.query_port)
+        self.query_port = self.server.sockets[0].getsockname()[1]
+        print(f"Ground station is listening on {self.host}:{self.query_port} (query), {self.stream_port} (stream)")
+
+    async def stop(self) -> None:
+        """
+        Close the server and drop the processors, to test the reconnects.
+        """
+
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in list(self.writers):
+            writer.close()
+
+
+async def run(args: argparse.Namespace) -> None:
+    station = GroundStation(args.host, args.query_port, args.stream_port, args.drop, args.interval)
+    await station.start()
+    reports = asyncio.ensure_future(station.report())
+
+    try:
+        while True:
+            if args.restart <= 0:
+                await asyncio.Event().wait()
+
+            await asyncio.sleep(args.restart)
+            print("Restarting the query server.")
+            await station.stop()
+            await asyncio.sleep(args.downtime)
+            await station.start()
+    finally:
+        reports.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--query-port", type=int, default=1864)
+    parser.add_argument("--stream-port", type=int, default=2023)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between the receiver reports")
+    parser.add_argument("--drop", type=float, default=0.0, help="Share of the stream datagrams to drop")
+    parser.add_argument("--restart", type=float, default=0.0, help="Restart the query server every N seconds, 0 to never")
+    parser.add_argument("--downtime", type=float, default=3.0, help="Seconds the query server stays down on restart")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
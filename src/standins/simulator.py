@@ -0,0 +1,171 @@
+"""
+Stand-in simulator. Accepts the command connection and acknowledges every drop command
+after a simulated actuation delay, so the closed-loop drop latency can be measured without the real simulator.
+It can also leave the acks out like a simulator that doesn't send them, and restart to exercise the reconnects.
+
+With --bench, the processor's SimulatorLink is run against it in the same process
+and the latency histograms are printed.
+
+Example:
+    python -m standins.simulator --port 5710
+    python -m standins.simulator --delay 20 --restart 10
+    python -m standins.simulator --bench 1000 --rate 200
+"""
+from typing import List, Union
+
+import argparse
+import asyncio
+import time
+
+from processor import simulator
+
+
+class SimulatorServer:
+    """
+    TCP command server.
+    """
+
+    writers: List[asyncio.StreamWriter]
+    server: Union[asyncio.AbstractServer, None] = None
+    drops: int = 0
+
+    def __init__(self, host: str, port: int, delay: float, ack: bool, verbose: bool) -> None:
+        """
+        :param host: Address to listen on
+        :param port: TCP port, 0 for any free port
+        :param delay: Seconds from a command to its ack
+        :param ack: Acknowledge the commands
+        :param verbose: Print every command
+        """
+
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.ack = ack
+        self.verbose = verbose
+        self.writers = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Command connection of a processor.
+        """
+
+        print(f"Processor connected: {writer.get_extra_info('peername')}")
+        self.writers.append(writer)
+        loop = asyncio.get_running_loop()
+
+        try:
+            while True:
+                data = await reader.read(1024)
+                if data == b'':
+                    break
+
+                for _ in range(data.count(simulator.Command.DROP)):
+                    self.drops = self.drops + 1
+                    if self.verbose:
+                        print(f"[{time.strftime('%H:%M:%S')}] Drop #{self.drops}")
+                    # Same delay for every command, so the acks stay in order.
+                    if self.ack:
+                        loop.call_later(self.delay, self.send_ack, writer)
+        except OSError:
+            pass
+        finally:
+            self.writers.remove(writer)
+            writer.close()
+            print("Processor disconnected.")
+
+    @staticmethod
+    def send_ack(writer: asyncio.StreamWriter) -> None:
+        if not writer.is_closing():
+            writer.write(simulator.Command.ACK)
+
+    async def start(self) -> None:
+        """
+        Start listening.
+        """
+
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Simulator is listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        """
+        Close the server and drop the processors, to test the reconnects.
+        """
+
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in list(self.writers):
+            writer.close()
+
+
+async def bench(args: argparse.Namespace) -> None:
+    """
+    Send drop commands through SimulatorLink at a fixed rate and print the latencies.
+    """
+
+    link = simulator.SimulatorLink(args.host, args.port)
+    while not link.connected:
+        await asyncio.sleep(0.01)
+
+    interval = 1 / args.rate
+    deadline = time.monotonic()
+    for _ in range(args.bench):
+        link.send(simulator.Command.DROP)
+        deadline = deadline + interval
+        await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+
+    # Wait for the last acks
+    timeout = time.monotonic() + args.delay + 1.0
+    while link.acked + link.unacked < link.sent and time.monotonic() < timeout:
+        await asyncio.sleep(0.01)
+
+    link.terminate()
+    print(link.summary())
+    if link.acked > 0:
+        print("Closed loop latency:")
+        print(link.closed_loop.table())
+
+
+async def run(args: argparse.Namespace) -> None:
+    station = SimulatorServer(args.host, args.port, args.delay, not args.no_ack, args.bench <= 0)
+    await station.start()
+
+    if args.bench > 0:
+        await bench(args)
+        await station.stop()
+        while len(station.writers) > 0:
+            await asyncio.sleep(0.01)
+        return
+
+    while True:
+        if args.restart <= 0:
+            await asyncio.Event().wait()
+
+        await asyncio.sleep(args.restart)
+        print("Restarting the simulator.")
+        await station.stop()
+        await asyncio.sleep(args.downtime)
+        await station.start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5710)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds from a command to its ack")
+    parser.add_argument("--no-ack", action="store_true", help="Don't acknowledge the commands")
+    parser.add_argument("--restart", type=float, default=0.0, help="Restart the server every N seconds, 0 to never")
+    parser.add_argument("--downtime", type=float, default=3.0, help="Seconds the server stays down on restart")
+    parser.add_argument("--bench", type=int, default=0, help="Send this many commands through SimulatorLink and exit")
+    parser.add_argument("--rate", type=float, default=100.0, help="Commands per second of the benchmark")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
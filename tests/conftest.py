@@ -0,0 +1,77 @@
+"""Shared fixtures. The modules are imported from src, like when running from the src directory."""
+from typing import Callable
+
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+class LoopThread:
+    """
+    Asyncio event loop on a background thread, for the stand-ins.
+    """
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine, timeout: float = 5.0):
+        """
+        :param coroutine: Run on the loop
+        :param timeout: Seconds
+        :return: Result of the coroutine
+        """
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def close(self) -> None:
+        async def cancel() -> None:
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.run(cancel())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5.0)
+        self.loop.close()
+
+
+def wait_for(predicate: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """
+    :param predicate: Polled until true
+    :param timeout: Seconds
+    :return: Last result of the predicate
+    """
+
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return predicate()
+        time.sleep(0.01)
+    return True
+
+
+def free_port() -> int:
+    """
+    :return: TCP port nothing listens on
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def loop_thread():
+    loop_thread = LoopThread()
+    yield loop_thread
+    loop_thread.close()
@@ -0,0 +1,96 @@
+"""Batch detection over recordings, in this process instead of the pool."""
+import cv2
+import numpy as np
+import pytest
+
+from batch import detect
+from processor import config as conf
+
+FPS = 10.0
+RED = {
+    "lower_hsv": (0, 100, 100),
+    "upper_hsv": (10, 255, 255),
+    "box_width": 100,
+    "box_height": 100,
+    "box_horizontal": 0,
+    "box_vertical": 0
+}
+
+
+@pytest.fixture
+def video(tmp_path) -> str:
+    """
+    40 frames of a red square moving right, missing from every fifth frame.
+    """
+
+    path = str(tmp_path / "target.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (160, 120))
+    for index in range(40):
+        frame = np.zeros((120, 160, 3), np.uint8)
+        if index % 5 != 0:
+            x = 10 + index * 3
+            frame[50:70, x:x + 20] = (0, 0, 255)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def worker(tmp_path):
+    settings = conf.ConfigUtil(str(tmp_path / "configuration.ini")).snapshot
+    detect.init_worker(settings, RED)
+    yield
+    cv2.setNumThreads(-1)
+
+
+def test_find_videos(tmp_path):
+    (tmp_path / "nested").mkdir()
+    for name in ("a.mp4", "b.AVI", "notes.txt", "nested/c.mkv"):
+        (tmp_path / name).write_bytes(b"")
+
+    assert detect.find_videos([str(tmp_path)]) == [str(tmp_path / "a.mp4"), str(tmp_path / "b.AVI")]
+    assert detect.find_videos([str(tmp_path)], recursive=True)[-1] == str(tmp_path / "nested" / "c.mkv")
+
+    # Explicit files are taken whatever the extension, duplicates only once.
+    found = detect.find_videos([str(tmp_path / "notes.txt"), str(tmp_path / "*.mp4"), str(tmp_path / "a.mp4")])
+    assert found == [str(tmp_path / "notes.txt"), str(tmp_path / "a.mp4")]
+
+    assert detect.find_videos([str(tmp_path / "missing.mp4")]) == []
+
+
+def test_split():
+    assert detect.split(250, 100) == [(0, 100), (100, 200), (200, None)]
+    assert detect.split(200, 100) == [(0, 100), (100, None)]
+    # Too short or the frame count is unknown
+    assert detect.split(80, 100) == [(0, None)]
+    assert detect.split(0, 100) == [(0, None)]
+
+
+def test_chunks_match_the_whole_video(video, worker):
+    assert detect.probe(video) == (40, FPS)
+
+    _, start, whole, _ = detect.process_chunk(video, 0, None, FPS)
+    assert start == 0
+    assert len(whole) == 40
+    assert [index for index, row in enumerate(whole) if row is None] == list(range(0, 40, 5))
+    assert whole[1][0] == pytest.approx(10 + 3 + 9.5, abs=1.0)
+
+    rows = []
+    for chunk_start, chunk_end in detect.split(40, 15):
+        _, start, chunk, _ = detect.process_chunk(video, chunk_start, chunk_end, FPS)
+        assert start == chunk_start
+        rows.extend(chunk)
+
+    assert rows == whole
+
+
+def test_write_rows(tmp_path):
+    path = tmp_path / "rows.csv"
+
+    detect.write_rows(str(path), [None, (12.5, 30.0, 400)], 4.0)
+
+    assert path.read_text().splitlines() == [
+        "frame,time,detected,x,y,area",
+        "0,0.000,0,,,",
+        "1,0.250,1,12.5,30.0,400"
+    ]
@@ -0,0 +1,142 @@
+"""Raspberry binding on the gpiozero mock pins."""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("gpiozero")
+
+from conftest import wait_for
+from processor import binder
+
+# Servo duty cycles of gpiozero.Servo with the default 1-2 ms pulses in a 20 ms frame
+SERVO_MAX = 0.1
+SERVO_MIN = 0.05
+
+
+@pytest.fixture
+def raspberry():
+    raspberry = binder.Raspberry("mock")
+    yield raspberry
+    raspberry.close()
+
+
+def test_mock_power_is_held_on(raspberry):
+    assert raspberry.power()
+    assert raspberry.wait_for_power(0)
+    # Not an edge, the arming time is taken when the loop sees it.
+    assert raspberry.power_time is None
+
+
+def test_button_edges(raspberry):
+    pin = raspberry.button.pin
+
+    pin.drive_high()
+    assert not raspberry.power()
+    assert not raspberry.wait_for_power(0.05)
+
+    woken = []
+
+    def wait() -> None:
+        if raspberry.wait_for_power(5.0):
+            woken.append(time.monotonic())
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.1)
+
+    before = time.monotonic()
+    pin.drive_low()
+    after = time.monotonic()
+    waiter.join(5.0)
+
+    assert raspberry.power()
+    assert before <= raspberry.power_time <= after
+    # Woken by the edge, not by polling.
+    assert len(woken) == 1 and woken[0] - raspberry.power_time < 0.05
+
+    pin.drive_high()
+    assert not raspberry.power()
+    # The press time stays until the next press.
+    assert before <= raspberry.power_time <= after
+
+
+def test_door_sequence(raspberry):
+    servo_pin = raspberry.servo.pwm_device.pin
+    led_pin = raspberry.led.pin
+    servo_pin.clear_states()
+    led_pin.clear_states()
+
+    raspberry.open_package_door()
+    assert wait_for(lambda: raspberry.door_closed is not None, 3.0)
+
+    servo_pin.assert_states_and_times([(0.0, SERVO_MAX), (0.0, SERVO_MIN), (1.2, SERVO_MAX)])
+    led_pin.assert_states_and_times([(0.0, 1.0), (0.3, 0.0), (0.3, 1.0), (0.3, 0.0), (0.3, 1.0)])
+    assert raspberry.door_closed - raspberry.door_opened == pytest.approx(1.2, abs=0.05)
+
+
+def test_door_latency(raspberry):
+    frame_time = time.monotonic() - 0.05
+    raspberry.open_package_door(frame_time)
+    assert wait_for(lambda: raspberry.door_count == 1)
+
+    assert raspberry.door_opened - frame_time == raspberry.door_latency
+    assert 0.05 <= raspberry.door_latency < 0.1
+    assert raspberry.door_latency_max == raspberry.door_latency
+    assert "opened 1 times" in raspberry.door_summary()
+
+
+def test_door_command_does_not_block(raspberry):
+    start = time.monotonic()
+    raspberry.open_package_door()
+    assert time.monotonic() - start < 0.01
+
+
+def test_actuator_timing():
+    actuator = binder.Actuator()
+    times = []
+
+    def step() -> None:
+        times.append(time.monotonic())
+
+    try:
+        start = time.monotonic()
+        actuator.submit([(0.0, step), (0.1, step), (0.2, step)])
+        # Starts after the first sequence is done.
+        actuator.submit([(0.0, step), (0.1, step)])
+        assert wait_for(lambda: len(times) == 5)
+    finally:
+        actuator.close()
+
+    offsets = [t - start for t in times]
+    assert offsets == pytest.approx([0.0, 0.1, 0.2, 0.2, 0.3], abs=0.03)
+
+
+def test_actuator_close_skips_the_delays():
+    actuator = binder.Actuator()
+    times = []
+
+    def fail() -> None:
+        raise RuntimeError("Servo failed")
+
+    actuator.submit([(0.0, fail), (0.0, lambda: times.append(time.monotonic())), (5.0, lambda: times.append(time.monotonic()))])
+    actuator.submit([(0.0, lambda: times.append(-1.0))])
+    assert wait_for(lambda: len(times) == 1)
+
+    start = time.monotonic()
+    actuator.close()
+
+    # A failed step doesn't stop the sequence, the running one finishes at once and the queued one is dropped.
+    assert time.monotonic() - start < 0.5
+    assert len(times) == 2 and times[1] >= 0
+    assert not actuator.thread.is_alive()
+
+
+def test_close_releases_the_devices(raspberry):
+    raspberry.close()
+    assert raspberry.button.closed
+    assert raspberry.led.closed
+    assert raspberry.servo.closed
+
+    # Again from the fixture
+    raspberry.close()
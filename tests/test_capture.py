@@ -0,0 +1,154 @@
+"""Capture thread: latest-only ring and failures."""
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import wait_for
+from processor import capture as cap
+
+FRAMES = 10
+
+
+@pytest.fixture
+def video(tmp_path) -> str:
+    """
+    Short video where the brightness of a frame is 20 times its index.
+    """
+
+    path = str(tmp_path / "numbered.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (64, 48))
+    for index in range(FRAMES):
+        writer.write(np.full((48, 64, 3), index * 20, np.uint8))
+    writer.release()
+    return path
+
+
+def frame_index(frame: cap.Frame) -> int:
+    return int(round(frame.image.mean() / 20))
+
+
+class FailingCapture:
+    """
+    Capture that is open but never delivers a frame, like an unplugged camera.
+    """
+
+    def __init__(self) -> None:
+        self.grabs = 0
+
+    def isOpened(self) -> bool:
+        return True
+
+    def get(self, prop: int) -> float:
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        return False
+
+    def grab(self) -> bool:
+        self.grabs = self.grabs + 1
+        return False
+
+
+def test_only_the_latest_frame_is_handed_out(video):
+    capture = cv2.VideoCapture(video)
+    capture_thread = cap.CaptureThread(capture, 3, True, False)
+    capture_thread.start()
+    try:
+        first = capture_thread.read(1.0)
+        assert first is not None
+        sequence = first.sequence
+        assert frame_index(first) == sequence % FRAMES
+
+        # The capture runs on into the other slots, the frame being read is never overwritten.
+        assert wait_for(lambda: capture_thread.captured > sequence + 3 * FRAMES)
+        assert first.sequence == sequence
+        assert frame_index(first) == sequence % FRAMES
+
+        # Next read skips to the freshest frame, the ones in between are dropped.
+        second = capture_thread.read(1.0)
+        assert second.sequence > sequence + 1
+        assert frame_index(second) == second.sequence % FRAMES
+        assert capture_thread.dropped == second.sequence - 1
+        assert capture_thread.dropped < capture_thread.captured
+
+        # Nothing is handed out twice. The slot of a frame is reused after the next read.
+        previous = second.sequence
+        latest = capture_thread.read(1.0)
+        assert latest.sequence > previous
+    finally:
+        capture_thread.stop()
+        capture.release()
+
+    # Rewinding at the end of the file is not a failure.
+    assert not capture_thread.failed
+
+
+def test_resume_from_standby_grabs_at_once(tmp_path):
+    path = str(tmp_path / "slow.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 2.0, (64, 48))
+    for _ in range(4):
+        writer.write(np.zeros((48, 64, 3), np.uint8))
+    writer.release()
+
+    capture = cv2.VideoCapture(path)
+    capture_thread = cap.CaptureThread(capture, 3, True, True)
+    capture_thread.start()
+    try:
+        for _ in range(3):
+            assert capture_thread.read(1.0) is not None
+
+            # Resumed while waiting for the next frame of the 2 FPS source in standby
+            capture_thread.standby(True)
+            time.sleep(0.1)
+            start = time.monotonic()
+            capture_thread.standby(False)
+
+            assert capture_thread.read(1.0) is not None
+            assert time.monotonic() - start < 0.1
+    finally:
+        capture_thread.stop()
+        capture.release()
+
+
+def fast_capture_thread(capture: FailingCapture) -> cap.CaptureThread:
+    """
+    Gives up quickly so the test doesn't wait for the real limits.
+    """
+
+    capture_thread = cap.CaptureThread(capture, 3)
+    capture_thread.grabber.min_backoff = 0.02
+    capture_thread.grabber.max_failures = 5
+    return capture_thread
+
+
+def test_failing_capture_backs_off_and_gives_up():
+    capture = FailingCapture()
+    capture_thread = fast_capture_thread(capture)
+
+    start = time.monotonic()
+    capture_thread.start()
+    assert wait_for(lambda: capture_thread.failed)
+    elapsed = time.monotonic() - start
+
+    # 0.02 + 0.04 + 0.08 + 0.16 seconds between the five grabs
+    assert capture.grabs == 5
+    assert elapsed >= 0.3
+    assert not capture_thread.running
+    assert capture_thread.read(1.0) is None
+    capture_thread.stop()
+
+
+def test_stop_interrupts_the_backoff():
+    capture = FailingCapture()
+    capture_thread = fast_capture_thread(capture)
+    capture_thread.grabber.min_backoff = 10.0
+
+    capture_thread.start()
+    assert wait_for(lambda: capture.grabs == 1)
+    start = time.monotonic()
+    capture_thread.stop()
+
+    assert time.monotonic() - start < 1.0
+    assert not capture_thread.failed
@@ -0,0 +1,187 @@
+"""Config file handling."""
+import os
+import pickle
+
+import pytest
+
+from conftest import wait_for
+from processor import config as conf
+
+
+def write_config(path, text: str) -> None:
+    """
+    Write the file with a newer modification time, so a reload sees it even within the clock resolution.
+    """
+
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else 0
+    path.write_text(text)
+    os.utime(path, (mtime + 1, mtime + 1))
+
+
+def test_snapshot_is_typed_and_immutable(tmp_path):
+    path = tmp_path / "configuration.ini"
+    path.write_text("[OPENCV]\nlower_h = 12\ntracking = yes\nfill-weight = 0.5\ndetector = Components\n")
+
+    config = conf.ConfigUtil(str(path))
+    snapshot = config.snapshot
+
+    assert snapshot.opencv.lower_h == 12
+    assert snapshot.opencv.tracking is True
+    assert snapshot.opencv.fill_weight == 0.5
+    assert snapshot.opencv.detector == "components"
+    assert snapshot.get("opencv.lower_h") == 12
+    assert config.get_int("opencv.lower_h") == 12
+    assert config.get_string("simulator.host") == "127.0.0.1"
+
+    with pytest.raises(AttributeError):
+        snapshot.opencv.lower_h = 20
+    with pytest.raises(AttributeError):
+        snapshot.version = 2
+
+    # Passed to the worker processes
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+
+
+def test_invalid_values_are_errors_not_zeros(tmp_path):
+    path = tmp_path / "configuration.ini"
+    path.write_text(
+        "[GENERAL]\n"
+        "camera-index = one\n"
+        "record = maybe\n"
+        "record-policy = sometimes\n"
+        "[OPENCV]\n"
+        "lower_h = 200\n"
+    )
+    content = path.read_text()
+
+    with pytest.raises(conf.ConfigError) as error:
+        conf.ConfigUtil(str(path))
+
+    # Every invalid value is listed.
+    message = str(error.value)
+    assert "general.camera-index: expected an integer, got 'one'" in message
+    assert "general.record: expected true or false, got 'maybe'" in message
+    assert "general.record-policy: expected one of block, drop-oldest, drop-newest, got 'sometimes'" in message
+    assert "opencv.lower_h: 200 is out of range [0, 180]" in message
+    # The file is left alone.
+    assert path.read_text() == content
+
+
+def test_replace_is_validated_and_all_or_nothing(tmp_path):
+    config = conf.ConfigUtil(str(tmp_path / "configuration.ini"))
+    snapshot = config.snapshot
+    notified = []
+    config.listeners.append(notified.append)
+
+    replaced = config.replace({"opencv.lower_h": "20", "simulator.port": 6000})
+    assert config.snapshot is replaced
+    assert (replaced.opencv.lower_h, replaced.simulator.port) == (20, 6000)
+    assert replaced.version == snapshot.version + 1
+    assert notified == [replaced]
+    # The old snapshot is not changed.
+    assert snapshot.opencv.lower_h != 20
+
+    for changes in ({"opencv.lower_h": 30, "simulator.port": 0},
+                    {"opencv.lower_h": 30, "opencv.unknown": 1},
+                    {"unknown.key": 1}):
+        with pytest.raises(conf.ConfigError):
+            config.replace(changes)
+        assert config.snapshot is replaced
+    assert "lower_h = 20" in (tmp_path / "configuration.ini").read_text()
+
+    # Same values: nothing is written and nobody is notified.
+    assert config.replace({"opencv.lower_h": 20}) == replaced
+    assert len(notified) == 1
+
+
+def test_complete_file_is_not_written_at_startup(tmp_path):
+    path = tmp_path / "configuration.ini"
+    conf.ConfigUtil(str(path))
+    os.utime(path, (1000, 1000))
+
+    conf.ConfigUtil(str(path))
+
+    assert os.stat(path).st_mtime == 1000
+    assert not (tmp_path / "configuration.ini.tmp").exists()
+
+
+def test_reload_swaps_the_snapshot_and_ignores_invalid_files(tmp_path, capsys):
+    path = tmp_path / "configuration.ini"
+    config = conf.ConfigUtil(str(path))
+    snapshot = config.snapshot
+    notified = []
+    config.listeners.append(notified.append)
+
+    # Not modified
+    config.reload()
+    assert config.snapshot is snapshot
+
+    write_config(path, path.read_text().replace("lower_h = 0", "lower_h = 15"))
+    config.reload()
+    assert config.snapshot.opencv.lower_h == 15
+    assert config.snapshot.version == snapshot.version + 1
+    assert notified == [config.snapshot]
+    reloaded = config.snapshot
+
+    write_config(path, path.read_text().replace("lower_h = 15", "lower_h = high"))
+    config.reload()
+    assert config.snapshot is reloaded
+    assert len(notified) == 1
+    output = capsys.readouterr().out
+    assert "Config is not reloaded, keeping the current values:\nopencv.lower_h: expected an integer" in output
+
+    # Only the comments changed
+    write_config(path, "; Comment\n" + path.read_text().replace("lower_h = high", "lower_h = 15"))
+    config.reload()
+    assert config.snapshot is reloaded
+    assert len(notified) == 1
+
+
+def test_watch_calls_the_listener_on_the_scheduler(tmp_path):
+    path = tmp_path / "configuration.ini"
+    config = conf.ConfigUtil(str(path))
+    notified = []
+    try:
+        config.watch(notified.append, 0.02)
+
+        write_config(path, path.read_text().replace("port = 5710", "port = 5711"))
+        assert wait_for(lambda: len(notified) == 1)
+        assert notified[0].simulator.port == 5711
+    finally:
+        config.unwatch()
+
+    assert config.watch_job is None
+    write_config(path, path.read_text().replace("port = 5711", "port = 5712"))
+    config.reload()
+    assert len(notified) == 1
+
+
+def test_comments_survive_saves(tmp_path):
+    path = tmp_path / "configuration.ini"
+    path.write_text(
+        "; Written by hand\n"
+        "[GENERAL]\n"
+        "record = False\n"
+        "\n"
+        "[OPENCV]\n"
+        "; contours, or components\n"
+        "detector = contours\n"
+        "# Hue\n"
+        "lower_h=10\n"
+    )
+
+    # The missing defaults are written.
+    config = conf.ConfigUtil(str(path))
+    content = path.read_text()
+    assert "telemetry = False" in content
+    assert content.index("; Written by hand") < content.index("[GENERAL]")
+    assert "; contours, or components\ndetector = contours\n" in content
+    assert "# Hue\nlower_h = 10\n" in content
+
+    config.replace({"opencv.lower_h": 20})
+    content = path.read_text()
+    assert "# Hue\nlower_h = 20\n" in content
+    assert content.count("; contours, or components") == 1
+
+    # Nothing changed, nothing written
+    assert not config.save()
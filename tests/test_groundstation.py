@@ -0,0 +1,162 @@
+"""Ground station connection against the stand-in ground station."""
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import free_port, wait_for
+from processor import connection as conn
+from processor import groundstation as gs
+from processor import protocol
+from standins import groundstation as standin
+
+HOST = "127.0.0.1"
+
+
+class FastGroundstation(gs.Groundstation):
+    """
+    Short backoff so the reconnects happen within the test.
+    """
+
+    min_backoff = 0.05
+    max_backoff = 0.2
+    backoff = 0.05
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.fixture
+def station(loop_thread):
+    station = standin.GroundStation(HOST, 0, 0, 0.0, 1.0)
+    loop_thread.run(station.start())
+    yield station
+    loop_thread.run(station.stop())
+    station.transport.close()
+
+
+def test_connect(station):
+    link = FastGroundstation(HOST, station.query_port, station.stream_port)
+    try:
+        assert wait_for(lambda: link.status()["state"] == conn.ConnectionState.CONNECTED)
+        assert link.connected
+        assert link.status()["connections"] == 1
+        assert link.status()["failures"] == 0
+    finally:
+        link.terminate()
+
+    assert link.status()["state"] == conn.ConnectionState.CLOSED
+
+
+def test_reconnect_with_backoff(station, loop_thread):
+    port = free_port()
+    link = FastGroundstation(HOST, port, station.stream_port)
+    try:
+        # Nothing listens yet, the delay doubles up to the maximum.
+        assert wait_for(lambda: link.failures >= 3)
+        assert link.state in (conn.ConnectionState.CONNECTING, conn.ConnectionState.BACKOFF)
+        assert link.backoff == pytest.approx(link.max_backoff)
+        assert not link.connected
+
+        # Comes up, the backoff is reset.
+        restarted = standin.GroundStation(HOST, port, 0, 0.0, 1.0)
+        loop_thread.run(restarted.start())
+        assert wait_for(lambda: link.state == conn.ConnectionState.CONNECTED and len(restarted.writers) == 1, 2.0)
+        assert link.connections == 1
+        assert link.failures == 0
+        assert link.backoff == link.min_backoff
+
+        # Goes down and back up on the same port.
+        loop_thread.run(restarted.stop())
+        assert wait_for(lambda: link.state != conn.ConnectionState.CONNECTED)
+        loop_thread.run(restarted.start())
+        assert wait_for(lambda: link.connections == 2 and len(restarted.writers) == 1)
+        assert link.state == conn.ConnectionState.CONNECTED
+
+        loop_thread.run(restarted.stop())
+        restarted.transport.close()
+    finally:
+        link.terminate()
+
+
+def test_line_split_across_packets(station, loop_thread):
+    link = FastGroundstation(HOST, station.query_port, station.stream_port)
+    try:
+        assert wait_for(lambda: len(station.writers) == 1)
+        writer = station.writers[0]
+
+        # A line only counts once it is complete.
+        loop_thread.loop.call_soon_threadsafe(writer.write, b"bitrate 12")
+        time.sleep(0.1)
+        assert link.streamer.target_bitrate != 123456
+        loop_thread.loop.call_soon_threadsafe(writer.write, b"3456\nreport 10 ")
+        assert wait_for(lambda: link.streamer.target_bitrate == 123456)
+        time.sleep(0.1)
+        assert not link.streamer.congested
+
+        loop_thread.loop.call_soon_threadsafe(writer.write, b"5\n")
+        assert wait_for(lambda: link.streamer.congested)
+    finally:
+        link.terminate()
+
+
+def test_submit_frame_reassembles(station):
+    frames = []
+    datagrams = []
+    feed = station.receiver.reassembler.feed
+
+    def record(datagram, now=None):
+        datagrams.append(datagram)
+        frame = feed(datagram, now)
+        if frame is not None:
+            frames.append(frame)
+        return frame
+
+    station.receiver.reassembler.feed = record
+
+    link = FastGroundstation(HOST, station.query_port, station.stream_port, quality=90, mtu=576)
+    try:
+        assert wait_for(lambda: link.connected)
+
+        image = np.random.default_rng(0).integers(0, 256, (120, 160, 3), np.uint8)
+        link.submit_frame(image)
+        assert wait_for(lambda: len(frames) == 1)
+    finally:
+        link.terminate()
+
+    frame = frames[0]
+    assert frame.codec == protocol.Codec.JPEG
+    assert len(datagrams) > 1
+    assert all(len(datagram) <= 576 - protocol.UDP_OVERHEAD for datagram in datagrams)
+
+    decoded = cv2.imdecode(np.frombuffer(frame.payload, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == image.shape
+    assert link.status()["sent_frames"] == 1
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="Needs /proc to count the sockets")
+def test_terminate_leaves_nothing_behind(station):
+    threads = set(threading.enumerate())
+    fds = open_fds()
+
+    link = FastGroundstation(HOST, station.query_port, station.stream_port)
+    assert wait_for(lambda: link.connected and len(station.writers) == 1)
+    assert open_fds() > fds
+
+    link.terminate()
+    assert wait_for(lambda: len(station.writers) == 0)
+
+    assert not link.thread.is_alive()
+    assert not link.streamer.thread.is_alive()
+    assert link.loop.is_closed()
+    assert link.udp_transport.is_closing()
+    assert link.writer is None
+    assert set(threading.enumerate()) == threads
+    assert wait_for(lambda: open_fds() == fds)
+
+    # Terminating again does nothing.
+    link.terminate()
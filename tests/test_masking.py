@@ -0,0 +1,55 @@
+"""Color masks."""
+import cv2
+import numpy as np
+
+from processor import masking
+
+
+def hsv_image(hues) -> np.ndarray:
+    """
+    :param hues: Hue of every pixel, saturation and value are 200
+    :return: One row HSV image
+    """
+
+    image = np.full((1, len(hues), 3), 200, np.uint8)
+    image[0, :, 0] = hues
+    return image
+
+
+def test_hue_range():
+    image = hsv_image([0, 9, 10, 50, 51, 179])
+
+    mask = masking.in_hsv_range(image, np.array([10, 100, 100], np.uint8), np.array([50, 255, 255], np.uint8))
+
+    assert mask[0].tolist() == [0, 0, 255, 255, 0, 0]
+
+
+def test_hue_range_wraps_past_180():
+    image = hsv_image([0, 5, 6, 100, 169, 170, 179])
+    lower = np.array([170, 100, 100], np.uint8)
+    upper = np.array([5, 255, 255], np.uint8)
+
+    mask = masking.in_hsv_range(image, lower, upper)
+    assert mask[0].tolist() == [255, 255, 0, 0, 0, 255, 255]
+
+    # Saturation still applies on both sides of the wrap.
+    image[0, :, 1] = 50
+    assert not masking.in_hsv_range(image, lower, upper).any()
+
+
+def test_buffers_are_reused():
+    frame = np.zeros((4, 6, 3), np.uint8)
+    frame[:, :3] = (0, 0, 255)  # Red, hue 0
+    frame[:, 3:] = (255, 0, 0)  # Blue, hue 120
+    lower = np.array([170, 100, 100], np.uint8)
+    upper = np.array([5, 255, 255], np.uint8)
+    hsv = np.empty((4, 6, 3), np.uint8)
+    dst = np.empty((4, 6), np.uint8)
+    scratch = np.empty((4, 6), np.uint8)
+
+    mask = masking.hsv_mask(frame, lower, upper, hsv, dst, scratch)
+
+    assert mask is dst
+    assert np.array_equal(hsv, cv2.cvtColor(frame, cv2.COLOR_BGR2HSV))
+    assert (mask[:, :3] == 255).all()
+    assert (mask[:, 3:] == 0).all()
@@ -0,0 +1,101 @@
+"""Frame deadlines, load shedding and paced file replay."""
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from processor import capture as cap
+from processor import pacing
+
+FPS = 20.0
+PERIOD = 1 / FPS
+
+
+def finish(pacer: pacing.FramePacer, slack: float) -> float:
+    """
+    End a frame with about the given slack.
+    :return: Measured slack
+    """
+    return pacer.end_frame(time.monotonic() - PERIOD + slack)
+
+
+def test_missed_deadlines_shed_in_order_and_spare_frames_restore(capsys):
+    pacer = pacing.FramePacer(FPS, recover_frames=3)
+    assert all(pacer.runs(work) for work in pacing.FramePacer.SHED_ORDER)
+
+    assert finish(pacer, -0.01) < 0
+    assert not pacer.runs("overlay")
+    assert pacer.runs("preview") and pacer.runs("stream")
+    assert "missed its deadline by" in capsys.readouterr().out
+
+    for _ in range(5):
+        finish(pacer, -0.01)
+    assert pacer.shed == 3
+    assert not any(pacer.runs(work) for work in pacing.FramePacer.SHED_ORDER)
+    assert pacer.missed == 6
+
+    # Slack within the headroom doesn't count towards restoring.
+    for _ in range(2):
+        finish(pacer, PERIOD)
+    finish(pacer, 0.1 * PERIOD)
+    for _ in range(2):
+        finish(pacer, PERIOD)
+    assert pacer.shed == 3
+
+    # Restored in the reverse order, one per recover_frames spare frames
+    finish(pacer, PERIOD)
+    assert pacer.shed == 2
+    assert pacer.runs("stream") and not pacer.runs("preview")
+    assert "restoring stream" in capsys.readouterr().out
+    for _ in range(6):
+        finish(pacer, PERIOD)
+    assert pacer.shed == 0
+
+    assert pacer.frames == 18
+    assert pacer.min_slack == pytest.approx(-0.01, abs=0.005)
+    assert pacer.summary().startswith("Pacing: 20.0 FPS target, 6/18 frames missed the deadline, min slack")
+
+
+def test_unthrottled_has_no_deadlines():
+    pacer = pacing.FramePacer(FPS, unthrottled=True)
+
+    assert finish(pacer, -1.0) == 0.0
+    assert pacer.shed == 0
+    assert pacer.frames == 0
+    assert pacer.summary() == "Pacing: unthrottled"
+
+
+def test_unknown_frame_rate_is_30():
+    pacer = pacing.FramePacer(0)
+    assert pacer.period == pytest.approx(1 / 30)
+
+
+@pytest.fixture
+def video(tmp_path) -> str:
+    path = str(tmp_path / "paced.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48))
+    for _ in range(10):
+        writer.write(np.zeros((48, 64, 3), np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.mark.parametrize("pace", [True, False])
+def test_file_replay_at_the_source_rate_or_unthrottled(video, pace):
+    capture = cv2.VideoCapture(video)
+    capture_thread = cap.CaptureThread(capture, 3, True, pace)
+    capture_thread.start()
+    try:
+        assert capture_thread.read(1.0) is not None
+        start, captured = time.monotonic(), capture_thread.captured
+        time.sleep(0.5)
+        rate = (capture_thread.captured - captured) / (time.monotonic() - start)
+    finally:
+        capture_thread.stop()
+        capture.release()
+
+    if pace:
+        assert rate == pytest.approx(FPS, rel=0.2)
+    else:
+        assert rate > 3 * FPS
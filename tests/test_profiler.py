@@ -0,0 +1,73 @@
+"""Stage timers and the frame budget."""
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+from processor import capture as cap
+from processor import config as conf
+from processor import pacing
+from processor import pipeline as pipe
+from processor import processor as proc
+from processor import profiler as prof
+from processor import properties
+
+FPS = 5.0
+
+
+def test_frames_over_the_budget_are_late():
+    profiler = prof.Profiler(["mask"], interval=0, budget=0.05)
+
+    profiler.end_frame(profiler.start())
+    profiler.end_frame(profiler.start() - 60_000_000)
+    assert profiler.frames == 2
+    assert profiler.late == 1
+
+    profiler.set_budget(0.1)
+    profiler.end_frame(profiler.start() - 60_000_000)
+    assert profiler.late == 1
+
+
+@pytest.fixture
+def slow_source(tmp_path):
+    """
+    Capture thread over a file paced at 5 FPS, much slower than the processing of its frames.
+    """
+
+    path = str(tmp_path / "slow.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48))
+    for _ in range(10):
+        writer.write(np.zeros((48, 64, 3), np.uint8))
+    writer.release()
+
+    capture = cv2.VideoCapture(path)
+    capture_thread = cap.CaptureThread(capture, 3, True, True)
+    capture_thread.start()
+    yield capture_thread
+    capture_thread.stop()
+    capture.release()
+
+
+def test_fast_frame_on_a_slow_source_is_not_late(tmp_path, slow_source):
+    settings = conf.ConfigUtil(str(tmp_path / "configuration.ini")).snapshot
+    profiler = prof.Profiler(["capture", "mask", "detect", "latency", "slack"], interval=0, budget=1 / FPS)
+
+    processor = object.__new__(proc.Processor)
+    processor.visualize = False
+    processor.record = False
+    processor.profiler = profiler
+    processor.capture_thread = slow_source
+    processor.pipeline = pipe.DetectionPipeline(settings, profiler)
+    processor.pacer = pacing.FramePacer(slow_source.fps)
+    processor.properties = types.SimpleNamespace(tuning=properties.Tuning((0, 100, 100), (10, 255, 255), 10, 10, 0, 0))
+
+    for _ in range(4):
+        assert processor.process()
+
+    stats = profiler.stats()
+    assert profiler.frames == 4
+    assert profiler.late == 0
+    # Most of the time goes to waiting for the source, outside the frame time.
+    assert stats["capture"]["max"] > 100
+    assert stats["total"]["max"] < 100
@@ -0,0 +1,173 @@
+"""Stream protocol: fragmenting and reassembling frames."""
+import pytest
+
+from processor import protocol
+
+MTU = 100
+CHUNK = MTU - protocol.UDP_OVERHEAD - protocol.HEADER.size
+NOW = 1000.0
+
+
+def payload(size: int, seed: int = 0) -> bytes:
+    return bytes((seed + index) % 251 for index in range(size))
+
+
+def datagrams(frame_id: int, size: int = CHUNK * 3 + 10) -> list:
+    """
+    :return: Four fragments of the frame, sent at NOW
+    """
+    return protocol.fragment(frame_id, payload(size, frame_id), mtu=MTU, timestamp=int(NOW * 1e6))
+
+
+def test_round_trip():
+    data = payload(CHUNK * 3 + 10)
+    fragments = protocol.fragment(7, data, mtu=MTU, timestamp=int(NOW * 1e6))
+    assert len(fragments) == 4
+    assert all(len(fragment) <= MTU - protocol.UDP_OVERHEAD for fragment in fragments)
+
+    reassembler = protocol.Reassembler()
+    frames = [reassembler.feed(fragment, NOW + 0.02) for fragment in fragments]
+
+    assert frames[:3] == [None, None, None]
+    frame = frames[3]
+    assert frame.payload == data
+    assert frame.frame_id == 7
+    assert frame.codec == protocol.Codec.JPEG
+    assert frame.latency == pytest.approx(0.02)
+    assert reassembler.completed == 1
+    assert reassembler.partial == {}
+
+
+def test_empty_frame_is_one_fragment():
+    fragments = protocol.fragment(1, b"", mtu=MTU)
+    assert len(fragments) == 1
+    assert protocol.Reassembler().feed(fragments[0]).payload == b""
+
+
+def test_out_of_order_fragments():
+    fragments = datagrams(1)
+    reassembler = protocol.Reassembler()
+
+    frames = [reassembler.feed(fragments[index], NOW) for index in (3, 1, 0, 2)]
+
+    assert frames[:3] == [None, None, None]
+    assert frames[3].payload == payload(CHUNK * 3 + 10, 1)
+
+
+def test_duplicate_fragments_are_ignored():
+    fragments = datagrams(1)
+    reassembler = protocol.Reassembler()
+
+    for fragment in (fragments[0], fragments[0], fragments[1], fragments[1], fragments[2]):
+        assert reassembler.feed(fragment, NOW) is None
+    frame = reassembler.feed(fragments[3], NOW)
+    assert frame.payload == payload(CHUNK * 3 + 10, 1)
+
+    # Late copy of a completed frame
+    assert reassembler.feed(fragments[2], NOW) is None
+    assert reassembler.completed == 1
+    assert reassembler.partial == {}
+
+
+def test_missing_fragment_times_out():
+    reassembler = protocol.Reassembler(timeout=0.5)
+    first = datagrams(1)
+    for fragment in first[:3]:
+        reassembler.feed(fragment, NOW)
+    assert 1 in reassembler.partial
+
+    # Still waiting within the timeout
+    reassembler.expire(NOW + 0.4)
+    assert reassembler.expired == 0
+
+    # The next datagram after the timeout drops the incomplete frame.
+    second = datagrams(2)
+    reassembler.feed(second[0], NOW + 0.6)
+    assert reassembler.expired == 1
+    assert 1 not in reassembler.partial
+
+    # The missing fragment comes too late, it starts over and never completes.
+    assert reassembler.feed(first[3], NOW + 0.7) is None
+
+    for fragment in second[1:]:
+        frame = reassembler.feed(fragment, NOW + 0.7)
+    assert frame.frame_id == 2
+    assert reassembler.lost == 0  # First completed frame, nothing to count the gap from
+
+    # Frame 3 is lost, counted from the gap once frame 4 completes.
+    for fragment in datagrams(4):
+        frame = reassembler.feed(fragment, NOW + 0.8)
+    assert frame.frame_id == 4
+    assert reassembler.lost == 1
+
+
+def test_interleaved_frames():
+    reassembler = protocol.Reassembler()
+    first = datagrams(1)
+    second = datagrams(2)
+
+    # Both complete when the older one finishes first.
+    completed = []
+    for one, two in zip(first, second):
+        for fragment in (one, two):
+            frame = reassembler.feed(fragment, NOW)
+            if frame is not None:
+                completed.append(frame.frame_id)
+    assert completed == [1, 2]
+    assert reassembler.expired == 0
+
+    # A newer frame that completes first supersedes the older incomplete one.
+    third = datagrams(3)
+    fourth = datagrams(4)
+    reassembler.feed(third[0], NOW)
+    for fragment in fourth:
+        frame = reassembler.feed(fragment, NOW)
+    assert frame.frame_id == 4
+    assert reassembler.expired == 1
+    assert reassembler.partial == {}
+    assert all(reassembler.feed(fragment, NOW) is None for fragment in third[1:])
+    assert reassembler.completed == 3
+
+
+def test_frame_ids_wrap_around():
+    reassembler = protocol.Reassembler()
+    for frame_id in (0xFFFFFFFF, 0):
+        for fragment in datagrams(frame_id):
+            frame = reassembler.feed(fragment, NOW)
+        assert frame.frame_id == frame_id
+
+    assert reassembler.lost == 0
+    assert protocol.Reassembler.is_newer(0, 0xFFFFFFFF)
+    assert not protocol.Reassembler.is_newer(0xFFFFFFFF, 0)
+
+
+def test_garbage_and_oversized_datagrams():
+    reassembler = protocol.Reassembler()
+    fragment = datagrams(1)[0]
+    header = protocol.HEADER
+
+    garbage = [
+        b"",
+        b"YK",
+        b"\x00" * 64,
+        b"XX" + fragment[2:],  # Wrong magic
+        fragment[:2] + bytes([protocol.VERSION + 1]) + fragment[3:],  # Unknown version
+        fragment + b"trailing bytes",  # Longer than the length field says
+        fragment[:-1],  # Truncated
+        header.pack(protocol.MAGIC, protocol.VERSION, 1, 1, 4, 4, 0, 0),  # Index past the count
+    ]
+    for datagram in garbage:
+        assert reassembler.feed(datagram, NOW) is None
+    assert reassembler.invalid == len(garbage)
+    assert reassembler.partial == {}
+
+    # A fragment count that disagrees with the frame's first fragment is ignored.
+    reassembler.feed(fragment, NOW)
+    other = header.pack(protocol.MAGIC, protocol.VERSION, 1, 1, 1, 2, 0, 3) + b"abc"
+    assert reassembler.feed(other, NOW) is None
+    assert reassembler.partial[1][2] == 1
+
+    with pytest.raises(ValueError):
+        protocol.fragment(1, b"x", mtu=protocol.UDP_OVERHEAD + header.size)
+    with pytest.raises(ValueError):
+        protocol.fragment(1, bytes(0x10000 * CHUNK + 1), mtu=MTU)
@@ -0,0 +1,99 @@
+"""Coarse to fine detection."""
+import numpy as np
+import pytest
+
+from processor import buffers
+from processor import config as conf
+from processor import detection
+from processor import masking
+from processor import pipeline as pipe
+from processor import profiler as prof
+from processor import properties
+
+WIDTH, HEIGHT = 640, 360
+LOWER = np.array([0, 100, 100], np.uint8)
+UPPER = np.array([10, 255, 255], np.uint8)
+RED = properties.Tuning(LOWER, UPPER, 0, 0, 0, 0)
+
+
+def create_mask(image: np.ndarray) -> np.ndarray:
+    return masking.hsv_mask(image, LOWER, UPPER)
+
+
+def draw(frame: np.ndarray, x: int, y: int, width: int, height: int) -> None:
+    frame[y:y + height, x:x + width] = (0, 0, 255)
+
+
+def test_coarse_size():
+    assert detection.coarse_size(640, 360, 4) == (160, 90)
+    assert detection.coarse_size(641, 363, 2) == (320, 181)
+    # Never empty
+    assert detection.coarse_size(3, 3, 4) == (1, 1)
+
+
+@pytest.mark.parametrize("factor", [2, 4])
+@pytest.mark.parametrize("detector", [detection.ContourDetector(), detection.ComponentsDetector()])
+def test_centroid_is_the_full_resolution_centroid(factor, detector):
+    frame = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    # Odd sizes and positions, not aligned to the coarse pixels
+    draw(frame, 101, 57, 37, 23)
+    frame[65:70, 120:123] = 0  # A hole moves the centroid
+    draw(frame, 400, 250, 5, 3)  # Smaller blob elsewhere
+
+    expected = detector.detect(create_mask(frame))
+    result, coarse_mask = detection.coarse_to_fine(frame, create_mask, detector, factor, (7, 9))
+
+    assert coarse_mask.shape == (HEIGHT // factor, WIDTH // factor)
+    assert result.x == pytest.approx(expected.x + 7)
+    assert result.y == pytest.approx(expected.y + 9)
+    assert result.area == expected.area
+    assert result.box == (expected.box[0] + 7, expected.box[1] + 9) + expected.box[2:]
+
+
+def test_only_the_best_candidates_are_refined():
+    frame = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    draw(frame, 20, 20, 40, 40)
+    draw(frame, 200, 20, 30, 30)
+    draw(frame, 400, 20, 20, 20)
+    refined = []
+
+    def create_fine_mask(image: np.ndarray) -> np.ndarray:
+        refined.append(image.shape[:2])
+        return create_mask(image)
+
+    result, _ = detection.coarse_to_fine(
+        frame, create_mask, detection.ContourDetector(), 4, candidates=2, create_fine_mask=create_fine_mask
+    )
+
+    # Two largest blobs with one coarse pixel of margin, never the whole frame
+    assert refined == [(48, 48), (40, 40)]
+    assert result.box == (20, 20, 40, 40)
+
+
+def test_nothing_to_find():
+    frame = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    result, coarse_mask = detection.coarse_to_fine(frame, create_mask, detection.ContourDetector(), 4)
+
+    assert result is None
+    assert not coarse_mask.any()
+
+
+def test_pipeline_keeps_the_coarse_mask_apart_from_the_fine_masks(tmp_path):
+    settings = conf.ConfigUtil(str(tmp_path / "configuration.ini")).snapshot.replace({
+        "opencv.pyramid-factor": 4,
+        "opencv.tracking": False
+    })
+    pipeline = pipe.DetectionPipeline(settings, prof.Profiler(["mask", "detect"], interval=0), buffers.BufferPool())
+    pipeline.reserve(WIDTH, HEIGHT)
+
+    frame = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    draw(frame, 101, 57, 37, 23)
+    expected = detection.ContourDetector().detect(create_mask(frame))
+
+    for _ in range(2):
+        target, mask, window = pipeline.detect(frame, 0.0, RED)
+        assert (target.x, target.y) == (expected.x, expected.y)
+        assert window == (0, 0, WIDTH, HEIGHT)
+        # The coarse mask is shown, a fine mask written into its buffer would break it.
+        assert mask.shape == (HEIGHT // 4, WIDTH // 4)
+        assert np.array_equal(mask, create_mask(frame[::4, ::4]))
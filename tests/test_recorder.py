@@ -0,0 +1,94 @@
+"""Recorder buffers."""
+import threading
+
+import cv2
+import numpy as np
+
+from conftest import wait_for
+from processor import recorder as rec
+
+SIZE = (320, 240)
+FRAME_BYTES = 320 * 240 * 3
+
+
+class SlowRecorder(rec.AsyncRecorder):
+    """
+    Encodes only when allowed, so the queue can be filled.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.allowed = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def encode(self, frame: np.ndarray, timestamp: float) -> None:
+        self.allowed.wait(5.0)
+
+    def finish(self) -> None:
+        pass
+
+
+def test_buffers_are_allocated_on_demand():
+    recording = SlowRecorder(None, 0, 30, SIZE, queue_size=8)
+    assert recording.allocated == 0
+    assert recording.buffer_bytes == 0
+
+    frame = np.zeros((SIZE[1], SIZE[0], 3), np.uint8)
+    for index in range(5):
+        recording.write(frame, float(index))
+    assert recording.allocated == 5
+
+    for index in range(5, 20):
+        recording.write(frame, float(index))
+    assert recording.allocated == 8
+    assert recording.buffer_bytes == 8 * FRAME_BYTES
+    assert recording.dropped > 0
+
+    recording.allowed.set()
+    recording.release()
+    assert recording.written + recording.dropped == 20
+
+
+def test_event_queue_counts_towards_memory(tmp_path):
+    recording = rec.EventRecorder(str(tmp_path), cv2.VideoWriter_fourcc(*'XVID'), 30, SIZE, queue_size=60, memory=1)
+    try:
+        # 1 MB holds 4 frames of 320x240
+        assert recording.queue_size == 1024 * 1024 // FRAME_BYTES
+
+        frame = np.random.default_rng(0).integers(0, 256, (SIZE[1], SIZE[0], 3), np.uint8)
+        for index in range(30):
+            recording.write(frame, index / 30)
+        recording.release()
+
+        assert recording.ring_bytes + recording.buffer_bytes <= recording.memory
+        assert recording.allocated <= recording.queue_size
+    finally:
+        recording.release()
+
+
+def test_next_recorder_takes_the_free_buffers():
+    previous = SlowRecorder(None, 0, 30, SIZE, queue_size=8)
+    frame = np.zeros((SIZE[1], SIZE[0], 3), np.uint8)
+    for index in range(3):
+        previous.write(frame, float(index))
+    previous.allowed.set()
+    assert wait_for(lambda: previous.written == 3)
+
+    # Still writing when the next one opens
+    previous.allowed.clear()
+    previous.write(frame, 3.0)
+    previous.release(wait=False)
+
+    following = SlowRecorder(None, 0, 30, SIZE, queue_size=8)
+    following.take_buffers(previous)
+    assert following.allocated == 2
+    assert previous.allocated == 1
+
+    following.write(frame, 4.0)
+    assert following.allocated == 2
+
+    previous.allowed.set()
+    following.allowed.set()
+    previous.release()
+    following.release()
+    assert previous.written == 4
+    assert following.written == 1
@@ -0,0 +1,147 @@
+"""Buffered log writer."""
+import io
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import wait_for
+from processor import savelog
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+@pytest.fixture
+def writer():
+    writer = savelog.LogWriter(sync_interval=60.0)
+    yield writer
+    writer.close()
+
+
+def read(path) -> str:
+    with open(path) as file:
+        return file.read()
+
+
+def test_console_mirror_and_time_prefix(tmp_path, writer):
+    console = io.StringIO()
+    out = savelog.CustomOut(str(tmp_path / "stdout.txt"), console, writer, True)
+
+    print("first", file=out)
+    print("second", file=out)
+    writer.flush()
+
+    text = read(tmp_path / "stdout.txt")
+    assert text == console.getvalue()
+    lines = text.splitlines()
+    assert len(lines) == 2
+    for line, message in zip(lines, ("first", "second")):
+        assert line.startswith("[") and line[9:] == f"] {message}"
+        time.strptime(line[1:9], "%H:%M:%S")
+
+
+def test_flush_syncs_without_waiting_for_the_interval(tmp_path, writer, monkeypatch):
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(savelog.os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+    file = writer.open(str(tmp_path / "log.txt"))
+
+    writer.put(file, "message\n")
+    assert wait_for(lambda: read(tmp_path / "log.txt") == "" and len(writer.queue) == 0)
+    # Written but not synced yet, the interval is a minute.
+    assert synced == []
+
+    writer.flush()
+    assert synced == [file.fileno()]
+    assert read(tmp_path / "log.txt") == "message\n"
+
+
+class SlowFile(io.StringIO):
+    """
+    File on a disk that stalls until released.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = threading.Event()
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        self.writes = self.writes + 1
+        self.release.wait(5.0)
+        return super().write(text)
+
+    def fileno(self) -> int:
+        raise OSError("Not a real file")
+
+    def close(self) -> None:
+        pass
+
+
+def test_printing_never_waits_for_a_slow_disk_and_drops_when_full():
+    writer = savelog.LogWriter(queue_size=10, sync_interval=60.0)
+    file = SlowFile()
+    writer.files.append(file)
+    try:
+        writer.put(file, "stalls the writer\n")
+        assert wait_for(lambda: file.writes == 1)
+
+        start = time.monotonic()
+        for index in range(15):
+            writer.put(file, f"{index}\n")
+        assert time.monotonic() - start < 0.1
+        assert len(writer.queue) == 10
+        assert writer.dropped == 5
+    finally:
+        file.release.set()
+        writer.close()
+
+    # Written in one batch with the drop notice
+    assert file.writes == 2
+    assert file.getvalue() == "stalls the writer\n" + "".join(f"{index}\n" for index in range(10)) + \
+        "[Logger] 5 messages dropped, the disk is too slow.\n"
+    assert writer.total_dropped == 5
+
+
+def test_close_writes_everything_and_later_messages_are_dropped(tmp_path):
+    writer = savelog.LogWriter(sync_interval=60.0)
+    file = writer.open(str(tmp_path / "log.txt"))
+    for index in range(100):
+        writer.put(file, f"{index}\n")
+
+    writer.close()
+    writer.close()
+    writer.put(file, "too late\n")
+
+    assert not writer.thread.is_alive()
+    assert file.closed
+    assert read(tmp_path / "log.txt") == "".join(f"{index}\n" for index in range(100))
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGTERM") or sys.platform == "win32", reason="Needs POSIX signals")
+def test_terminated_process_syncs_its_log(tmp_path):
+    script = (
+        "import os, signal, sys, time\n"
+        "from processor import savelog\n"
+        "savelog.initialize(sys.argv[1], sync_interval=60.0)\n"
+        "print('before the signal')\n"
+        "os.kill(os.getpid(), signal.SIGTERM)\n"
+        "time.sleep(5)\n"
+        "print('never printed')\n"
+    )
+    directory = str(tmp_path / "logs")
+
+    result = subprocess.run(
+        [sys.executable, "-c", script, directory], cwd=SRC, capture_output=True, text=True, timeout=30
+    )
+
+    # Still terminated by the signal, after the log is on the disk
+    assert result.returncode == -signal.SIGTERM
+    text = read(os.path.join(directory, "stdout.txt"))
+    assert "] Logger initialized.\n" in text
+    assert "] before the signal\n" in text
+    assert "never printed" not in text
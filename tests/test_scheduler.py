@@ -0,0 +1,149 @@
+"""Timer scheduler, on a clock the test moves."""
+import threading
+import time
+
+import pytest
+
+from conftest import wait_for
+from processor import utilities
+
+
+class Clock:
+    """
+    Stands in for the time module of the scheduler.
+    """
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(utilities, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = utilities.Scheduler()
+    yield scheduler
+    scheduler.shutdown()
+
+
+def advance(scheduler: utilities.Scheduler, clock: Clock, seconds: float) -> None:
+    """
+    Move the clock and wake the scheduler up to look at the deadlines again.
+    """
+
+    with scheduler.condition:
+        clock.now = clock.now + seconds
+        scheduler.condition.notify()
+
+
+def settle() -> None:
+    """
+    Give the scheduler thread time to run anything that is due.
+    """
+    time.sleep(0.05)
+
+
+def test_jobs_run_in_deadline_order_and_ties_in_scheduling_order(scheduler, clock):
+    runs = []
+    for name, delay in (("b", 2.0), ("a", 1.0), ("c", 2.0), ("d", 2.0)):
+        scheduler.schedule(delay, lambda name=name: runs.append(name))
+
+    settle()
+    assert runs == []
+
+    advance(scheduler, clock, 1.0)
+    assert wait_for(lambda: runs == ["a"])
+
+    advance(scheduler, clock, 5.0)
+    assert wait_for(lambda: len(runs) == 4)
+    assert runs == ["a", "b", "c", "d"]
+
+
+def test_cancel(scheduler, clock):
+    runs = []
+    cancelled = scheduler.schedule(1.0, lambda: runs.append("cancelled"))
+    scheduler.schedule(1.0, lambda: runs.append("kept"))
+
+    cancelled.cancel()
+    advance(scheduler, clock, 1.0)
+    assert wait_for(lambda: runs == ["kept"])
+    settle()
+    assert runs == ["kept"]
+
+    # A periodic job can cancel itself.
+    def once() -> None:
+        runs.append("once")
+        job.cancel()
+
+    job = scheduler.schedule(1.0, once, 1.0)
+    for _ in range(3):
+        advance(scheduler, clock, 1.0)
+        settle()
+    assert runs == ["kept", "once"]
+    assert len(scheduler.heap) == 0
+
+
+def test_periodic_job_keeps_the_cadence_and_skips_missed_runs(scheduler, clock):
+    runs = []
+    scheduler.schedule(1.0, lambda: runs.append(clock.now), 1.0)
+
+    for index in range(3):
+        advance(scheduler, clock, 1.0)
+        assert wait_for(lambda: len(runs) == index + 1)
+    assert runs == [1001.0, 1002.0, 1003.0]
+
+    # Four runs late: runs once now instead of catching up, the next one is back on the cadence.
+    advance(scheduler, clock, 5.5)
+    assert wait_for(lambda: len(runs) == 4)
+    settle()
+    assert runs[3:] == [1008.5]
+
+    advance(scheduler, clock, 0.4)
+    settle()
+    assert len(runs) == 4
+    advance(scheduler, clock, 0.1)
+    assert wait_for(lambda: len(runs) == 5)
+    assert runs[4] == pytest.approx(1009.0)
+
+
+def test_failing_job_does_not_stop_the_scheduler(scheduler, clock, capsys):
+    runs = []
+
+    def fail() -> None:
+        runs.append("fail")
+        raise RuntimeError("broken")
+
+    scheduler.schedule(1.0, fail, 1.0)
+    scheduler.schedule(1.5, lambda: runs.append("next"))
+
+    advance(scheduler, clock, 1.0)
+    assert wait_for(lambda: runs == ["fail"])
+    advance(scheduler, clock, 1.0)
+    assert wait_for(lambda: runs == ["fail", "next", "fail"])
+
+    assert capsys.readouterr().out.count("Scheduled job failed: broken") == 2
+    assert scheduler.thread.is_alive()
+
+
+def test_shutdown_and_restart(scheduler):
+    ran = threading.Event()
+    job = scheduler.schedule(60.0, ran.set)
+    first = scheduler.thread
+
+    scheduler.shutdown()
+    assert job.cancelled
+    assert not first.is_alive()
+    assert len(scheduler.heap) == 0
+
+    # Starts again on demand.
+    scheduler.schedule(0.0, ran.set)
+    assert ran.wait(5.0)
+    assert scheduler.thread is not first
@@ -0,0 +1,144 @@
+"""Frame ring in shared memory."""
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from processor import sharedring
+
+SHAPE = (48, 64, 3)
+
+
+@pytest.fixture
+def ring():
+    ring = sharedring.SharedRing(SHAPE, 3)
+    yield ring
+    ring.close()
+
+
+def write(ring: sharedring.SharedRing, value: int, timestamp: float) -> int:
+    sequence, image = ring.claim()
+    image[:] = value
+    ring.commit(sequence, timestamp)
+    return sequence
+
+
+def write_frames(handle, lock, count: int) -> None:
+    """
+    Writer process, every frame is filled with its sequence number.
+    """
+
+    ring = sharedring.SharedRing.attach(handle, lock)
+    try:
+        for _ in range(count):
+            sequence, image = ring.claim()
+            image[:] = sequence % 251
+            ring.commit(sequence, float(sequence))
+    finally:
+        ring.close()
+
+
+def test_write_and_read(ring):
+    assert ring.latest() == -1
+
+    assert write(ring, 7, 1.5) == 0
+    assert ring.latest() == 0
+    assert ring.valid(0)
+
+    out = np.zeros(SHAPE, np.uint8)
+    assert ring.read(0, out) == 1.5
+    assert (out == 7).all()
+
+    # Another process attaches to the same memory.
+    other = sharedring.SharedRing.attach(ring.handle(), ring.lock)
+    try:
+        assert other.latest() == 0
+        assert write(other, 9, 2.5) == 1
+    finally:
+        other.close()
+    assert ring.read(1, out) == 2.5
+    assert (out == 9).all()
+
+
+def test_wrap_around(ring):
+    for sequence in range(5):
+        write(ring, sequence, float(sequence))
+    assert ring.latest() == 4
+
+    out = np.zeros(SHAPE, np.uint8)
+    # Overwritten by 3 and 4
+    assert not ring.valid(0)
+    assert ring.read(1, out) is None
+    for sequence in (2, 3, 4):
+        assert ring.read(sequence, out) == float(sequence)
+        assert (out == sequence).all()
+
+
+def test_torn_reads_are_detected(ring, monkeypatch):
+    out = np.zeros(SHAPE, np.uint8)
+    write(ring, 1, 1.0)
+
+    # Slot 1 is being written
+    sequence, image = ring.claim()
+    assert not ring.valid(sequence)
+    assert ring.read(sequence, out) is None
+    ring.commit(sequence, 2.0)
+
+    # The writer comes around to slot 0 while it is copied.
+    copyto = np.copyto
+
+    def overwritten_while_copying(dst, src):
+        copyto(dst, src)
+        write(ring, 2, 3.0)
+        write(ring, 3, 4.0)
+
+    monkeypatch.setattr(sharedring.np, "copyto", overwritten_while_copying)
+    assert ring.read(0, out) is None
+
+
+def test_reads_across_processes_are_never_torn():
+    ring = sharedring.SharedRing((256, 256, 3), 2)
+    context = multiprocessing.get_context("spawn")
+    writer = context.Process(target=write_frames, args=(ring.handle(), ring.lock, 2000), daemon=True)
+    out = np.empty(ring.shape, np.uint8)
+    reads = 0
+    try:
+        writer.start()
+        while writer.is_alive() or reads == 0:
+            sequence = ring.latest()
+            if sequence < 0:
+                continue
+            if ring.read(sequence, out) is not None:
+                reads = reads + 1
+                # Every pixel of one frame, none of the next
+                assert out.min() == out.max() == sequence % 251
+        writer.join(10)
+    finally:
+        ring.close()
+
+    assert writer.exitcode == 0
+    assert reads > 0
+
+
+def test_lock_of_a_dead_process_is_taken_over(ring, capsys):
+    ring.LOCK_TIMEOUT = 0.1
+    # Held by a process that is gone
+    ring.lock.acquire()
+
+    write(ring, 5, 1.0)
+
+    assert ring.latest() == 0
+    assert "taking it over" in capsys.readouterr().out
+    # Released again
+    assert ring.lock.acquire(False)
+    ring.lock.release()
+
+
+def test_close_unlinks_the_memory():
+    ring = sharedring.SharedRing(SHAPE, 2)
+    handle = ring.handle()
+    ring.close()
+    ring.close()
+
+    with pytest.raises(FileNotFoundError):
+        sharedring.SharedRing.attach(handle, ring.lock)
@@ -0,0 +1,148 @@
+"""Simulator command link against the stand-in simulator."""
+import time
+
+import pytest
+
+from conftest import free_port, wait_for
+from processor import connection as conn
+from processor import simulator
+from standins import simulator as standin
+
+HOST = "127.0.0.1"
+
+
+class FastSimulatorLink(simulator.SimulatorLink):
+    """
+    Short backoff so the reconnects happen within the test.
+    """
+
+    min_backoff = 0.05
+    max_backoff = 0.2
+    backoff = 0.05
+
+
+def start_server(loop_thread, port: int = 0, delay: float = 0.0, ack: bool = True) -> standin.SimulatorServer:
+    server = standin.SimulatorServer(HOST, port, delay, ack, False)
+    loop_thread.run(server.start())
+    return server
+
+
+def test_acks_are_matched_in_order(loop_thread):
+    server = start_server(loop_thread, delay=0.05)
+    link = FastSimulatorLink(HOST, server.port)
+    try:
+        assert wait_for(lambda: link.status()["state"] == conn.ConnectionState.CONNECTED)
+
+        # Commands 0.1 s apart: matched with the wrong command, a round trip would be 0.05 s off.
+        for _ in range(4):
+            link.send(simulator.Command.DROP)
+            time.sleep(0.1)
+        assert wait_for(lambda: link.acked == 4)
+
+        assert server.drops == 4
+        assert link.sent == 4
+        assert link.unacked == 0
+        assert len(link.in_flight) == 0
+        assert link.round_trip.count == 4
+        assert 0.045 <= link.round_trip.total / 4 < 0.09
+        assert link.round_trip.maximum < 0.1
+    finally:
+        link.terminate()
+        loop_thread.run(server.stop())
+
+    assert link.status()["state"] == conn.ConnectionState.CLOSED
+
+
+def test_closed_loop_starts_at_the_frame(loop_thread):
+    server = start_server(loop_thread)
+    link = FastSimulatorLink(HOST, server.port)
+    try:
+        assert wait_for(lambda: link.connected)
+
+        link.send(simulator.Command.DROP, time.monotonic() - 0.2)
+        assert wait_for(lambda: link.acked == 1)
+
+        assert link.closed_loop.maximum >= 0.2
+        assert link.round_trip.maximum < 0.2
+    finally:
+        link.terminate()
+        loop_thread.run(server.stop())
+
+
+def test_commands_older_than_max_age_are_dropped(loop_thread):
+    port = free_port()
+    link = FastSimulatorLink(HOST, port, max_age=0.3)
+    try:
+        assert wait_for(lambda: link.failures >= 1)
+
+        # Waits in the outbox longer than max_age while disconnected
+        link.send(simulator.Command.DROP)
+        time.sleep(0.4)
+        # Decided on a frame older than max_age
+        link.send(simulator.Command.DROP, time.monotonic() - 0.5)
+        # Still fresh when connected
+        link.send(simulator.Command.DROP)
+
+        server = start_server(loop_thread, port)
+        assert wait_for(lambda: link.acked == 1)
+        time.sleep(0.1)
+
+        assert link.expired == 2
+        assert link.sent == 1
+        assert server.drops == 1
+        assert link.status()["expired"] == 2
+    finally:
+        link.terminate()
+
+    loop_thread.run(server.stop())
+
+
+def test_full_outbox_replaces_the_oldest():
+    link = FastSimulatorLink(HOST, free_port(), max_outbox=2)
+    try:
+        for index in range(5):
+            assert link.send(simulator.Command.DROP, float(index))
+
+        assert link.overflowed == 3
+        assert [requested for _, requested in link.outbox] == [3.0, 4.0]
+    finally:
+        link.terminate()
+
+    # Terminated
+    assert not link.send(simulator.Command.DROP)
+
+
+def test_unacked_when_the_connection_is_lost(loop_thread):
+    server = start_server(loop_thread, ack=False)
+    link = FastSimulatorLink(HOST, server.port)
+    try:
+        assert wait_for(lambda: link.connected and len(server.writers) == 1)
+
+        for _ in range(3):
+            link.send(simulator.Command.DROP)
+        assert wait_for(lambda: server.drops == 3)
+        assert link.acked == 0
+
+        loop_thread.run(server.stop())
+        assert wait_for(lambda: link.unacked == 3)
+        assert len(link.in_flight) == 0
+
+        # Reconnects once the simulator is back.
+        loop_thread.run(server.start())
+        assert wait_for(lambda: link.connections == 2)
+    finally:
+        link.terminate()
+        loop_thread.run(server.stop())
+
+
+def test_latency_histogram():
+    histogram = simulator.LatencyHistogram()
+    for seconds in (0.0012, 0.0012, 0.5, 2.0):
+        histogram.add(seconds)
+
+    assert histogram.count == 4
+    # Upper bound of the bucket, ten per decade
+    assert histogram.percentile(50) == pytest.approx(1e-4 * 10 ** 1.1)
+    assert histogram.percentile(75) == pytest.approx(1e-4 * 10 ** 3.7)
+    # Over the last bucket, the maximum
+    assert histogram.percentile(100) == 2.0
@@ -0,0 +1,147 @@
+"""Per frame telemetry log."""
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import wait_for
+from processor import telemetry as tel
+
+LOWER = np.array([0, 100, 100], np.uint8)
+UPPER = np.array([10, 255, 255], np.uint8)
+
+
+def append(log: tel.TelemetryLog, sequence: int, detected: bool = True, collision: bool = False) -> None:
+    log.append(
+        sequence, 100.0 + sequence / 30, 0.005, (sequence, 2 * sequence) if detected else None, 50.0,
+        collision, LOWER, UPPER, capture_dropped=sequence // 10
+    )
+
+
+def test_records_round_trip(tmp_path, capsys):
+    path = str(tmp_path / "telemetry.bin")
+    log = tel.TelemetryLog(path, chunk_size=8)
+    # Two full chunks and a partial one
+    for sequence in range(20):
+        append(log, sequence, detected=sequence % 5 != 0)
+    log.close()
+    log.close()
+
+    assert log.written == 20
+    assert "Telemetry closed: 20 records written, 0 dropped." in capsys.readouterr().out
+
+    records = tel.read(path)
+    assert isinstance(records, np.memmap)
+    assert records["sequence"].tolist() == list(range(20))
+    assert records["timestamp"][3] == pytest.approx(100.1)
+    assert records["latency"][0] == pytest.approx(0.005)
+    assert (records["x"][1], records["y"][1], records["area"][1]) == (1, 2, 50.0)
+    # No target
+    assert (records["x"][5], records["y"][5], records["area"][5], records["detected"][5]) == (-1, -1, 0.0, 0)
+    assert records["lower_hsv"][7].tolist() == [0, 100, 100]
+    assert records["upper_hsv"][7].tolist() == [10, 255, 255]
+    assert records["capture_dropped"][19] == 1
+
+
+def test_partial_last_record_is_ignored(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    log = tel.TelemetryLog(path)
+    for sequence in range(3):
+        append(log, sequence)
+    log.close()
+
+    # Cut off in the middle of a write
+    with open(path, "ab") as file:
+        file.write(b"\x01" * (tel.RECORD.itemsize // 2))
+
+    assert len(tel.read(path)) == 3
+
+
+def test_invalid_files(tmp_path):
+    path = tmp_path / "telemetry.bin"
+    for content in (b"", b"YKTL", tel.HEADER.pack(b"XXXX", tel.VERSION, tel.RECORD.itemsize),
+                    tel.HEADER.pack(tel.MAGIC, tel.VERSION + 1, tel.RECORD.itemsize),
+                    tel.HEADER.pack(tel.MAGIC, tel.VERSION, tel.RECORD.itemsize + 1)):
+        path.write_bytes(content)
+        with pytest.raises(ValueError):
+            tel.read(str(path))
+
+    # Only a header
+    path.write_bytes(tel.HEADER.pack(tel.MAGIC, tel.VERSION, tel.RECORD.itemsize))
+    assert len(tel.read(str(path))) == 0
+
+
+def test_log_without_records_is_removed(tmp_path):
+    path = tmp_path / "telemetry.bin"
+    log = tel.TelemetryLog(str(path))
+    assert path.exists()
+
+    log.close()
+    assert not path.exists()
+
+
+class StalledFile:
+    """
+    Log file on a disk that stalls until released.
+    """
+
+    def __init__(self, file) -> None:
+        self.file = file
+        self.release = threading.Event()
+        self.writes = 0
+
+    def write(self, data: bytes) -> int:
+        self.writes = self.writes + 1
+        self.release.wait(5.0)
+        return self.file.write(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def test_records_are_dropped_while_the_writer_is_behind(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    log = tel.TelemetryLog(path, chunk_size=4, chunks=2)
+    stalled = StalledFile(log.file)
+    log.file = stalled
+    try:
+        # The first chunk stalls the writer, the second one fills the last free chunk.
+        for sequence in range(4):
+            append(log, sequence)
+        assert wait_for(lambda: stalled.writes == 1)
+        for sequence in range(4, 12):
+            append(log, sequence)
+
+        assert log.dropped == 4
+    finally:
+        stalled.release.set()
+        log.close()
+
+    # The chunks that were queued are still written.
+    assert log.written == 8
+    assert tel.read(path)["sequence"].tolist() == list(range(8))
+
+
+def test_summary():
+    records = np.zeros(6, tel.RECORD)
+    records["sequence"] = [0, 1, 2, 4, 5, 6]
+    records["timestamp"] = np.arange(6) / 10
+    records["latency"] = [0.01, 0.01, 0.01, 0.01, 0.01, 0.1]
+    records["detected"] = [1, 1, 1, 0, 1, 1]
+    records["collision"] = [0, 1, 1, 0, 1, 0]
+    records["capture_dropped"] = [0, 0, 0, 1, 1, 2]
+
+    summary = tel.summarize(records)
+
+    assert summary["frames"] == 6
+    assert summary["fps"] == pytest.approx(10.0)
+    assert summary["detected"] == pytest.approx(5 / 6)
+    assert summary["collisions"] == 2
+    assert summary["latency_p50_ms"] == pytest.approx(10.0)
+    assert summary["latency_p99_ms"] > 90.0
+    assert summary["capture_dropped"] == 2
+    assert summary["sequence_gaps"] == 1
+    assert tel.summarize(np.zeros(0, tel.RECORD)) == {"frames": 0}
@@ -0,0 +1,133 @@
+"""Region of interest tracking, alone and around the detection."""
+import numpy as np
+import pytest
+
+from processor import config as conf
+from processor import pipeline as pipe
+from processor import profiler as prof
+from processor import properties
+from processor import tracker as trk
+
+WIDTH, HEIGHT = 640, 360
+RED = properties.Tuning((0, 100, 100), (10, 255, 255), 0, 0, 0, 0)
+
+
+def test_first_detection_starts_tracking(capsys):
+    tracker = trk.RoiTracker(100, 2)
+    assert tracker.state == trk.TrackerState.LOST
+    assert tracker.search_window(0.0, WIDTH, HEIGHT) is None
+
+    tracker.update(0.0, (300, 200), (20, 10))
+
+    assert tracker.state == trk.TrackerState.TRACKING
+    assert tracker.search_window(0.1, WIDTH, HEIGHT) == (250, 150, 350, 250)
+    assert "Tracker: tracking" in capsys.readouterr().out
+
+
+def test_prediction_follows_a_constant_velocity():
+    tracker = trk.RoiTracker(100, 2)
+    # 100 px/s to the right
+    for index in range(20):
+        tracker.update(index * 0.1, (100 + index * 10, 200), (20, 10))
+
+    x, y = tracker.predict(2.0)
+    assert x == pytest.approx(300, abs=1)
+    assert y == pytest.approx(200, abs=1)
+    start_x, _, end_x, _ = tracker.search_window(2.0, WIDTH, HEIGHT)
+    assert start_x < 300 < end_x
+
+
+def test_window_covers_the_target_and_stays_in_the_frame():
+    tracker = trk.RoiTracker(100, 2)
+
+    # Large target: window is twice its size.
+    tracker.update(0.0, (300, 200), (80, 60))
+    assert tracker.search_window(0.0, WIDTH, HEIGHT) == (220, 140, 380, 260)
+
+    # Near the corner: clipped to the frame.
+    corner = trk.RoiTracker(100, 2)
+    corner.update(0.0, (10, 350), (20, 10))
+    assert corner.search_window(0.0, WIDTH, HEIGHT) == (0, 300, 60, HEIGHT)
+
+    # Predicted out of the frame: the whole frame is searched.
+    tracker.velocity_x = -10000.0
+    assert tracker.search_window(1.0, WIDTH, HEIGHT) is None
+
+
+def test_misses_grow_the_window_then_lose_the_target(capsys):
+    tracker = trk.RoiTracker(100, 2)
+    tracker.update(0.0, (300, 200), (20, 10))
+
+    tracker.update(0.1, None)
+    assert tracker.state == trk.TrackerState.REACQUIRING
+    assert tracker.search_window(0.1, WIDTH, HEIGHT) == (200, 100, 400, 300)
+
+    tracker.update(0.2, None)
+    assert tracker.state == trk.TrackerState.REACQUIRING
+    assert tracker.search_window(0.2, WIDTH, HEIGHT) == (150, 50, 450, 350)
+
+    tracker.update(0.3, None)
+    assert tracker.state == trk.TrackerState.LOST
+    assert tracker.search_window(0.3, WIDTH, HEIGHT) is None
+    assert capsys.readouterr().out.splitlines()[-1] == "Tracker: lost"
+
+    # Found again, a later hit resets the misses.
+    tracker.update(0.4, (320, 200), (20, 10))
+    tracker.update(0.5, None)
+    tracker.update(0.6, (325, 205), (20, 10))
+    assert tracker.state == trk.TrackerState.TRACKING
+    assert tracker.misses == 0
+
+
+def frame_with_target(x: int, y: int) -> np.ndarray:
+    frame = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    frame[y - 5:y + 5, x - 10:x + 10] = (0, 0, 255)
+    return frame
+
+
+def create_pipeline(tmp_path, tracking: bool) -> pipe.DetectionPipeline:
+    settings = conf.ConfigUtil(str(tmp_path / "configuration.ini")).snapshot.replace({
+        "opencv.tracking": tracking,
+        "opencv.tracking-window": 100,
+        "opencv.tracking-max-misses": 2
+    })
+    return pipe.DetectionPipeline(settings, prof.Profiler(["mask", "detect"], interval=0))
+
+
+def test_tracking_finds_the_same_centroids_as_the_full_frame_search(tmp_path):
+    tracking = create_pipeline(tmp_path, True)
+    full = create_pipeline(tmp_path, False)
+
+    windows = []
+    for index in range(30):
+        timestamp = index / 30
+        frame = frame_with_target(50 + index * 15, 100 + index * 5)
+
+        tracked, mask, window = tracking.detect(frame, timestamp, RED)
+        expected, _, _ = full.detect(frame, timestamp, RED)
+
+        assert (tracked.x, tracked.y) == (expected.x, expected.y)
+        assert mask.shape == (window[3] - window[1], window[2] - window[0])
+        windows.append(window)
+
+    # Whole frame only until the first detection
+    assert windows[0] == (0, 0, WIDTH, HEIGHT)
+    for start_x, start_y, end_x, end_y in windows[1:]:
+        assert (end_x - start_x) * (end_y - start_y) <= 100 * 100
+
+
+def test_lost_target_is_found_again_in_the_whole_frame(tmp_path):
+    pipeline = create_pipeline(tmp_path, True)
+    pipeline.detect(frame_with_target(100, 100), 0.0, RED)
+
+    # Jumps to the other corner, out of the window
+    frame = frame_with_target(550, 300)
+    for index in range(3):
+        target, _, _ = pipeline.detect(frame, 0.1 * (index + 1), RED)
+        assert target is None
+    assert pipeline.tracker.state == trk.TrackerState.LOST
+
+    target, _, window = pipeline.detect(frame, 0.4, RED)
+    assert window == (0, 0, WIDTH, HEIGHT)
+    assert (target.x, target.y) == pytest.approx((549.5, 299.5))
+    assert pipeline.tracker.state == trk.TrackerState.TRACKING
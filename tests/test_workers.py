@@ -0,0 +1,132 @@
+"""Capture and recording in worker processes."""
+import multiprocessing
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import wait_for
+from processor import config as conf
+from processor import workers as work
+
+FRAMES = 20
+
+
+@pytest.fixture
+def video(tmp_path) -> str:
+    path = str(tmp_path / "source.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (64, 48))
+    for index in range(FRAMES):
+        writer.write(np.full((48, 64, 3), index * 10, np.uint8))
+    writer.release()
+    return path
+
+
+def settings_for(tmp_path, video: str, visualize: bool) -> conf.Config:
+    return conf.ConfigUtil(str(tmp_path / "configuration.ini")).snapshot.replace({
+        "general.multiprocess": True,
+        "general.record": True,
+        "general.visualize-processing": visualize,
+        "general.video-source": "file",
+        "general.record-mode": "continuous",
+        "groundstation.enabled": False,
+        "file.video-path": video
+    })
+
+
+def recorded_frames(directory) -> list:
+    capture = cv2.VideoCapture(os.path.join(str(directory), "video.avi"))
+    frames = []
+    while True:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def shared_memory_exists(name: str) -> bool:
+    return os.path.exists(os.path.join("/dev/shm", name.lstrip("/")))
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="Needs /dev/shm to see the shared memory")
+def test_start_and_stop(tmp_path, video):
+    workers = work.Workers(settings_for(tmp_path, video, False), str(tmp_path))
+    capture = workers.start()
+    try:
+        assert capture.running
+        assert capture.size == (64, 48)
+        assert workers.recorder.alive
+        assert not workers.recorder.annotated
+        names = [capture.ring.name]
+
+        first = capture.read(5.0)
+        assert first is not None
+        sequence = first.sequence
+        second = capture.read(5.0)
+        assert second.sequence > sequence
+        assert second.image.shape == (48, 64, 3)
+    finally:
+        workers.stop()
+
+    assert not capture.running
+    assert not capture.failed
+    assert not workers.recorder.alive
+    assert multiprocessing.active_children() == []
+    assert not any(shared_memory_exists(name) for name in names)
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="Needs /dev/shm to see the shared memory")
+def test_recording_has_the_visualizations(tmp_path, video):
+    settings = settings_for(tmp_path, video, True)
+    workers = work.Workers(settings, str(tmp_path))
+    capture = workers.start()
+    try:
+        assert workers.recorder.annotated
+        names = [capture.ring.name, workers.annotated.name]
+
+        recorder = workers.record(settings)
+        for _ in range(5):
+            frame = capture.read(5.0)
+            # The overlay is drawn by the processing, after the capture.
+            cv2.rectangle(frame.image, (10, 10), (40, 30), (0, 255, 0), -1)
+            recorder.write(frame.image, frame.timestamp)
+
+        recorder.release(True)
+    finally:
+        workers.stop()
+
+    assert recorder.dropped == 0
+    assert not any(shared_memory_exists(name) for name in names)
+
+    # Only the processed frames, each with the overlay
+    frames = recorded_frames(tmp_path)
+    assert len(frames) == 5
+    for frame in frames:
+        assert frame[20, 25, 1] > 200 and frame[20, 25, 2] < 50
+
+
+def test_recording_without_visualizations_has_every_captured_frame(tmp_path, video):
+    settings = settings_for(tmp_path, video, False)
+    workers = work.Workers(settings, str(tmp_path))
+    capture = workers.start()
+    try:
+        recorder = workers.record(settings)
+        first = capture.read(5.0).sequence
+
+        # The processing skips frames, the recorder gets them all but not the overlay.
+        assert wait_for(lambda: capture.ring.latest() >= first + 6)
+        frame = capture.read(5.0)
+        last = frame.sequence
+        cv2.rectangle(frame.image, (10, 10), (40, 30), (0, 255, 0), -1)
+        recorder.write(frame.image, frame.timestamp)
+
+        recorder.release(True)
+    finally:
+        workers.stop()
+
+    frames = recorded_frames(tmp_path)
+    assert len(frames) >= last - first + 1
+    assert not any(frame[20, 25, 1] > 200 and frame[20, 25, 2] < 50 for frame in frames)